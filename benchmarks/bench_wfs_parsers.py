@@ -0,0 +1,164 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Benchmark of the WFS response parsers.
+
+Compares the former ``xml.dom.minidom``/``json.loads`` parsing against the incremental
+parsers of ``wlts.datasources.parsers`` on documents with the size of real GeoServer
+responses (a capabilities document with thousands of layers and GetFeature documents
+with thousands of features).
+
+Usage::
+
+    python benchmarks/bench_wfs_parsers.py [--repeat 5]
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+from xml.dom import minidom
+
+from wlts.datasources.parsers import find_xml_child_text, iter_geojson_features, iter_xml_elements
+
+CHUNK_SIZE = 16384
+
+
+def make_capabilities(layers=3000):
+    """Build a WFS 1.0.0 capabilities document with the given number of layers."""
+    feature_types = ''.join(
+        '<FeatureType><Name>workspace_{0}:layer_{0}</Name><Title>Layer {0}</Title>'
+        '<Abstract>Land use and cover layer number {0} published for benchmark purposes.</Abstract>'
+        '<Keywords>features, layer_{0}</Keywords><SRS>EPSG:4674</SRS>'
+        '<LatLongBoundingBox minx="-73.99" miny="-18.04" maxx="-43.95" maxy="5.27"/>'
+        '</FeatureType>'.format(i) for i in range(layers)
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<WFS_Capabilities version="1.0.0" xmlns="http://www.opengis.net/wfs">'
+            '<Service><Name>WFS</Name><Title>GeoServer Web Feature Service</Title></Service>'
+            '<FeatureTypeList><Operations><Query/></Operations>{}</FeatureTypeList>'
+            '</WFS_Capabilities>').format(feature_types).encode('utf-8')
+
+
+def make_gml_feature_collection(features=5000):
+    """Build a GML GetFeature document of a classification system layer."""
+    members = ''.join(
+        '<gml:featureMember><ws:classes fid="classes.{0}">'
+        '<ws:id>{0}</ws:id><ws:class_system_name>PRODES</ws:class_system_name>'
+        '<ws:name>Class {0}</ws:name>'
+        '<ws:geom><gml:Point><gml:coordinates>-54.{0},-12.{0}</gml:coordinates></gml:Point></ws:geom>'
+        '</ws:classes></gml:featureMember>'.format(i) for i in range(features)
+    )
+    return ('<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs" xmlns:gml="http://www.opengis.net/gml" '
+            'xmlns:ws="http://workspace">{}</wfs:FeatureCollection>').format(members).encode('utf-8')
+
+
+def make_geojson_feature_collection(features=5000):
+    """Build a GeoJSON GetFeature document of an alert layer with polygon geometries."""
+    ring = [[-54.0 + i * 0.0001, -12.0 + (i % 7) * 0.0001] for i in range(200)]
+    ring.append(ring[0])
+    return json.dumps({
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "id": "deter_amz.{}".format(i),
+             "geometry": {"type": "MultiPolygon", "coordinates": [[ring]]},
+             "properties": {"classname": "DESMATAMENTO_CR", "date": "2019-01-01", "areamunkm": 0.12}}
+            for i in range(features)
+        ],
+        "totalFeatures": features
+    }).encode('utf-8')
+
+
+def chunked(data):
+    """Split a document in chunks as they arrive from a streamed response."""
+    return (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+
+def minidom_feature_names(doc):
+    """Former ``WFS._list_features`` parsing."""
+    return [s.childNodes[0].firstChild.nodeValue for s in minidom.parseString(doc).getElementsByTagName('FeatureType')]
+
+
+def stream_feature_names(doc):
+    """Current ``WFS._list_features`` parsing."""
+    return [find_xml_child_text(e, 'Name')
+            for e in iter_xml_elements(chunked(doc), 'FeatureType', stop='FeatureTypeList')]
+
+
+def minidom_class(doc):
+    """Former ``WFS.get_class`` parsing."""
+    return minidom.parseString(doc).getElementsByTagName('ws:name')[0].firstChild.nodeValue
+
+
+def stream_class(doc):
+    """Current ``WFS.get_class`` parsing."""
+    return next(iter_xml_elements(chunked(doc), 'ws:name')).text
+
+
+def json_first_feature(doc):
+    """Former ``WFS.get_feature`` parsing."""
+    return json.loads(doc.decode('utf-8'))["features"][0]["properties"]
+
+
+def stream_first_feature(doc):
+    """Current ``WFS.get_features`` parsing with ``maxFeatures=1``."""
+    return next(iter_geojson_features(chunked(doc), limit=1))["properties"]
+
+
+def stream_all_features(doc):
+    """Current ``WFS.get_features`` parsing reading every feature."""
+    return [feature["properties"] for feature in iter_geojson_features(chunked(doc))]
+
+
+def measure(fn, doc, repeat):
+    """Return the best wall time and the peak of memory allocated by ``fn(doc)``."""
+    seconds = min(timeit.repeat(lambda: fn(doc), number=1, repeat=repeat))
+
+    tracemalloc.start()
+    fn(doc)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak
+
+
+def main():
+    """Run the benchmarks and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Number of repetitions of each benchmark.')
+    args = parser.parse_args()
+
+    capabilities = make_capabilities()
+    gml = make_gml_feature_collection()
+    geojson = make_geojson_feature_collection()
+
+    assert minidom_feature_names(capabilities) == stream_feature_names(capabilities)
+    assert minidom_class(gml) == stream_class(gml)
+    assert json_first_feature(geojson) == stream_first_feature(geojson)
+
+    cases = [
+        ('capabilities ({:.1f} MB)'.format(len(capabilities) / 2 ** 20), capabilities,
+         minidom_feature_names, stream_feature_names),
+        ('get_class GML ({:.1f} MB)'.format(len(gml) / 2 ** 20), gml,
+         minidom_class, stream_class),
+        ('get_feature GeoJSON ({:.1f} MB)'.format(len(geojson) / 2 ** 20), geojson,
+         json_first_feature, stream_first_feature),
+        ('all features GeoJSON ({:.1f} MB)'.format(len(geojson) / 2 ** 20), geojson,
+         json_first_feature, stream_all_features),
+    ]
+
+    print('{:<32} {:>12} {:>12} {:>12} {:>12}'.format('document', 'before (ms)', 'after (ms)', 'before (MB)',
+                                                     'after (MB)'))
+    for name, doc, before, after in cases:
+        before_time, before_peak = measure(before, doc, args.repeat)
+        after_time, after_peak = measure(after, doc, args.repeat)
+
+        print('{:<32} {:>12.2f} {:>12.2f} {:>12.2f} {:>12.2f}'.format(name, before_time * 1000, after_time * 1000,
+                                                                     before_peak / 2 ** 20, after_peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
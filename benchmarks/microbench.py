@@ -0,0 +1,285 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Microbenchmarks of the pure-Python hot paths of a trajectory request.
+
+The collection loops are fed by upstream responses recorded in ``benchmarks/fixtures``,
+so no network is involved and the timings only measure WLTS code. The results are
+written as JSON and can be compared with the results of another commit, any benchmark
+slower than the threshold is reported as a regression (exit code 1).
+
+Usage::
+
+    python benchmarks/microbench.py --output before.json
+    git checkout <other commit>
+    python benchmarks/microbench.py --output after.json --compare before.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+from flask import Flask, jsonify
+
+from wlts.collections.feature_collection import FeatureCollection
+from wlts.collections.image_collection import ImageCollection
+from wlts.collections.trajectory_entry import TrajectoryEntry, merge_trajectories
+from wlts.datasources.wfs import WFS, WFSDataSource
+from wlts.trajectory import TrajectoryParams
+from wlts.utils import get_date_from_str
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+BENCHMARKS = dict()
+
+
+def benchmark(name):
+    """Register a benchmark, the decorated function returns the callable to be timed."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def load_fixture(name, binary=False):
+    """Read a recorded upstream response."""
+    with open(os.path.join(FIXTURES, name), 'rb' if binary else 'r') as f:
+        return f.read()
+
+
+class RecordedWCSDataSource:
+    """Serve the raster values of a recorded WCS GetCoverage sequence."""
+
+    def __init__(self, fixture):
+        """Load the recorded values of each time of the timeline."""
+        self.values = dict(zip(fixture['timeline'], fixture['raster_values']))
+
+    def get_trajectory(self, **kwargs):
+        """Return the recorded value of the time."""
+        return {'raster_value': self.values[kwargs['time']]}
+
+
+FEATURE_COLLECTION = {
+    "name": "deter_amz",
+    "authority_name": "INPE",
+    "description": "Alertas de Desmatamento",
+    "detail": "http://www.obt.inpe.br/OBT/assuntos/programas/amazonia/deter",
+    "datasource_id": None,
+    "dataset_type": "Feature",
+    "classification_class": {"datasource_id": None, "type": "Self"},
+    "temporal": {"type": "DATE", "resolution": {"unit": "DAY", "value": "1"}, "string_format": "%Y-%m-%d"},
+    "period": {"start_date": "2016", "end_date": "2020"},
+    "scala": "1:100.000",
+    "spatial_extent": {"xmin": -73.5, "xmax": -44.0, "ymin": -18.0, "ymax": 4.5},
+    "feature_name": "deter_amz",
+    "geom_property": {"property_name": "geom", "srid": 4674, "type": "MultiPolygon"},
+    "observations_properties": [{"class_property": "classname", "temporal_property": "date"}],
+    "all_features": True,
+    "max_features": 100
+}
+
+IMAGE_COLLECTION = {
+    "name": "mapbiomas5_amazonia",
+    "authority_name": "MapBiomas",
+    "description": "MapBiomas Collection 5",
+    "detail": "https://mapbiomas.org",
+    "datasource_id": None,
+    "dataset_type": "Image",
+    "classification_class": {"datasource_id": None, "type": "Self"},
+    "temporal": {"type": "STRING", "resolution": {"unit": "YEAR", "value": "1"}, "string_format": "%Y"},
+    "period": {"start_date": "1985", "end_date": "2019"},
+    "scala": "30",
+    "spatial_extent": {"xmin": -73.99, "xmax": -43.95, "ymin": -18.04, "ymax": 5.27},
+    "image": "mapbiomas5_amazonia",
+    "grid": {"column": 1, "row": 1},
+    "spatial_reference_system": {"srid": 4326},
+    "attributes_properties": [{"class_property_name": "class"}],
+    "timeline": None
+}
+
+
+@benchmark('get_date_from_str[%Y-%m-%d]')
+def bench_date_ymd():
+    return lambda: get_date_from_str('2019-07-23')
+
+
+@benchmark('get_date_from_str[%Y-%m]')
+def bench_date_ym():
+    return lambda: get_date_from_str('2019/07')
+
+
+@benchmark('get_date_from_str[%Y]')
+def bench_date_y():
+    return lambda: get_date_from_str('2019')
+
+
+@benchmark('WFS.mount_url')
+def bench_mount_url():
+    wfs = WFS('http://terrabrasilis.dpi.inpe.br/geoserver')
+
+    args = {"srid": 4674, "filter": "&CQL_FILTER=INTERSECTS(geom, POINT (-54 -12)) AND date >= 2016-01-01",
+            "propertyName": "classname,date", "maxFeatures": 100, "outputformat": "&outputformat=json"}
+
+    return lambda: wfs.mount_url('deter-amz:deter_amz', **args)
+
+
+@benchmark('TrajectoryParams')
+def bench_trajectory_params():
+    args = {"collections": "deter_amz,prodes_amz,mapbiomas5_amazonia", "longitude": "-54.0",
+            "latitude": "-12.0", "start_date": "2000-01-01", "end_date": "2019-12-31",
+            "format": "columnar", "rle": "true"}
+
+    return lambda: TrajectoryParams(**args)
+
+
+@benchmark('FeatureCollection.trajectory')
+def bench_feature_trajectory():
+    document = load_fixture('wfs_getfeature_deter_amz.json', binary=True)
+
+    ds = WFSDataSource('recorded', {"host": "http://terrabrasilis.dpi.inpe.br/geoserver", "workspace": "deter-amz"})
+
+    def recorded_stream(uri, chunk_size=16384):
+        yield document
+
+    ds._wfs._stream = recorded_stream
+
+    collection = FeatureCollection(FEATURE_COLLECTION)
+    collection.datasource = ds
+
+    return lambda: collection.trajectory([], -54.0, -12.0, None, None)
+
+
+@benchmark('ImageCollection.trajectory')
+def bench_image_trajectory():
+    fixture = json.loads(load_fixture('wcs_getcoverage_mapbiomas.json'))
+
+    collection = ImageCollection(dict(IMAGE_COLLECTION, timeline=fixture['timeline']))
+    collection.datasource = RecordedWCSDataSource(fixture)
+
+    return lambda: collection.trajectory([], -54.0, -12.0, None, None)
+
+
+def make_trajectories(collections=10, entries=500):
+    """Build the per-collection trajectories of a long query."""
+    return [[TrajectoryEntry('collection_{}'.format(c), 'class_{}'.format(i % 7),
+                             '{:04d}-{:02d}-01'.format(1985 + (i * 7 + c) % 35, 1 + i % 12))
+             for i in range(entries)] for c in range(collections)]
+
+
+@benchmark('merge_trajectories')
+def bench_merge():
+    trajectories = make_trajectories()
+
+    return lambda: merge_trajectories([list(trajectory) for trajectory in trajectories])
+
+
+@benchmark('jsonify[trajectory]')
+def bench_jsonify():
+    app = Flask(__name__)
+
+    result = {
+        "query": {"longitude": -54.0, "latitude": -12.0},
+        "result": {"trajectory": [entry.to_dict() for entry in merge_trajectories(make_trajectories())]}
+    }
+
+    def run():
+        with app.app_context():
+            return jsonify(result)
+
+    return run
+
+
+def measure(fn, repeat):
+    """Return the best and the median time of a call of ``fn`` in seconds."""
+    timer = timeit.Timer(fn)
+
+    number, _ = timer.autorange()
+
+    times = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+
+    return {"best": times[0], "median": times[len(times) // 2], "number": number}
+
+
+def git_commit():
+    """Return the current commit, if any."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print the comparison with a baseline and return the regressed benchmarks."""
+    regressions = []
+
+    print('\n{:<36} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline (us)', 'current (us)', 'ratio'))
+
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            print('{:<36} {:>12} {:>12.2f} {:>8}'.format(name, '-', result['best'] * 1e6, 'new'))
+            continue
+
+        before = baseline['benchmarks'][name]['best']
+        ratio = result['best'] / before
+        flag = ''
+
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print('{:<36} {:>12.2f} {:>12.2f} {:>8.2f}{}'.format(name, before * 1e6, result['best'] * 1e6, ratio, flag))
+
+    return regressions
+
+
+def main():
+    """Run the microbenchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=7, help='Number of repetitions of each benchmark.')
+    parser.add_argument('--filter', help='Run only the benchmarks whose name contains this text.')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--compare', help='Compare the results with a JSON file of a previous run.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown reported as a regression (default 0.2, 20%%).')
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "benchmarks": dict()
+    }
+
+    print('{:<36} {:>12} {:>12} {:>10}'.format('benchmark', 'best (us)', 'median (us)', 'loops'))
+
+    for name, setup in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+
+        result = measure(setup(), args.repeat)
+        results['benchmarks'][name] = result
+
+        print('{:<36} {:>12.2f} {:>12.2f} {:>10}'.format(name, result['best'] * 1e6, result['median'] * 1e6,
+                                                         result['number']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
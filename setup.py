@@ -33,7 +33,10 @@ docs_require = [
 ]
 
 extras_require = {
+    'arrow': ['pyarrow>=1.0'],
     'docs': docs_require,
+    'msgpack': ['msgpack>=1.0'],
+    'parquet': ['pyarrow>=1.0'],
     'tests': tests_require,
 }
 
@@ -44,6 +47,7 @@ setup_requires = [
 ]
 
 install_requires = [
+    'Click>=7.0',
     'Flask>=1.1.1',
     'Flask-SQLAlchemy>=2.4.1',
     'requests>=2.9.1',
@@ -77,7 +81,11 @@ setup(
     zip_safe=False,
     include_package_data=True,
     platforms='any',
-    entry_points={},
+    entry_points={
+        'console_scripts': [
+            'wlts = wlts.cli:cli'
+        ]
+    },
     extras_require=extras_require,
     install_requires=install_requires,
     setup_requires=setup_requires,
@@ -0,0 +1,92 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS' datasource admission control."""
+import threading
+
+from wlts.datasources.admission import AdmissionController, DataSourceOverloaded
+
+
+class TestAdmissionController:
+    def test_queue_full_is_rejected(self):
+        controller = AdmissionController('ds', max_in_flight=1, max_queue=0, max_queue_time=1)
+        errors = []
+
+        def call():
+            try:
+                with controller.admit():
+                    pass
+            except DataSourceOverloaded as error:
+                errors.append(error)
+
+        with controller.admit():
+            thread = threading.Thread(target=call)
+            thread.start()
+            thread.join()
+
+        assert len(errors) == 1
+        assert errors[0].code == 503
+        assert errors[0].retry_after == 1
+        assert controller.stats()['rejected'] == 1
+        assert controller.stats()['in_flight'] == 0
+
+    def test_queue_time_exceeded(self):
+        controller = AdmissionController('ds', max_in_flight=1, max_queue=1, max_queue_time=0.05)
+        errors = []
+
+        def call():
+            try:
+                with controller.admit():
+                    pass
+            except DataSourceOverloaded as error:
+                errors.append(error)
+
+        with controller.admit():
+            thread = threading.Thread(target=call)
+            thread.start()
+            thread.join()
+
+        assert len(errors) == 1
+        assert controller.stats()['timed_out'] == 1
+        assert controller.stats()['queue_depth'] == 0
+
+    def test_queued_call_is_admitted(self):
+        controller = AdmissionController('ds', max_in_flight=1, max_queue=1, max_queue_time=5)
+        release = threading.Event()
+        done = []
+
+        def holder():
+            with controller.admit():
+                release.wait()
+
+        def queued():
+            with controller.admit():
+                done.append(True)
+
+        first = threading.Thread(target=holder)
+        first.start()
+        while controller.stats()['in_flight'] == 0:
+            pass
+        second = threading.Thread(target=queued)
+        second.start()
+        while controller.stats()['queue_depth'] == 0:
+            pass
+        release.set()
+        first.join()
+        second.join()
+
+        assert done == [True]
+        assert controller.stats()['admitted'] == 2
+
+    def test_nested_calls_reuse_slot(self):
+        controller = AdmissionController('ds', max_in_flight=1, max_queue=0, max_queue_time=0)
+
+        with controller.admit():
+            with controller.admit():
+                assert controller.stats()['in_flight'] == 1
+
+        assert controller.stats()['in_flight'] == 0
@@ -0,0 +1,133 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS area trajectories."""
+import json
+from unittest import mock
+
+import numpy
+import pytest
+from affine import Affine
+from rasterio.transform import from_bounds
+from shapely.geometry import box, mapping
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+from wlts.collections.feature_collection import FeatureCollection
+from wlts.collections.image_collection import ImageCollection
+from wlts.config import BASE_DIR, Config
+from wlts.datasources.grid import pixel_areas
+from wlts.datasources.wcs import WCSDataSource
+from wlts.trajectory import AreaTrajectoryParams, Trajectory
+from wlts.utils import transform_geometry
+
+DATASOURCE_ID = "3c20cbb4-ca94-4c1f-99af-6377f30bc683"
+
+IMAGE_COLLECTION = {
+    "name": "mapbiomas",
+    "authority_name": "MapBiomas",
+    "description": "MapBiomas",
+    "detail": "https://mapbiomas.org",
+    "datasource_id": DATASOURCE_ID,
+    "dataset_type": "Image",
+    "classification_class": {"datasource_id": DATASOURCE_ID, "type": "Self"},
+    "temporal": {"type": "STRING", "resolution": {"unit": "YEAR", "value": "1"}, "string_format": "%Y"},
+    "period": {"start_date": "2018", "end_date": "2019"},
+    "scala": "30",
+    "spatial_extent": {"xmin": -54.0, "xmax": -53.0, "ymin": -12.0, "ymax": -11.0},
+    "image": "mapbiomas",
+    "grid": {"column": 4, "row": 4, "resolution": {"x": 100, "y": 100}},
+    "spatial_reference_system": {"srid": 3857},
+    "attributes_properties": [{"class_property_name": "class"}],
+    "timeline": ["2018", "2019"]
+}
+
+
+def window(values, nodata=None):
+    def get_window(image, bbox, width, height, time, crs='EPSG:4326'):
+        assert (height, width) == values.shape
+        return values, from_bounds(*bbox, width, height), nodata
+
+    return get_window
+
+
+def test_get_area_pixels():
+    ds = WCSDataSource('wcs', {"host": "http://localhost/geoserver", "workspace": "mapbiomas"})
+
+    values = numpy.array([[1, 1, 2, 2]] * 4, dtype='uint8')
+    values[0, 0] = 0
+
+    # A 400 m square in the projected image reference system
+    geom = transform_geometry(box(0, 0, 400, 400), 3857, 4326)
+
+    with mock.patch.object(ds._wcs, 'get_window', window(values, nodata=0)):
+        result = ds.get_area(image="mapbiomas", temporal=IMAGE_COLLECTION["temporal"], geom=geom, srid=3857,
+                             grid=IMAGE_COLLECTION["grid"], start_date=None, end_date=None, time="2019")
+
+    # The nodata pixel is not counted, each pixel has 100 x 100 m
+    assert result["values"].tolist() == [1, 2]
+    assert result["counts"].tolist() == [7, 8]
+    assert result["areas"].tolist() == pytest.approx([70000, 80000])
+
+    assert ds.get_area(image="mapbiomas", temporal=IMAGE_COLLECTION["temporal"], geom=geom, srid=3857,
+                       grid=IMAGE_COLLECTION["grid"], start_date="2020", end_date=None, time="2019") is None
+
+
+def test_get_area_max_pixels():
+    ds = WCSDataSource('wcs', {"host": "http://localhost/geoserver", "workspace": "mapbiomas"})
+
+    # 4 x 4 pixels of 100 m
+    geom = transform_geometry(box(0, 0, 400, 400), 3857, 4326)
+
+    with mock.patch.object(Config, 'WLTS_AREA_MAX_PIXELS', 15), mock.patch.object(ds._wcs, 'get_window') as window:
+        with pytest.raises(RequestEntityTooLarge):
+            ds.get_area(image="mapbiomas", temporal=IMAGE_COLLECTION["temporal"], geom=geom, srid=3857,
+                        grid=IMAGE_COLLECTION["grid"], start_date=None, end_date=None, time="2019")
+
+    assert not window.called
+
+
+def test_geographic_pixel_areas():
+    # One degree cells at the equator and at 60 degrees of latitude
+    areas = pixel_areas(Affine(1, 0, 0, 0, -1, 1), 1, 4326).tolist() + \
+        pixel_areas(Affine(1, 0, 0, 0, -1, 61), 1, 4326).tolist()
+
+    assert areas[0] == pytest.approx(12364e6, rel=1e-3)
+    assert areas[1] == pytest.approx(areas[0] * 0.4924, rel=1e-2)
+
+
+def test_image_area_trajectory():
+    collection = ImageCollection(IMAGE_COLLECTION)
+    collection.datasource = mock.Mock()
+    collection.datasource.get_area.side_effect = [
+        None,
+        {"values": numpy.array([1, 2]), "counts": numpy.array([7, 8]), "areas": numpy.array([7e4, 8e4])}
+    ]
+
+    tj_attr = []
+    collection.area_trajectory(tj_attr, box(-54, -12, -53.9, -11.9), None, None)
+
+    assert tj_attr == [{"collection": "mapbiomas", "date": "2019",
+                        "classes": [{"class": 1, "pixels": 7, "area": 7e4}, {"class": 2, "pixels": 8, "area": 8e4}]}]
+
+
+def test_unsupported_area_trajectory():
+    with open('{}/json_configs/feature_collection.json'.format(BASE_DIR)) as f:
+        collection = FeatureCollection(json.load(f)["feature_collection"][0])
+
+    params = AreaTrajectoryParams(collections='deter_amz', geom=mapping(box(-54, -12, -53.9, -11.9)))
+
+    with mock.patch.object(Trajectory, 'check_collection'), \
+            mock.patch.object(Trajectory, 'get_collections', return_value=[collection]):
+        with pytest.raises(BadRequest, match='does not support area trajectories'):
+            Trajectory.get_area_trajectory(params)
+
+
+@pytest.mark.parametrize('geom', [None, {"type": "Point", "coordinates": [-54, -12]},
+                                  {"type": "Polygon", "coordinates": [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]}])
+def test_invalid_area(geom):
+    with pytest.raises(BadRequest):
+        AreaTrajectoryParams(geom=geom)
@@ -0,0 +1,81 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS cache registry and invalidation."""
+import numpy
+import pytest
+
+from wlts.caches import CacheSelector, MemoCache, get_caches, memoize, unregister
+from wlts.datasources.grid import TileGrid
+from wlts.datasources.tile_cache import TileCache
+
+
+@pytest.fixture
+def client():
+    class Client:
+        host = 'http://localhost/geoserver'
+
+        @memoize('test.get_value', maxsize=2,
+                 describe=lambda client, name, time: dict(host=client.host, name=name, time=time))
+        def get_value(self, name, time):
+            return (name, time)
+
+    yield Client()
+
+    # The registry is global, the test cache must not be listed by the other tests
+    unregister('test.get_value')
+
+
+def test_memo_cache(client):
+    cache = get_caches()['test.get_value']
+
+    client.get_value('mapbiomas', '2017')
+    client.get_value('mapbiomas', '2017')
+    client.get_value('mapbiomas', '2018')
+    client.get_value('prodes', '2018')
+
+    stats = cache.stats()
+
+    assert stats['hits'] == 1 and stats['misses'] == 3 and stats['hit_ratio'] == 0.25
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+
+    assert cache.invalidate(CacheSelector(names={'mapbiomas'})) == 1
+    assert cache.invalidate(CacheSelector(hosts={'http://other'})) == 0
+    assert cache.stats()['entries'] == 1
+
+
+def test_selector():
+    selector = CacheSelector(start_date='2018-01-01', end_date='2018-12-31', bbox=[-54, -12, -53, -11])
+
+    assert selector.match(time='2018-06-01', bounds=(-53.5, -11.5, -53.4, -11.4))
+    assert not selector.match(time='2019-01-01')
+    assert not selector.match(bounds=(-50, -10, -49, -9))
+
+    # An entry without time or extent, as a classification system lookup, is not selected
+    assert not selector.match(host='http://localhost/geoserver', name='deter-amz:deter_amz')
+    assert not selector.match(time='2018-06-01') and not selector.match(bounds=(-53.5, -11.5, -53.4, -11.4))
+    assert not CacheSelector(names={'mapbiomas'}).match(host='http://localhost/geoserver')
+    assert MemoCache().invalidate(selector) == 0
+
+
+def test_tile_cache_invalidate(tmpdir):
+    cache = TileCache(str(tmpdir), 10 * 1024 ** 2)
+    grid = TileGrid(-54.0, -11.0, 0.01, 0.01, 100)
+    tile = numpy.zeros((100, 100), dtype='uint8')
+
+    for time in ('2017', '2018'):
+        for tile_x in range(3):
+            key = ('http://localhost/geoserver', 'bdc:mapbiomas', time, 4326, grid.origin_x, grid.origin_y,
+                   grid.resolution_x, grid.resolution_y, grid.tile_size, tile_x, 0)
+            cache.put(key, tile, None)
+
+    # The second tile of 2018
+    removed = cache.invalidate(CacheSelector(names={'bdc:mapbiomas'}, start_date='2018-01-01',
+                                             bbox=[-52.9, -11.5, -52.1, -11.1]))
+
+    assert removed == 1
+    assert cache.stats()['entries'] == 5 and cache.stats()['size'] == cache._disk_usage()
@@ -0,0 +1,80 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS incremental trajectories."""
+from unittest import mock
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+from wlts import continuation
+from wlts.collections.trajectory_entry import TrajectoryEntry
+from wlts.trajectory import Trajectory, TrajectoryParams
+from wlts.utils import get_date_from_str
+
+
+class FakeCollection:
+    def __init__(self, name, dates):
+        self.name = name
+        self.dates = dates
+        self.start_dates = []
+
+    def get_name(self):
+        return self.name
+
+    def trajectory(self, tj_attr, x, y, start_date, end_date):
+        self.start_dates.append(start_date)
+
+        for date in self.dates:
+            if start_date is None or get_date_from_str(date[:10]) >= get_date_from_str(start_date):
+                tj_attr.append(TrajectoryEntry(self.name, 'Floresta', date))
+
+
+def get_trajectory(collections, **params):
+    with mock.patch('wlts.trajectory.collection_manager.get_all_collections', return_value=collections):
+        return Trajectory.get_trajectory(TrajectoryParams(longitude='-54', latitude='-12', **params))['result']
+
+
+def test_continuation_token():
+    deter = FakeCollection('deter', ['2019-08-01Z', '2019-09-01Z'])
+    prodes = FakeCollection('prodes', ['2017', '2018'])
+
+    result = get_trajectory([deter, prodes])
+
+    assert len(result['trajectory']) == 4
+
+    deter.dates.append('2019-10-01Z')
+    prodes.dates.append('2019')
+
+    result = get_trajectory([deter, prodes], token=result['token'])
+
+    assert deter.start_dates[-1] == '2019-09-02' and prodes.start_dates[-1] == '2018-01-02'
+    assert [entry['date'] for entry in result['trajectory']] == ['2019', '2019-10-01Z']
+
+    # Nothing new
+    result = get_trajectory([deter, prodes], token=result['token'])
+
+    assert result['trajectory'] == []
+    assert continuation.decode(result['token'], -54, -12) == {'deter': '2019-10-01', 'prodes': '2019-01-01'}
+
+
+def test_since():
+    deter = FakeCollection('deter', ['2019-08-01Z', '2019-09-01Z'])
+
+    result = get_trajectory([deter], since='2019-08-01')
+
+    assert [entry['date'] for entry in result['trajectory']] == ['2019-09-01Z']
+
+
+def test_invalid_token():
+    token = continuation.encode(-50, -10, {'deter': '2019-09-01'})
+
+    with pytest.raises(BadRequest):
+        TrajectoryParams(longitude='-54', latitude='-12', token=token)
+
+    with pytest.raises(BadRequest):
+        TrajectoryParams(longitude='-54', latitude='-12', token='not a token')
@@ -0,0 +1,64 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS request time budgets."""
+import threading
+from unittest import mock
+
+import pytest
+
+from wlts import deadline
+from wlts.collections.trajectory_entry import TrajectoryEntry
+from wlts.trajectory import Trajectory, TrajectoryParams
+
+
+class FakeCollection:
+    def __init__(self, name, block=None):
+        self.name = name
+        self.block = block
+
+    def get_name(self):
+        return self.name
+
+    def trajectory(self, tj_attr, x, y, start_date, end_date):
+        tj_attr.append(TrajectoryEntry(self.name, 'Floresta', '2017'))
+
+        if self.block is not None:
+            self.block.wait(5)
+            deadline.check()
+
+
+def test_deadline():
+    assert deadline.remaining() is None
+    assert deadline.bound(10) == 10
+
+    with deadline.deadline(1):
+        with deadline.deadline(60):
+            assert deadline.bound(None) <= 1
+
+    with deadline.deadline(0):
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.check()
+
+
+def test_partial_trajectory():
+    block = threading.Event()
+    collections = [FakeCollection('prodes'), FakeCollection('mapbiomas', block)]
+
+    params = TrajectoryParams(longitude='-54', latitude='-12', timeout='0.2')
+
+    try:
+        with mock.patch('wlts.trajectory.collection_manager.get_all_collections', return_value=collections):
+            result = Trajectory.get_trajectory(params)
+    finally:
+        block.set()
+
+    status = result['result']['status']
+
+    assert status['prodes']['status'] == 'ok'
+    assert status['mapbiomas']['status'] == 'timeout'
+    assert [entry['collection'] for entry in result['result']['trajectory']] == ['prodes', 'mapbiomas']
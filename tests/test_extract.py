@@ -0,0 +1,80 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS bulk trajectory extraction."""
+import csv
+import json
+from unittest import mock
+
+import pytest
+
+from wlts.collections.trajectory_entry import TrajectoryEntry
+from wlts.extract import CSVWriter, ParquetWriter, extract, read_points
+
+POINTS = [(position, -54.0 + position * 0.01, -12.0) for position in range(7)]
+
+
+def batch(collections, xs, ys, start_date=None, end_date=None):
+    return [[TrajectoryEntry('mapbiomas', 'Floresta', '2019')] for _ in xs]
+
+
+def test_read_points(tmp_path):
+    csv_path = tmp_path / 'points.csv'
+    csv_path.write_text('name,lon,lat\na,-54.0,-12.0\nb,-53.9,-11.9\n')
+
+    geojson_path = tmp_path / 'points.geojson'
+    geojson_path.write_text(json.dumps({'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'id': 'p1', 'geometry': {'type': 'Point', 'coordinates': [-54.0, -12.0]},
+         'properties': {}}
+    ]}))
+
+    assert read_points(str(csv_path), x_column='lon', y_column='lat', id_column='name') == \
+        [('a', -54.0, -12.0), ('b', -53.9, -11.9)]
+    assert read_points(str(geojson_path)) == [('p1', -54.0, -12.0)]
+
+
+def test_csv_resume(tmp_path):
+    path = str(tmp_path / 'trajectories.csv')
+
+    # The extraction stops at the third batch
+    writer = CSVWriter(path, 2)
+    with mock.patch('wlts.extract.Trajectory.get_batch_trajectory',
+                    side_effect=[batch(None, [0, 0], None), batch(None, [0, 0], None), RuntimeError('down')]):
+        with pytest.raises(RuntimeError):
+            list(extract(POINTS, writer, batch_size=2))
+    writer.close()
+
+    # Another batch size would skip or repeat points
+    with pytest.raises(ValueError):
+        CSVWriter(path, 3, resume=True)
+
+    writer = CSVWriter(path, 2, resume=True)
+    with mock.patch('wlts.extract.Trajectory.get_batch_trajectory', side_effect=batch) as get_batch:
+        sizes = list(extract(POINTS, writer, batch_size=2))
+    writer.close()
+
+    assert get_batch.call_count == 2 and sizes == [2, 1]
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    assert [int(row['id']) for row in rows] == list(range(7))
+
+
+def test_parquet_resume(tmp_path):
+    pytest.importorskip('pyarrow.parquet')
+
+    path = str(tmp_path / 'trajectories')
+
+    writer = ParquetWriter(path, 2)
+    writer.write(0, [(0, -54.0, -12.0, 'mapbiomas', '2019', 'Floresta')])
+
+    with pytest.raises(ValueError):
+        ParquetWriter(path, 3, resume=True)
+
+    assert ParquetWriter(path, 2, resume=True).done == {0}
+    assert ParquetWriter(path, 2).done == set()
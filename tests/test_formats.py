@@ -0,0 +1,68 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS response formats."""
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+from werkzeug.exceptions import NotAcceptable
+
+from wlts import formats
+
+RESULT = {
+    'query': {'latitude': -9.091, 'longitude': -66.031},
+    'result': {
+        'trajectory': [
+            {'collection': 'deter_amz', 'class': 'DEGRADACAO', 'date': '2016-10-06'},
+            {'collection': 'prodes', 'class': 'Floresta', 'date': '2017'}
+        ]
+    }
+}
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_negotiate(app):
+    with app.test_request_context():
+        assert formats.negotiate() == formats.JSON
+
+    with app.test_request_context(headers={'Accept': 'text/html, application/json;q=0.5'}):
+        assert formats.negotiate() == formats.JSON
+
+    with app.test_request_context(headers={'Accept': 'text/html'}):
+        with pytest.raises(NotAcceptable):
+            formats.negotiate()
+
+
+def test_arrow_response(app):
+    pyarrow = pytest.importorskip('pyarrow')
+
+    with app.test_request_context(headers={'Accept': formats.ARROW}):
+        response = formats.make_response(RESULT, formats.negotiate())
+
+    table = pyarrow.ipc.open_stream(response.get_data()).read_all()
+
+    assert table.column('class').to_pylist() == ['DEGRADACAO', 'Floresta']
+    assert json.loads(table.schema.metadata[b'query']) == RESULT['query']
+
+
+def test_compress_response(app):
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = formats.compress_response(jsonify({'data': 'x' * 4096}))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.get_data())) == {'data': 'x' * 4096}
+
+    with app.test_request_context():
+        response = formats.compress_response(jsonify({'data': 'x' * 4096}))
+
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,139 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS trajectory jobs."""
+import json
+from unittest import mock
+
+import pytest
+from werkzeug.exceptions import BadRequest, NotFound, RequestEntityTooLarge
+
+from wlts.collections.trajectory_entry import TrajectoryEntry
+from wlts.jobs import JobManager, TrajectoryJob, estimate_job_points, expand_job_targets
+
+
+def batch(collections, xs, ys, start_date=None, end_date=None):
+    return [[TrajectoryEntry('mapbiomas', 'Floresta', '2019')] for _ in xs]
+
+
+def test_expand_job_targets():
+    # The triangle keeps the cells below its diagonal
+    triangle = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]]]}
+
+    xs, ys = expand_job_targets({'points': [[-54.0, -12.0]], 'geoms': [triangle], 'step': 0.5})
+
+    assert list(zip(xs, ys)) == [(-54.0, -12.0), (0.25, 0.25), (0.75, 0.25), (0.75, 0.75)]
+
+
+def test_trajectory_job(tmp_path):
+    spec = {'collections': ['mapbiomas'], 'bboxes': [[-54.0, -12.0, -53.0, -11.9]], 'step': 0.1}
+
+    job = TrajectoryJob.create(str(tmp_path), spec, chunk_size=4)
+
+    with mock.patch('wlts.jobs.Trajectory.get_batch_trajectory',
+                    side_effect=[batch(None, range(4), None), RuntimeError('down')]):
+        job.run()
+
+    # The retrieved chunk is kept
+    assert job.progress()['state'] == 'failed' and job.progress()['done'] == 4
+    assert job.chunk_ready(0) and not job.chunk_ready(1)
+
+    # The job resumes from its first missing chunk
+    job = TrajectoryJob.load(job.directory)
+    job.document['state'] = 'queued'
+
+    with mock.patch('wlts.jobs.Trajectory.get_batch_trajectory', side_effect=batch) as get_batch:
+        job.run()
+
+    assert get_batch.call_count == 2
+    assert job.progress()['state'] == 'finished'
+    assert job.progress()['done'] == job.progress()['total'] == 10 and job.progress()['chunks'] == 3
+
+    with open(job.chunk_path(2)) as f:
+        chunk = json.load(f)
+
+    assert len(chunk['points']) == 2
+    assert chunk['points'][0]['trajectory'] == [{'collection': 'mapbiomas', 'class': 'Floresta', 'date': '2019'}]
+
+
+def test_job_manager(tmp_path):
+    manager = JobManager(str(tmp_path), workers=1, chunk_size=2)
+
+    with mock.patch('wlts.jobs.Trajectory.check_collection'), \
+            mock.patch('wlts.jobs.Trajectory.get_batch_trajectory', side_effect=batch):
+        job = manager.submit({'collections': ['mapbiomas'], 'points': [[0, 0], [1, 1], [2, 2]]})
+        manager._executor.shutdown(wait=True)
+
+    assert manager.get(job.id).state == 'finished'
+    assert manager.chunk(job.id, 1).endswith('chunk-000001.json')
+
+    with pytest.raises(NotFound):
+        manager.chunk(job.id, 2)
+
+    # The jobs are loaded again from the directory
+    assert JobManager(str(tmp_path)).get(job.id).progress()['done'] == 3
+
+    manager.delete(job.id)
+
+    with pytest.raises(NotFound):
+        manager.get(job.id)
+
+
+def test_job_manager_processes(tmp_path):
+    # A job locked by another process of the service
+    job = TrajectoryJob.create(str(tmp_path), {'points': [[0, 0], [1, 1], [2, 2]]}, chunk_size=2)
+    assert job.acquire()
+
+    with mock.patch('wlts.jobs.Trajectory.get_batch_trajectory', side_effect=batch) as get_batch:
+        manager = JobManager(str(tmp_path), workers=1)
+        manager._executor.shutdown(wait=True)
+
+        # It is not resumed, its state is read from the directory
+        assert not get_batch.called
+        assert manager.get(job.id).progress()['state'] == 'queued'
+
+        job.release()
+
+        # The first process to lock it resumes it
+        manager = JobManager(str(tmp_path), workers=1)
+        manager._executor.shutdown(wait=True)
+
+    # The lock is released when the job ends
+    assert get_batch.call_count == 2
+    assert job.acquire()
+    job.release()
+
+    assert JobManager(str(tmp_path)).get(job.id).state == 'finished'
+
+    with pytest.raises(NotFound):
+        manager.get('../' + job.id)
+
+    # Any process deletes the job
+    JobManager(str(tmp_path)).delete(job.id)
+
+    with pytest.raises(NotFound):
+        manager.chunk(job.id, 0)
+
+
+def test_job_size(tmp_path):
+    triangle = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]]]}
+
+    # The geometries count the grid of their extent
+    assert estimate_job_points({'points': [[-54.0, -12.0]], 'geoms': [triangle], 'step': 0.5}) == 5
+    assert estimate_job_points({'bboxes': [[-54.0, -12.0, -53.0, -11.9]], 'step': 0.1}) == 10
+
+    # A continental area is rejected before its points are built
+    spec = {'bboxes': [[-74.0, -34.0, -34.0, 6.0]], 'step': 1e-6}
+
+    with mock.patch('wlts.jobs.expand_job_targets') as expand, pytest.raises(RequestEntityTooLarge):
+        TrajectoryJob.create(str(tmp_path), spec, chunk_size=1000)
+
+    assert not expand.called
+
+    for step in (0, -0.1, float('nan'), '0.1', True, [0.1]):
+        with pytest.raises(BadRequest):
+            TrajectoryJob.create(str(tmp_path), dict(spec, step=step), chunk_size=1000)
@@ -0,0 +1,130 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS mirror datasource."""
+import json
+import os
+from unittest import mock
+
+from shapely.geometry import box, mapping
+
+from wlts.caches import CacheSelector
+from wlts.config import Config
+from wlts.datasources.mirror import LayerMirror, MirrorDataSource
+from wlts.datasources.wfs import WFS
+
+
+def feature(id, bounds, classname, date):
+    return {"type": "Feature", "id": id, "geometry": mapping(box(*bounds)),
+            "properties": {"classname": classname, "date": date}}
+
+
+LAYER = [
+    feature("deter_amz.1", (-54.0, -12.0, -53.0, -11.0), "DESMATAMENTO", "2018-08-01"),
+    feature("deter_amz.2", (-53.5, -11.5, -52.5, -10.5), "DEGRADACAO", "2019-08-01"),
+    feature("deter_amz.3", (-50.0, -10.0, -49.0, -9.0), "MINERACAO", "2019-09-01")
+]
+
+ARGS = {
+    "feature_name": "deter_amz",
+    "temporal": {"type": "DATE", "string_format": "%Y-%m-%d"},
+    "obs": [{"temporal_property": "date", "class_property": "classname"}],
+    "geom_property": {"property_name": "geom", "srid": 4326},
+    "start_date": None,
+    "end_date": None
+}
+
+
+def make_stream(layer, urls):
+    def stream(self, uri, chunk_size=16384):
+        urls.append(uri)
+
+        features = layer
+        if 'CQL_FILTER' in uri:
+            features = [f for f in features if f['properties']['date'] >= uri.split('>= ')[1].split('&')[0]]
+
+        start = int(uri.split('startIndex=')[1].split('&')[0]) if 'startIndex=' in uri else 0
+        page = features[start:start + Config.WLTS_MIRROR_PAGE_SIZE]
+
+        yield json.dumps({"type": "FeatureCollection", "features": page}).encode('utf-8')
+
+    return stream
+
+
+def test_layer_mirror(tmp_path):
+    urls = []
+    wfs = WFS('http://localhost/geoserver')
+
+    with mock.patch.object(Config, 'WLTS_MIRROR_PAGE_SIZE', 2), \
+            mock.patch.object(WFS, '_stream', make_stream(LAYER[:2], urls)):
+        mirror = LayerMirror(wfs, 'deter-amz:deter_amz', 4326, str(tmp_path), temporal_property='date')
+        mirror.refresh()
+
+        assert len(urls) == 2 and 'startIndex=2' in urls[1]
+
+    with mock.patch.object(Config, 'WLTS_MIRROR_PAGE_SIZE', 2), \
+            mock.patch.object(WFS, '_stream', make_stream(LAYER, urls)):
+        mirror.refresh()
+
+    # Only the features from the last mirrored date are downloaded again
+    assert 'date >= 2019-08-01' in urls[2]
+    assert [f['id'] for f in mirror.features] == ['deter_amz.1', 'deter_amz.2', 'deter_amz.3']
+
+    # The mirror is reloaded from its directory
+    reloaded = LayerMirror(wfs, 'deter-amz:deter_amz', 4326, str(tmp_path), temporal_property='date')
+
+    assert reloaded.stats()['features'] == 3 and reloaded.age() is not None
+    assert sorted(os.listdir(str(tmp_path))) == ['features.jsonl', 'state.json']
+
+
+def test_mirror_datasource(tmp_path):
+    ds = MirrorDataSource('mirror', {
+        "type": "MIRROR",
+        "path": str(tmp_path),
+        "datasource": {"type": "WFS", "host": "http://localhost/geoserver", "workspace": "deter-amz"}
+    })
+
+    with mock.patch.object(MirrorDataSource, '_start'), \
+            mock.patch.object(ds.datasource, 'get_trajectory', return_value=[]) as live:
+        # Not mirrored yet, the WFS datasource answers
+        assert ds.get_trajectory(x=-53.75, y=-11.75, **ARGS) == []
+        assert live.call_count == 1
+
+        with mock.patch.object(WFS, '_stream', make_stream(LAYER, [])):
+            ds.get_layer(ARGS).refresh()
+
+        observations = ds.get_trajectory(x=-53.25, y=-11.25, **ARGS)
+        batch = ds.get_trajectory_batch(xs=[-53.25, -49.5], ys=[-11.25, -9.5], **dict(ARGS, end_date='2019-08-15'))
+
+        assert live.call_count == 1
+
+    assert [f['classname'] for _, f in observations] == ['DESMATAMENTO']
+    assert [[f['classname'] for _, f in point] for point in batch] == [['DESMATAMENTO'], []]
+    assert ds.get_metrics()['mirror']['deter-amz.deter_amz.4326']['features'] == 3
+
+    # A layer is expired whatever the time interval of the invalidation
+    assert ds.invalidate(CacheSelector(names={'deter-amz:deter_amz'}, start_date='2019-01-01')) == 3
+    assert ds.invalidate(CacheSelector(names={'deter-amz:other'})) == 0
+
+
+def test_mirror_end_date(tmp_path):
+    ds = MirrorDataSource('mirror', {
+        "type": "MIRROR",
+        "path": str(tmp_path),
+        "datasource": {"type": "WFS", "host": "http://localhost/geoserver", "workspace": "deter-amz"}
+    })
+
+    # The layer dates have a time zone, as the WFS date properties
+    layer = [feature("deter_amz.2", (-53.5, -11.5, -52.5, -10.5), "DEGRADACAO", "2019-08-01Z")]
+
+    with mock.patch.object(MirrorDataSource, '_start'), mock.patch.object(WFS, '_stream', make_stream(layer, [])):
+        ds.get_layer(ARGS).refresh()
+
+    # A feature dated on the end date is kept, as the WFS datasource does
+    observations = ds.get_trajectory(x=-52.75, y=-10.75, **dict(ARGS, start_date='2019-08-01', end_date='2019-08-01'))
+
+    assert [f['classname'] for _, f in observations] == ['DEGRADACAO']
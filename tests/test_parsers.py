@@ -0,0 +1,108 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS' datasource response parsers."""
+import json
+import time
+
+import pytest
+
+from wlts.datasources.parsers import find_xml_child_text, iter_geojson_features, iter_xml_elements
+
+
+def chunked(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+class TestGeoJSONParser:
+    doc = json.dumps({
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "id": "deter.{}".format(i),
+             "properties": {"classname": "DESMATAMENTO_CR", "date": "2019-01-0{}".format(i), "name": "São Félix"}}
+            for i in range(1, 6)
+        ],
+        "totalFeatures": 5
+    }, ensure_ascii=False).encode('utf-8')
+
+    @pytest.mark.parametrize('size', [1, 7, 64, 100000])
+    def test_features_across_chunks(self, size):
+        features = list(iter_geojson_features(chunked(self.doc, size)))
+
+        assert [f['properties']['date'] for f in features] == ['2019-01-0{}'.format(i) for i in range(1, 6)]
+        assert features[0]['properties']['name'] == 'São Félix'
+
+    def test_limit_stops_reading(self):
+        chunks = chunked(self.doc, 16)
+
+        features = list(iter_geojson_features(chunks, limit=2))
+
+        assert len(features) == 2
+        assert next(chunks, None) is not None
+
+    def test_large_feature_across_chunks(self):
+        ring = [[-54.0 + i * 1e-5, -12.0 + (i % 7) * 1e-5] for i in range(60000)]
+        feature = {"type": "Feature", "id": "deter.big",
+                   "geometry": {"type": "Polygon", "coordinates": [ring + [ring[0]]]},
+                   "properties": {"name": "quote \\\" and brace } in a {string]"}}
+        doc = json.dumps({"type": "FeatureCollection", "features": [feature, feature]}).encode('utf-8')
+
+        assert len(doc) > 2 * 10 ** 6
+
+        start = time.monotonic()
+        features = list(iter_geojson_features(chunked(doc, 1024)))
+
+        assert features == [feature, feature]
+        # Each feature is scanned once, not again for each chunk
+        assert time.monotonic() - start < 2
+
+    @pytest.mark.parametrize('size', [1, 2, 3])
+    def test_escapes_across_chunks(self, size):
+        doc = b'{"features": [{"properties": {"name": "a\\\\\\"}\\u00e9"}}]}'
+
+        assert list(iter_geojson_features(chunked(doc, size))) == [{"properties": {"name": 'a\\"}\u00e9'}}]
+
+    def test_empty_collection(self):
+        assert list(iter_geojson_features([b'{"type":"FeatureCollection","features":[]}'])) == []
+
+    def test_truncated_stream(self):
+        with pytest.raises(ValueError):
+            list(iter_geojson_features(chunked(self.doc[:-40], 10)))
+
+
+class TestXMLParser:
+    capabilities = (
+        b'<?xml version="1.0" encoding="UTF-8"?>'
+        b'<WFS_Capabilities version="1.0.0" xmlns="http://www.opengis.net/wfs">'
+        b'<FeatureTypeList>'
+        b'<FeatureType><Name>deter-amz:deter_amz</Name><Title>DETER</Title></FeatureType>'
+        b'<FeatureType><Name>prodes-cerrado:yearly_deforestation</Name><Title>PRODES</Title></FeatureType>'
+        b'</FeatureTypeList>'
+        b'</WFS_Capabilities>'
+    )
+
+    feature_collection = (
+        b'<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs" xmlns:gml="http://www.opengis.net/gml" '
+        b'xmlns:deter-amz="http://terrabrasilis.dpi.inpe.br/deter-amz" xmlns:other="http://other">'
+        b'<gml:featureMember><deter-amz:classes>'
+        b'<other:name>Wrong</other:name><deter-amz:name>Desmatamento</deter-amz:name>'
+        b'</deter-amz:classes></gml:featureMember>'
+        b'</wfs:FeatureCollection>'
+    )
+
+    @pytest.mark.parametrize('size', [1, 13, 100000])
+    def test_feature_type_names(self, size):
+        names = [find_xml_child_text(e, 'Name')
+                 for e in iter_xml_elements(chunked(self.capabilities, size), 'FeatureType', stop='FeatureTypeList')]
+
+        assert names == ['deter-amz:deter_amz', 'prodes-cerrado:yearly_deforestation']
+
+    @pytest.mark.parametrize('size', [1, 13, 100000])
+    def test_prefixed_tag(self, size):
+        element = next(iter_xml_elements(chunked(self.feature_collection, size), 'deter-amz:name'))
+
+        assert element.text == 'Desmatamento'
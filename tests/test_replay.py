@@ -0,0 +1,60 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS record/replay datasource."""
+import json
+from unittest import mock
+
+import pytest
+
+from wlts.datasources.replay import ReplayDataSource
+from wlts.datasources.wfs import WFS
+
+DOCUMENT = json.dumps({
+    "type": "FeatureCollection",
+    "features": [
+        {"type": "Feature", "geometry": None, "properties": {"classname": "DEGRADACAO", "date": "2016-10-06"}},
+        {"type": "Feature", "geometry": None, "properties": {"classname": "CS_DESORDENADO", "date": "2017-03-01"}}
+    ]
+}).encode('utf-8')
+
+
+def upstream(self, uri, chunk_size=16384):
+    for offset in range(0, len(DOCUMENT), 32):
+        yield DOCUMENT[offset:offset + 32]
+
+
+def make_datasource(archive, mode):
+    return ReplayDataSource('replay', {
+        "type": "REPLAY",
+        "mode": mode,
+        "archive": str(archive),
+        "datasource": {"type": "WFS", "host": "http://localhost/geoserver", "workspace": "deter-amz"}
+    })
+
+
+def test_record_and_replay(tmp_path):
+    with mock.patch.object(WFS, '_stream', upstream):
+        recorder = make_datasource(tmp_path, 'record')
+        recorded = recorder._wfs.get_features('deter-amz:deter_amz', 4674, '', max_features=1)
+
+    assert recorder.get_metrics()['replay']['recorded'] == 1
+
+    # The parser stopped at the first feature, but the whole response is recorded
+    with open(tmp_path / 'index.jsonl') as f:
+        assert json.loads(f.readline())['size'] == len(DOCUMENT)
+
+    with mock.patch.object(WFS, '_stream', side_effect=AssertionError('network access in replay mode')):
+        player = make_datasource(tmp_path, 'replay')
+
+        assert player._wfs.get_features('deter-amz:deter_amz', 4674, '', max_features=1) == recorded
+
+        with pytest.raises(LookupError):
+            player._wfs.get_features('deter-amz:other', 4674, '')
+
+    assert player.get_type() == "REPLAY"
+    assert player.workspace == "deter-amz"
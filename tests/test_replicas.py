@@ -0,0 +1,53 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS replica host selection."""
+import pytest
+import requests
+
+from wlts.datasources.replicas import ReplicaPool
+
+
+def test_replica_failover():
+    pool = ReplicaPool(['http://a/geoserver', 'http://b/geoserver/'], cooldown=60)
+    calls = []
+
+    def call(host):
+        calls.append(host)
+        if host == 'http://a/geoserver':
+            raise requests.ConnectionError('down')
+        return host
+
+    assert pool.call(call) == 'http://b/geoserver'
+    assert pool.call(call) == 'http://b/geoserver'
+    assert calls == ['http://a/geoserver', 'http://b/geoserver', 'http://b/geoserver']
+
+    stats = {replica['host']: replica for replica in pool.stats()}
+
+    assert not stats['http://a/geoserver']['available'] and stats['http://a/geoserver']['failures'] == 1
+    assert stats['http://b/geoserver']['available'] and stats['http://b/geoserver']['calls'] == 2
+
+    with pytest.raises(ValueError):
+        pool.call(lambda host: int('x'))
+
+
+def test_replica_latency():
+    pool = ReplicaPool(['http://a', 'http://b'])
+    a, b = pool.replicas
+
+    pool.record(a, latency=0.5)
+    pool.record(b, latency=0.1)
+
+    assert pool.candidates() == [b, a]
+
+    # A fast replica that fails often costs more than a slow one
+    pool.cooldown = 0
+    for _ in range(5):
+        pool.record(b, latency=0.1)
+        pool.record(b, error=True)
+
+    assert pool.candidates() == [a, b]
@@ -0,0 +1,123 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS bulk image sampling."""
+from unittest import mock
+
+import numpy
+import pytest
+from rasterio.io import MemoryFile
+from rasterio.transform import from_bounds
+
+from wlts.datasources.grid import TileGrid
+from wlts.datasources.wcs import WCSDataSource
+
+# A 10 x 10 pixels image of 0.01 degrees, read in tiles of 4 x 4 pixels
+EXTENT = {"xmin": -54.0, "xmax": -53.9, "ymin": -11.1, "ymax": -11.0}
+GRID = {"column": 4, "row": 4, "resolution": {"x": 0.01, "y": 0.01}, "tile_size": 4}
+
+
+def coverage(identifier, format, bbox, crs, time, width, height):
+    """Render a GeoTIFF of the requested window, the value of each pixel identifies its image pixel."""
+    min_x, min_y, max_x, max_y = bbox
+
+    xs = min_x + (numpy.arange(width) + 0.5) * (max_x - min_x) / width
+    ys = max_y - (numpy.arange(height) + 0.5) * (max_y - min_y) / height
+
+    cols = numpy.floor(numpy.round((xs - EXTENT['xmin']) / 0.01, 6))
+    rows = numpy.floor(numpy.round((EXTENT['ymax'] - ys) / 0.01, 6))
+
+    data = ((rows[:, None] * 10 + cols[None, :]) % 250 + 1).astype('uint8')
+
+    with MemoryFile() as memfile:
+        with memfile.open(driver='GTiff', width=width, height=height, count=1, dtype='uint8', crs=crs,
+                          transform=from_bounds(*bbox, width, height), nodata=0) as dataset:
+            dataset.write(data, 1)
+
+        return memfile.read()
+
+
+def sample(ds, xs, ys):
+    return ds.sample_points(image="mapbiomas", temporal=None, xs=xs, ys=ys, srid=4326, grid=GRID,
+                            spatial_extent=EXTENT, start_date=None, end_date=None, time="2019")
+
+
+def test_tile_grid():
+    grid = TileGrid.from_collection(GRID, EXTENT, 256)
+
+    cols, rows = grid.pixels([-53.995, -53.955, -53.905, -53.895, -54.005], [-11.005, -11.045, -11.095, -11.0, -11.0])
+
+    assert cols.tolist() == [0, 4, 9, 10, -1] and rows.tolist() == [0, 4, 9, 0, 0]
+    assert grid.contains(cols, rows).tolist() == [True, True, True, False, False]
+    assert [t.tolist() for t in grid.tiles(cols, rows)] == [[0, 1, 2, 2, -1], [0, 1, 2, 0, 0]]
+    assert numpy.allclose(grid.tile_bounds(1, 1), (-53.96, -11.08, -53.92, -11.04))
+
+
+def test_sample_points_tiles():
+    ds = WCSDataSource('wcs', {"host": "http://localhost/geoserver", "workspace": "mapbiomas"})
+
+    xs = [-53.995, -53.985, -53.965, -53.955, -53.895, -53.995]
+    ys = [-11.005, -11.015, -11.035, -11.005, -11.005, -11.105]
+
+    with mock.patch.object(ds._wcs, '_get_coverage', side_effect=coverage) as get_coverage:
+        values = sample(ds, xs, ys)
+
+    # Each tile with points is read once, the tiles outside of the image are not requested
+    assert sorted(call[1]['bbox'] for call in get_coverage.call_args_list) == \
+        sorted([TileGrid.from_collection(GRID, EXTENT, 256).tile_bounds(x, 0) for x in (0, 1)])
+
+    assert values.tolist() == [1, 12, 34, 5, None, None]
+
+
+def test_sample_points_agree_with_trajectory():
+    ds = WCSDataSource('wcs', {"host": "http://localhost/geoserver", "workspace": "mapbiomas"})
+
+    xs = [-53.995 + 0.01 * i for i in range(10)]
+    ys = [-11.005 - 0.0103 * i for i in range(10)]
+
+    with mock.patch.object(ds._wcs, '_get_coverage', side_effect=coverage):
+        values = sample(ds, xs, ys)
+
+        for x, y, value in zip(xs, ys, values.tolist()):
+            result = ds.get_trajectory(image="mapbiomas", temporal=None, x=x, y=y, srid=4326, grid=GRID,
+                                       spatial_extent=EXTENT, start_date=None, end_date=None, time="2019")
+
+            assert int(result['raster_value'][0]) == value
+
+
+def test_sample_points_projected():
+    # A 0.01 degree square at the equator, read in EPSG:3857 pixels of 100 m
+    extent = {"xmin": 0.0, "xmax": 0.01, "ymin": 0.0, "ymax": 0.01}
+    grid = {"column": 4, "row": 4, "resolution": {"x": 100, "y": 100}, "tile_size": 4}
+
+    tile_grid = TileGrid.from_collection(grid, extent, 256, srid=3857)
+
+    # The grid is in meters, from the upper left corner of the extent
+    assert tile_grid.origin_x == pytest.approx(0) and tile_grid.origin_y == pytest.approx(1113.19, abs=0.01)
+    assert (tile_grid.columns, tile_grid.rows) == (12, 12)
+
+    def projected_coverage(identifier, format, bbox, crs, time, width, height):
+        min_x, min_y, max_x, max_y = bbox
+        cols = numpy.floor((min_x + (numpy.arange(width) + 0.5) * 100 - tile_grid.origin_x) / 100)
+        rows = numpy.floor((tile_grid.origin_y - max_y + (numpy.arange(height) + 0.5) * 100) / 100)
+
+        with MemoryFile() as memfile:
+            with memfile.open(driver='GTiff', width=width, height=height, count=1, dtype='uint8', crs=crs,
+                              transform=from_bounds(*bbox, width, height), nodata=0) as dataset:
+                dataset.write((rows[:, None] * 12 + cols[None, :] + 1).astype('uint8'), 1)
+
+            return memfile.read()
+
+    ds = WCSDataSource('wcs', {"host": "http://localhost/geoserver", "workspace": "mapbiomas"})
+
+    with mock.patch.object(ds._wcs, '_get_coverage', side_effect=projected_coverage):
+        values = ds.sample_points(image="mapbiomas", temporal=None, xs=[0.0045, 0.02], ys=[0.0005, 0.005],
+                                  srid=3857, grid=grid, spatial_extent=extent, start_date=None, end_date=None,
+                                  time="2019")
+
+    # The first point is the pixel (row 10, column 5), the second one is outside of the image
+    assert values.tolist() == [10 * 12 + 5 + 1, None]
@@ -0,0 +1,95 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS' single-flight request coalescing."""
+import threading
+import time
+
+import pytest
+
+from wlts import deadline
+from wlts.datasources.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_result(self):
+        group = SingleFlight()
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(group.do('key', upstream))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert results == ['value'] * 8
+        assert len(calls) == 1
+        assert group.in_flight() == 0
+
+    def test_exception_is_propagated(self):
+        group = SingleFlight()
+
+        def upstream():
+            raise ValueError('upstream fail')
+
+        with pytest.raises(ValueError):
+            group.do('key', upstream)
+
+        assert group.in_flight() == 0
+
+    def test_follower_deadline(self):
+        group = SingleFlight()
+        release = threading.Event()
+
+        leader = threading.Thread(target=lambda: group.do('key', release.wait))
+        leader.start()
+        time.sleep(0.05)
+
+        # The follower does not wait beyond its own budget
+        with deadline.deadline(0.05):
+            with pytest.raises(deadline.DeadlineExceeded):
+                group.do('key', lambda: 'value')
+
+        release.set()
+        leader.join()
+
+    def test_follower_retries_after_leader_deadline(self):
+        group = SingleFlight()
+        started = threading.Event()
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            if len(calls) == 1:
+                started.set()
+                time.sleep(0.1)
+                raise deadline.DeadlineExceeded()
+            return 'value'
+
+        errors = []
+
+        def leader():
+            try:
+                group.do('key', upstream)
+            except deadline.DeadlineExceeded as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        started.wait()
+
+        assert group.do('key', upstream) == 'value'
+
+        thread.join()
+
+        assert len(calls) == 2 and len(errors) == 1
@@ -0,0 +1,71 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS slow query log."""
+import json
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from wlts import tracing
+from wlts.slow_query import SlowQueryLog
+
+
+def test_slow_query_log(tmp_path):
+    path = str(tmp_path / 'slow.log')
+    slow_query_log = SlowQueryLog(0.01, path)
+    tracing.add_exporter(slow_query_log)
+
+    try:
+        with tracing.span('request', query={'longitude': -54.0}) as request:
+            with tracing.span('collection.trajectory', collection='deter_amz'):
+                with tracing.span('datasource.get_trajectory', datasource='wfs'):
+                    with tracing.span('http.get', bytes=1024):
+                        time.sleep(0.02)
+            request.set_attribute('response_bytes', 256)
+
+        # A fast request is not logged
+        with tracing.span('request', query={'longitude': -55.0}):
+            pass
+    finally:
+        tracing.remove_exporter(slow_query_log)
+        slow_query_log.close()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    assert len(records) == 1
+
+    record = records[0]
+
+    assert record['query'] == {'longitude': -54.0}
+    assert record['response_bytes'] == 256
+    assert record['upstream_calls'] == 1 and record['upstream_bytes'] == 1024
+    assert record['collections']['deter_amz'] >= 0.02
+    assert record['datasources']['wfs'] >= 0.02
+
+
+def test_slow_query_log_evicts_traces():
+    slow_query_log = SlowQueryLog(10, trace_ttl=60)
+
+    try:
+        with mock.patch('wlts.slow_query.time.monotonic', return_value=0):
+            # A span that finishes after its root is dropped
+            slow_query_log.export(SimpleNamespace(trace_id='a', parent_id=None, duration=0))
+            slow_query_log.export(SimpleNamespace(trace_id='a', parent_id='root', duration=0))
+
+            # A trace whose root never finishes
+            slow_query_log.export(SimpleNamespace(trace_id='b', parent_id='root', duration=0))
+
+        assert list(slow_query_log._traces) == ['b']
+
+        with mock.patch('wlts.slow_query.time.monotonic', return_value=61):
+            slow_query_log.export(SimpleNamespace(trace_id='c', parent_id='root', duration=0))
+
+        assert list(slow_query_log._traces) == ['c'] and not slow_query_log._finished
+    finally:
+        slow_query_log.close()
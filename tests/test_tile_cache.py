@@ -0,0 +1,61 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS' on-disk tile cache."""
+import os
+
+import numpy
+
+from wlts.datasources.tile_cache import TileCache
+
+
+class TestTileCache:
+    def test_get_or_load(self, tmpdir):
+        cache = TileCache(str(tmpdir), 10 * 1024 ** 2)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return numpy.arange(256 * 256, dtype='int16').reshape(256, 256), 0
+
+        values, nodata = cache.get_or_load(('coverage', '2019', 0, 0), loader)
+        cached, cached_nodata = cache.get_or_load(('coverage', '2019', 0, 0), loader)
+
+        assert len(loads) == 1
+        assert isinstance(cached, numpy.memmap)
+        assert cached_nodata == nodata == 0
+        numpy.testing.assert_array_equal(values, cached)
+        assert cache.stats()['hits'] == 1
+
+    def test_lru_eviction(self, tmpdir):
+        tile = numpy.zeros((256, 256), dtype='uint8')
+        cache = TileCache(str(tmpdir), int(tile.nbytes * 3.5))
+
+        for index in range(3):
+            cache.put(('coverage', index), tile, None)
+
+        # The second tile is the least recently used
+        for index, last_access in enumerate([200, 100, 300]):
+            os.utime(cache._path(('coverage', index)) + '.npy', (last_access, last_access))
+
+        cache.put(('coverage', 3), tile, None)
+
+        assert cache.get(('coverage', 1)) is None
+        assert cache.get(('coverage', 0)) is not None
+        assert cache.get(('coverage', 2)) is not None
+        assert cache.get(('coverage', 3)) is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_size(self, tmpdir):
+        tile = numpy.zeros((256, 256), dtype='uint8')
+        cache = TileCache(str(tmpdir), 10 * 1024 ** 2)
+
+        # A tile stored again is counted once
+        for _ in range(3):
+            cache.put(('coverage', 0), tile, None)
+
+        assert cache.stats()['size'] == cache._disk_usage() == os.stat(cache._path(('coverage', 0)) + '.npy').st_size
@@ -0,0 +1,72 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS tracing spans."""
+import json
+
+import pytest
+
+from wlts import tracing
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exporter():
+    exporter = MemoryExporter()
+    tracing.add_exporter(exporter)
+    yield exporter
+    tracing.remove_exporter(exporter)
+
+
+def test_disabled():
+    with tracing.span('trajectory') as span:
+        assert span is None
+    assert tracing.start_span('http.get') is None
+
+
+def test_nested_spans(exporter):
+    with tracing.span('trajectory', longitude=-54.0) as root:
+        with tracing.span('collection.trajectory', collection='deter_amz'):
+            tracing.add_to_attribute('tile_cache_hits')
+            tracing.add_to_attribute('tile_cache_hits')
+
+        with pytest.raises(ValueError):
+            with tracing.span('collection.trajectory', collection='prodes'):
+                raise ValueError('upstream error')
+
+    first, second, trajectory = exporter.spans
+
+    assert trajectory is root and trajectory.parent_id is None
+    assert first.parent_id == second.parent_id == root.span_id
+    assert first.trace_id == root.trace_id
+    assert first.attributes == {'collection': 'deter_amz', 'tile_cache_hits': 2}
+    assert 'upstream error' in second.attributes['error']
+    assert tracing.current_span() is None
+
+
+def test_json_lines_exporter(tmp_path):
+    exporter = tracing.JSONLinesExporter(str(tmp_path / 'spans.jsonl'))
+    tracing.add_exporter(exporter)
+
+    try:
+        with tracing.span('trajectory'):
+            pass
+    finally:
+        tracing.remove_exporter(exporter)
+        exporter.close()
+
+    with open(tmp_path / 'spans.jsonl') as f:
+        record = json.loads(f.readline())
+
+    assert record['name'] == 'trajectory' and record['duration'] >= 0
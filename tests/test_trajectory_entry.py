@@ -0,0 +1,36 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS trajectory entries."""
+from wlts.collections.trajectory_entry import (TrajectoryEntry,
+                                               merge_trajectories, to_columnar)
+
+
+def test_merge_trajectories():
+    prodes = [TrajectoryEntry('prodes', 'Floresta', '2008'), TrajectoryEntry('prodes', 'Desmatamento', '2010')]
+    deter = [TrajectoryEntry('deter', 'Corte Raso', '2009'), TrajectoryEntry('deter', 'Degradacao', '2007')]
+
+    merged = merge_trajectories([prodes, deter])
+
+    assert [entry.date for entry in merged] == ['2007', '2008', '2009', '2010']
+    assert merged[0].to_dict() == {'collection': 'deter', 'class': 'Degradacao', 'date': '2007'}
+
+
+def test_to_columnar_rle():
+    trajectory = [TrajectoryEntry('mapbiomas', classe, str(year))
+                  for year, classe in zip(range(2000, 2005), ['A', 'A', 'A', 'B', 'A'])]
+
+    columnar = to_columnar([trajectory], rle=True)
+
+    assert columnar == {
+        'mapbiomas': {
+            'dates': ['2000', '2001', '2002', '2003', '2004'],
+            'classes': ['A', 'B', 'A'],
+            'runs': [3, 1, 1]
+        }
+    }
+    assert 'runs' not in to_columnar([trajectory])['mapbiomas']
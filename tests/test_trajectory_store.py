@@ -0,0 +1,115 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS trajectory store."""
+import os
+from types import SimpleNamespace
+
+import numpy
+import pytest
+from shapely.geometry import box
+
+from wlts.datasources.trajectory_store import TrajectoryStore, TrajectoryStoreDataSource, ingest
+
+# A 10 x 10 pixels image of 0.01 degrees, stored in chunks of 4 x 4 pixels
+EXTENT = {"xmin": -54.0, "xmax": -53.9, "ymin": -11.1, "ymax": -11.0}
+GRID = {"column": 4, "row": 4, "resolution": {"x": 0.01, "y": 0.01}}
+TIMELINE = ["2018", "2019"]
+
+
+def pixel_value(row, col, time):
+    """Return the image value of a pixel, nodata (0) outside of the image."""
+    inside = (row < 10) & (col < 10)
+    return numpy.where(inside, row * 10 + col + 1 + 100 * TIMELINE.index(time), 0).astype('uint8')
+
+
+def read_tile(image, time, tile_grid, tile_x, tile_y, srid=4326):
+    rows, cols = numpy.mgrid[0:tile_grid.tile_size, 0:tile_grid.tile_size]
+    return pixel_value(rows + tile_y * tile_grid.tile_size, cols + tile_x * tile_grid.tile_size, time), 0
+
+
+def make_store(path, grid=GRID, extent=EXTENT, srid=4326, read=read_tile):
+    collection = SimpleNamespace(grid=grid, spatial_extent=extent, timeline=TIMELINE, image="mapbiomas",
+                                 spatial_ref_system={"srid": srid}, get_name=lambda: "mapbiomas",
+                                 get_datasource=lambda: SimpleNamespace(read_tile=read))
+
+    return list(ingest(collection, os.path.join(str(path), "mapbiomas"), 4))
+
+
+def test_ingest(tmp_path):
+    progress = make_store(tmp_path)
+
+    assert progress[-1] == (9, 9) and len(progress) == 9
+
+    store = TrajectoryStore(os.path.join(str(tmp_path), "mapbiomas"))
+
+    assert store.read_series(-53.955, -11.045).tolist() == [45, 145]
+    assert store.read_series(-53.895, -11.045) is None
+    assert not [name for name in os.listdir(os.path.join(str(tmp_path), "mapbiomas", "chunks"))
+                if name.endswith('.tmp')]
+
+
+def test_store_datasource(tmp_path):
+    make_store(tmp_path)
+
+    ds = TrajectoryStoreDataSource('store', {"path": str(tmp_path)})
+
+    args = dict(image="mapbiomas", temporal=None, srid=4326, grid=GRID, spatial_extent=EXTENT,
+                start_date=None, end_date=None, time="2019")
+
+    xs = [-53.995, -53.955, -53.905, -53.895]
+    ys = [-11.005, -11.045, -11.095, -11.005]
+
+    values = ds.sample_points(xs=xs, ys=ys, **args)
+
+    # The points outside of the image are masked
+    assert values.tolist() == [101, 145, 200, None]
+
+    for x, y, value in zip(xs, ys, values.tolist()):
+        result = ds.get_trajectory(x=x, y=y, **args)
+        assert (result and result['raster_value']) == value
+
+    assert ds.sample_points(xs=xs, ys=ys, **dict(args, start_date="2020")) is None
+
+    # The pixels of the columns 3 and 4 of the first two rows, the area crosses a chunk boundary
+    args.pop("spatial_extent")
+    area = ds.get_area(geom=box(-53.97, -11.02, -53.95, -11.0), **dict(args, time="2018"))
+
+    assert area["values"].tolist() == [4, 5, 14, 15]
+    assert area["counts"].tolist() == [1] * 4
+    assert area["areas"].tolist() == pytest.approx([1.2137e6] * 4, rel=1e-3)
+
+    # The area outside of the image has no pixel
+    assert ds.get_area(geom=box(-53.8, -11.02, -53.7, -11.0), **args)["values"].tolist() == []
+
+
+def test_ingest_projected(tmp_path):
+    # A 0.01 degree square at the equator, stored in EPSG:3857 pixels of 100 m
+    extent = {"xmin": 0.0, "xmax": 0.01, "ymin": 0.0, "ymax": 0.01}
+    grid = {"column": 4, "row": 4, "resolution": {"x": 100, "y": 100}}
+
+    def read_projected_tile(image, time, tile_grid, tile_x, tile_y, srid=4326):
+        assert srid == 3857 and tile_grid.origin_y == pytest.approx(1113.19, abs=0.01)
+        rows, cols = numpy.mgrid[0:tile_grid.tile_size, 0:tile_grid.tile_size]
+        rows, cols = rows + tile_y * tile_grid.tile_size, cols + tile_x * tile_grid.tile_size
+        return numpy.where((rows < 12) & (cols < 12), rows * 12 + cols + 1, 0).astype('uint8'), 0
+
+    progress = make_store(tmp_path, grid=grid, extent=extent, srid=3857, read=read_projected_tile)
+
+    # 12 x 12 pixels in chunks of 4 x 4
+    assert progress[-1] == (9, 9)
+
+    store = TrajectoryStore(os.path.join(str(tmp_path), "mapbiomas"))
+
+    assert (store.index['width'], store.index['height']) == (12, 12)
+
+    ds = TrajectoryStoreDataSource('store', {"path": str(tmp_path)})
+
+    result = ds.get_trajectory(image="mapbiomas", temporal=None, x=0.0045, y=0.0005, srid=3857, grid=grid,
+                               spatial_extent=extent, start_date=None, end_date=None, time="2019")
+
+    assert result['raster_value'] == 10 * 12 + 5 + 1
@@ -0,0 +1,46 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS utils."""
+import numpy
+from shapely.geometry import Point, box
+
+from wlts.utils import GeometryIndex, get_transformer, transform_bounds, transform_geometry, transform_points
+
+
+def test_transform_points():
+    xs, ys = transform_points([0.0, 180.0], [0.0, 0.0], 4326, 3857)
+
+    numpy.testing.assert_allclose(xs, [0.0, 20037508.342789244])
+    numpy.testing.assert_allclose(ys, [0.0, 0.0], atol=1e-6)
+
+    assert get_transformer(4326, 3857) is get_transformer(4326, 3857)
+
+
+def test_transform_same_srid():
+    xs, ys = transform_points([-54.0], [-12.0], 4326, 4326)
+
+    assert xs.tolist() == [-54.0] and ys.tolist() == [-12.0]
+
+    geom = box(-54, -12, -53, -11)
+
+    assert transform_geometry(geom, 4326, 4326) is geom
+
+
+def test_transform_bounds():
+    min_x, min_y, max_x, max_y = transform_bounds((-1.0, -1.0, 1.0, 1.0), 4326, 3857)
+
+    assert min_x < 0 < max_x and min_y < 0 < max_y
+    numpy.testing.assert_allclose(max_x, 111319.49079327357)
+
+
+def test_geometry_index():
+    index = GeometryIndex([box(0, 0, 2, 2), box(1, 1, 3, 3), box(10, 10, 11, 11)])
+
+    assert index.intersecting(Point(1.5, 1.5)) == [0, 1]
+    assert index.intersecting(Point(2.5, 0.5)) == []
+    assert GeometryIndex([]).intersecting(Point(0, 0)) == []
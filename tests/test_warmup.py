@@ -0,0 +1,86 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS cache warm-up."""
+from unittest import mock
+
+from wlts.collections.collection_manager import collection_manager
+from wlts.warmup import WarmupManager, WarmupTask, expand_targets, warmup_collections
+
+
+def test_expand_targets():
+    xs, ys = expand_targets(points=[[-54.0, -12.0]], bboxes=[[-54.0, -12.0, -53.98, -11.99]], step=0.01)
+
+    assert len(xs) == len(ys) == 1 + 2
+    assert (xs[0], ys[0]) == (-54.0, -12.0)
+    assert all(-54.0 <= x <= -53.98 for x in xs[1:]) and all(-12.0 <= y <= -11.99 for y in ys[1:])
+
+
+def test_warmup_collections():
+    # Without the tile cache there is nothing to warm
+    with mock.patch('wlts.warmup.get_tile_cache', return_value=None):
+        assert warmup_collections() == []
+
+    def collection(name, collection_type, grid, ds_type):
+        return mock.Mock(grid=grid, get_name=lambda: name, collection_type=lambda: collection_type,
+                         get_datasource=lambda: mock.Mock(get_type=lambda: ds_type))
+
+    collections = [collection('mapbiomas', 'Image', {'resolution': {'x': 30, 'y': 30}}, 'WCS'),
+                   collection('prodes', 'Image', {'column': 4, 'row': 4}, 'WCS'),
+                   collection('mapbiomas_store', 'Image', {'resolution': {'x': 30, 'y': 30}}, 'TRAJECTORY_STORE'),
+                   collection_manager.get_collection('deter_amz')]
+
+    with mock.patch('wlts.warmup.get_tile_cache', return_value=mock.Mock()), \
+            mock.patch.object(collection_manager, 'get_all_collections', return_value=collections):
+        # Only the WCS images read by tiles are cached
+        assert warmup_collections() == ['mapbiomas']
+        assert warmup_collections(['deter_amz']) == []
+
+
+def test_warmup_task_skipped():
+    with mock.patch('wlts.warmup.get_tile_cache', return_value=None):
+        task = WarmupTask({'points': [[-54.0, -12.0]]})
+
+    with mock.patch('wlts.warmup.Trajectory.get_batch_trajectory') as batch:
+        task.run()
+
+    assert not batch.called and task.progress()['state'] == 'skipped'
+
+
+def test_warmup_schedule_lock(tmp_path):
+    lock_path = str(tmp_path / '.warmup.lock')
+
+    with mock.patch.object(WarmupManager, 'start') as first_start, \
+            mock.patch('wlts.warmup.WarmupTask', side_effect=AssertionError):
+        first, second = WarmupManager(), WarmupManager()
+
+        # Only one of the workers runs the scheduled warm-up
+        assert first.schedule({}, lock_path=lock_path)
+        assert not second.schedule({}, lock_path=lock_path)
+        first._scheduler.join()
+
+    assert first_start.call_count == 1
+    first._lock_file.close()
+
+
+def test_warmup_task():
+    with mock.patch('wlts.warmup.warmup_collections', return_value=['mapbiomas']):
+        task = WarmupTask({'collections': ['mapbiomas'], 'bboxes': [[-54.0, -12.0, -53.0, -11.9]],
+                           'step': 0.1, 'rate': 1000})
+
+    with mock.patch('wlts.warmup.Trajectory.get_batch_trajectory', side_effect=[None, RuntimeError('down')]) as batch:
+        task.batch_size = 5
+        task.run()
+
+    assert batch.call_count == 2
+    assert batch.call_args[0][0] == ['mapbiomas']
+
+    progress = task.progress()
+
+    assert progress['state'] == 'finished'
+    assert progress['total'] == progress['done'] == 10
+    assert progress['errors'] == 1 and 'down' in progress['last_error']
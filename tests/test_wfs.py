@@ -0,0 +1,116 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Unit-test for WLTS WFS datasource."""
+import json
+from unittest import mock
+
+from shapely.geometry import box, mapping
+
+from wlts.config import Config
+from wlts.datasources.wfs import WFSDataSource
+
+FEATURES = [
+    {"type": "Feature", "geometry": mapping(box(-54.0, -12.0, -53.0, -11.0)),
+     "properties": {"classname": "DESMATAMENTO", "date": "2018-08-01"}},
+    {"type": "Feature", "geometry": mapping(box(-53.5, -11.5, -52.5, -10.5)),
+     "properties": {"classname": "DEGRADACAO", "date": "2019-08-01"}}
+]
+
+ARGS = {
+    "feature_name": "deter_amz",
+    "temporal": {"type": "DATE", "string_format": "%Y-%m-%d"},
+    "obs": [{"temporal_property": "date", "class_property": "classname"}],
+    "geom_property": {"property_name": "geom", "srid": 4326},
+    "start_date": None,
+    "end_date": None
+}
+
+
+def test_trajectory():
+    ds = WFSDataSource('wfs', {"host": "http://localhost/geoserver", "workspace": "deter-amz"})
+    urls = []
+
+    features = [{"type": "Feature", "geometry": None,
+                 "properties": {"class_2018": "DESMATAMENTO", "date_2018": "2018-08-01Z",
+                                "class_2019": "DEGRADACAO", "date_2019": "2019-08-01Z"}}]
+
+    def stream(uri, chunk_size=16384):
+        urls.append(uri)
+        yield json.dumps({"type": "FeatureCollection", "features": features}).encode('utf-8')
+
+    obs = [{"temporal_property": "date_2018", "class_property": "class_2018"},
+           {"temporal_property": "date_2019", "class_property": "class_2019"}]
+
+    with mock.patch.object(ds._wfs, '_stream', stream):
+        observations = ds.get_trajectory(x=-53.75, y=-11.75, **dict(ARGS, obs=obs, end_date='2019-08-01'))
+
+    # A single request with the properties of every observation, the period is checked locally
+    assert len(urls) == 1
+    assert 'INTERSECTS(geom, POINT (-53.75 -11.75))' in urls[0] and 'date' not in urls[0].split('CQL_FILTER')[1]
+    assert 'propertyName=class_2018,class_2019,date_2018,date_2019' in urls[0]
+
+    # The feature of the end date is kept
+    assert [(o["temporal_property"], f[o["class_property"]]) for o, f in observations] == \
+        [("date_2018", "DESMATAMENTO"), ("date_2019", "DEGRADACAO")]
+
+    with mock.patch.object(ds._wfs, '_stream', stream):
+        observations = ds.get_trajectory(x=-53.75, y=-11.75, **dict(ARGS, obs=obs, start_date='2019'))
+
+    assert [o["temporal_property"] for o, _ in observations] == ["date_2019"]
+
+
+def test_trajectory_yearly():
+    ds = WFSDataSource('wfs', {"host": "http://localhost/geoserver", "workspace": "prodes"})
+
+    features = [{"type": "Feature", "geometry": None,
+                 "properties": {"class_2016": "Floresta", "class_2017": "Desmatamento", "class_2018": "Desmatamento"}}]
+
+    def stream(uri, chunk_size=16384):
+        yield json.dumps({"type": "FeatureCollection", "features": features}).encode('utf-8')
+
+    args = dict(ARGS, temporal={"type": "STRING", "string_format": "%Y"},
+                obs=[{"temporal_property": year, "class_property": "class_" + year}
+                     for year in ("2016", "2017", "2018")],
+                start_date='2016-06-01', end_date='2017-03-01')
+
+    # The period is compared by year, as the observations
+    with mock.patch.object(ds._wfs, '_stream', stream):
+        observations = ds.get_trajectory(x=-53.75, y=-11.75, **args)
+
+    assert [o["temporal_property"] for o, _ in observations] == ["2016", "2017"]
+
+
+def test_trajectory_batch():
+    ds = WFSDataSource('wfs', {"host": "http://localhost/geoserver", "workspace": "deter-amz"})
+    urls = []
+
+    def stream(uri, chunk_size=16384):
+        urls.append(uri)
+        yield json.dumps({"type": "FeatureCollection", "features": FEATURES}).encode('utf-8')
+
+    with mock.patch.object(Config, 'WLTS_WFS_BATCH_SIZE', 2), mock.patch.object(ds._wfs, '_stream', stream):
+        results = ds.get_trajectory_batch(xs=[-53.75, -53.25, -52.75], ys=[-11.75, -11.25, -10.75], **ARGS)
+
+    # One request for each chunk of points
+    assert len(urls) == 2
+    assert 'MULTIPOINT' in urls[0] and 'propertyName=classname,date,geom' in urls[0]
+
+    assert [[feature["classname"] for _, feature in observations] for observations in results] == \
+        [["DESMATAMENTO"], ["DESMATAMENTO"], ["DEGRADACAO"]]
+
+
+def test_long_request_post():
+    ds = WFSDataSource('wfs', {"host": "http://localhost/geoserver", "workspace": "deter-amz"})
+    response = mock.Mock(status_code=200, content=b'{}')
+
+    with mock.patch.object(Config, 'WLTS_WFS_MAX_URL_LENGTH', 10), \
+            mock.patch('wlts.datasources.wfs.requests.post', return_value=response) as post:
+        ds._wfs._get(ds._wfs.mount_url('deter-amz:deter_amz', filter='&CQL_FILTER=classname = \'DEGRADACAO\''))
+
+    assert post.call_args[0][0] == 'http://localhost/geoserver/wfs'
+    assert ('CQL_FILTER', "classname = 'DEGRADACAO'") in post.call_args[1]['data']
@@ -40,16 +40,41 @@ def setup_app(app):
     def handle_exception(e):
         """Handle exceptions."""
         if isinstance(e, HTTPException):
-            return {'code': e.code, 'description': e.description}, e.code
+            headers = dict()
+            if getattr(e, 'retry_after', None):
+                headers['Retry-After'] = str(e.retry_after)
+
+            return {'code': e.code, 'description': e.description}, e.code, headers
 
         app.logger.exception(e)
 
         return {'code': InternalServerError.code,
                 'description': InternalServerError.description}, InternalServerError.code
 
+    from . import tracing
+    from .admin import bp as admin_bp
+    from .formats import compress_response
     from .views import bp
 
+    app.after_request(compress_response)
+
+    if app.config.get('WLTS_TRACE_FILE'):
+        tracing.add_exporter(tracing.get_file_exporter(app.config['WLTS_TRACE_FILE']))
+
+    if app.config.get('WLTS_SLOW_QUERY_THRESHOLD') is not None:
+        from .slow_query import get_slow_query_log
+
+        tracing.add_exporter(get_slow_query_log(app.config['WLTS_SLOW_QUERY_THRESHOLD'],
+                                                app.config.get('WLTS_SLOW_QUERY_LOG'),
+                                                app.config.get('WLTS_SLOW_QUERY_TRACE_TTL', 300)))
+
     app.register_blueprint(bp)
+    app.register_blueprint(admin_bp)
+
+    if app.config.get('WLTS_WARMUP_FILE'):
+        from .warmup import schedule_warmup
+
+        schedule_warmup(app.config['WLTS_WARMUP_FILE'], app.config.get('WLTS_WARMUP_INTERVAL'))
 
 
 app = create_app(os.environ.get('WLTS_ENVIRONMENT', 'DevelopmentConfig'))
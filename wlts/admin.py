@@ -0,0 +1,171 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Administration views of Web Land Trajectory Service."""
+import hmac
+from functools import wraps
+
+from bdc_core.decorators.validators import require_model
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.exceptions import BadRequest, Forbidden, NotFound, Unauthorized
+
+from .caches import CacheSelector, get_caches
+from .collections.collection_manager import collection_manager
+from .datasources.ds_manager import datasource_manager
+from .schemas import cache_invalidation, warmup
+from .warmup import warmup_manager
+
+bp = Blueprint('admin', import_name=__name__, url_prefix='/wlts/admin')
+
+
+def require_admin_token(f):
+    """Decorator to allow only requests with the ``WLTS_ADMIN_TOKEN`` bearer token.
+
+    The administration operations are disabled while the token is not configured.
+    """
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        token = current_app.config.get('WLTS_ADMIN_TOKEN')
+
+        if not token:
+            raise Forbidden('The administration operations are disabled')
+
+        authorization = request.headers.get('Authorization', '')
+
+        if not authorization.startswith('Bearer ') or \
+                not hmac.compare_digest(authorization[len('Bearer '):].encode(), token.encode()):
+            raise Unauthorized('Invalid administration token')
+
+        return f(*args, **kwargs)
+
+    return wrapped
+
+
+@bp.route('/warmup', methods=['POST'])
+@require_admin_token
+@require_model(warmup)
+def start_warmup():
+    """Start a cache warm-up in background.
+
+    :returns: Warm-up progress
+    :rtype: dict
+    """
+    task = warmup_manager.start(request.get_json())
+
+    return jsonify(task.progress()), 202
+
+
+@bp.route('/warmup', methods=['GET'])
+@require_admin_token
+def warmup_progress():
+    """Retrieves the progress of the last cache warm-up.
+
+    :returns: Warm-up progress
+    :rtype: dict
+    """
+    progress = warmup_manager.progress()
+
+    if progress is None:
+        raise NotFound('No warm-up task')
+
+    return jsonify(progress)
+
+
+@bp.route('/warmup', methods=['DELETE'])
+@require_admin_token
+def cancel_warmup():
+    """Cancel the running cache warm-up.
+
+    :returns: Warm-up progress
+    :rtype: dict
+    """
+    warmup_manager.cancel()
+
+    return warmup_progress()
+
+
+@bp.route('/caches', methods=['GET'])
+@require_admin_token
+def caches_stats():
+    """Retrieves the statistics of each cache, as its entries, hit ratio and eviction rate.
+
+    :returns: Statistics of each cache
+    :rtype: dict
+    """
+    return jsonify({name: cache.stats() for name, cache in get_caches().items()})
+
+
+def make_selector(spec):
+    """Build the CacheSelector of a cache invalidation request.
+
+    The collections select the entries of their image or feature layer and the
+    datasources the entries of their server.
+
+    Args:
+        spec (dict): The cache invalidation request.
+
+    Raises:
+        BadRequest: If a date is invalid.
+        NotFound: If a collection or a datasource does not exist.
+    """
+    names = None
+    if spec.get('collections'):
+        names = set()
+        for collection_name in spec['collections']:
+            collection = collection_manager.get_collection(collection_name)
+
+            if collection is None:
+                raise NotFound('Collection "{}" not found'.format(collection_name))
+
+            layer = getattr(collection, 'image', None) or getattr(collection, 'feature_name', None)
+            workspace = getattr(collection.get_datasource(), 'workspace', None)
+
+            names.add('{}:{}'.format(workspace, layer) if workspace else layer)
+
+    hosts = None
+    if spec.get('datasources'):
+        hosts = set()
+        for ds_id in spec['datasources']:
+            ds = datasource_manager.get_datasource(ds_id)
+
+            if ds is None:
+                raise NotFound('Datasource "{}" not found'.format(ds_id))
+
+            client = getattr(ds, '_wcs', None) or getattr(ds, '_wfs', None)
+
+            if client is not None:
+                hosts.add(client.host)
+
+    try:
+        return CacheSelector(hosts=hosts, names=names, start_date=spec.get('start_date'),
+                             end_date=spec.get('end_date'), bbox=spec.get('bbox'))
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+@bp.route('/caches/invalidate', methods=['POST'])
+@require_admin_token
+@require_model(cache_invalidation)
+def invalidate_caches():
+    """Remove the cache entries of collections, datasources, a time interval and an area.
+
+    :returns: Number of removed entries of each cache
+    :rtype: dict
+    """
+    spec = request.get_json()
+
+    selector = make_selector(spec)
+
+    caches = get_caches()
+
+    for name in spec.get('caches', []):
+        if name not in caches:
+            raise NotFound('Cache "{}" not found'.format(name))
+
+    names = spec.get('caches') or list(caches)
+
+    return jsonify({"removed": {name: caches[name].invalidate(selector) for name in names}})
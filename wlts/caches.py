@@ -0,0 +1,213 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Cache registry of Web Land Trajectory Service.
+
+Each cache of the service is registered with a name. A cache reports its statistics
+with ``stats()`` and removes the entries selected by a :class:`CacheSelector` with
+``invalidate(selector)``, which returns the number of removed entries.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from shapely.geometry import Point, box
+
+from .utils import WGS84, get_date_from_str, transform_bounds
+
+_caches = dict()
+
+
+class CacheSelector:
+    """This class selects the cache entries of a set of servers, layers, times and area.
+
+    An entry is selected when it matches every given criterion. An entry that can not
+    be tested against a criterion, as a classification system lookup (without time and
+    area) against an area, is not selected.
+    """
+
+    def __init__(self, hosts=None, names=None, start_date=None, end_date=None, bbox=None):
+        """Create a CacheSelector.
+
+        Args:
+            hosts (:obj:`set`, optional): The server URLs.
+            names (:obj:`set`, optional): The layer (image or feature type) names, with their workspace.
+            start_date (:obj:`str`, optional): The begin of a time interval.
+            end_date (:obj:`str`, optional): The end of a time interval.
+            bbox (:obj:`list`, optional): The area as [xmin, ymin, xmax, ymax] according to EPSG:4326.
+        """
+        self.hosts = set(hosts) if hosts is not None else None
+        self.names = set(names) if names is not None else None
+        self.start_date = get_date_from_str(start_date) if start_date else None
+        self.end_date = get_date_from_str(end_date) if end_date else None
+        self.bbox = box(*bbox) if bbox else None
+
+    def match(self, host=None, name=None, time=None, bounds=None, srid=WGS84):
+        """Return True when an entry matches the selector.
+
+        Args:
+            host (:obj:`str`, optional): The server URL of the entry.
+            name (:obj:`str`, optional): The layer name of the entry.
+            time (:obj:`str`, optional): The time of the entry.
+            bounds (:obj:`tuple`, optional): The extent of the entry as (min_x, min_y, max_x, max_y).
+            srid (int): The EPSG code of the extent.
+        """
+        if self.hosts is not None and (host is None or host not in self.hosts):
+            return False
+
+        if self.names is not None and (name is None or name not in self.names):
+            return False
+
+        if self.start_date or self.end_date:
+            if time is None:
+                return False
+
+            date = get_date_from_str(str(time)[:10])
+
+            if self.start_date and date < self.start_date:
+                return False
+            if self.end_date and date > self.end_date:
+                return False
+
+        if self.bbox is not None:
+            if bounds is None or not self.bbox.intersects(box(*transform_bounds(bounds, srid, WGS84))):
+                return False
+
+        return True
+
+
+class MemoCache:
+    """This class implements a least recently used cache of the results of a client method.
+
+    It replaces ``functools.lru_cache`` where the entries must be selectively removed:
+    each entry keeps the description of the request it answers.
+    """
+
+    def __init__(self, maxsize=128, describe=None):
+        """Create a MemoCache.
+
+        Args:
+            maxsize (int): The maximum number of entries.
+            describe (:obj:`callable`, optional): Function that returns the :meth:`CacheSelector.match`
+                arguments of a call, it receives the client instance and the call arguments.
+        """
+        self.maxsize = maxsize
+        self.describe = describe
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.created = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_call(self, function, instance, *args, **kwargs):
+        """Return the cached result of a call, calling the function when it is not cached."""
+        key = (instance, args, tuple(sorted(kwargs.items())))
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+            self.misses += 1
+
+        value = function(instance, *args, **kwargs)
+
+        description = self.describe(instance, *args, **kwargs) if self.describe is not None else dict()
+
+        with self._lock:
+            self._entries[key] = (value, description)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return value
+
+    def invalidate(self, selector):
+        """Remove the entries selected by a CacheSelector."""
+        with self._lock:
+            keys = [key for key, (_, description) in self._entries.items() if selector.match(**description)]
+
+            for key in keys:
+                del self._entries[key]
+
+        return len(keys)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the cache statistics."""
+        return cache_stats(entries=len(self._entries), size=None, hits=self.hits, misses=self.misses,
+                           evictions=self.evictions, created=self.created)
+
+
+def cache_stats(entries, size, hits, misses, evictions, created):
+    """Return the statistics of a cache with its hit ratio and its eviction rate (per second)."""
+    lookups = hits + misses
+
+    return {
+        'entries': entries,
+        'size': size,
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else None,
+        'evictions': evictions,
+        'eviction_rate': evictions / max(time.time() - created, 1e-9)
+    }
+
+
+def memoize(name, maxsize=128, describe=None):
+    """Decorator to cache the results of a client method in a registered MemoCache.
+
+    Args:
+        name (str): The cache name in the registry.
+        maxsize (int): The maximum number of entries.
+        describe (:obj:`callable`, optional): See :class:`MemoCache`.
+    """
+    cache = register(name, MemoCache(maxsize, describe))
+
+    def decorator(method):
+        @wraps(method)
+        def wrapped(self, *args, **kwargs):
+            return cache.get_or_call(method, self, *args, **kwargs)
+
+        wrapped.cache = cache
+
+        return wrapped
+
+    return decorator
+
+
+def point_bounds(x, y):
+    """Return the extent of a point."""
+    return Point(x, y).bounds
+
+
+def register(name, cache):
+    """Register a cache, it is returned."""
+    _caches[name] = cache
+
+    return cache
+
+
+def unregister(name):
+    """Unregister a cache."""
+    _caches.pop(name, None)
+
+
+def get_caches():
+    """Return the registered caches by name."""
+    return dict(_caches)
@@ -0,0 +1,115 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Command line interface for Web Land Trajectory Service."""
+import click
+
+from .config import Config
+
+
+@click.group()
+def cli():
+    """Web Land Trajectory Service command line."""
+
+
+@cli.command()
+@click.argument('collection_name')
+@click.option('-o', '--output', required=True, type=click.Path(file_okay=False, writable=True),
+              help='Directory of the trajectory store of the collection image.')
+@click.option('--chunk-size', default=Config.WLTS_TRAJECTORY_STORE_CHUNK_SIZE, show_default=True,
+              help='Number of pixels of each chunk side.')
+def ingest(collection_name, output, chunk_size):
+    """Ingest an image collection into a precomputed trajectory store.
+
+    The store directory must be named as the collection image inside the path of a
+    TRAJECTORY_STORE datasource to be served.
+    """
+    from .collections.collection_manager import collection_manager
+    from .datasources.trajectory_store import ingest as ingest_collection
+
+    collection = collection_manager.get_collection(collection_name)
+
+    if collection is None or collection.collection_type() != "Image":
+        raise click.BadParameter(f'Image collection {collection_name} not found', param_hint='COLLECTION_NAME')
+
+    with click.progressbar(length=1, label=f'Ingesting {collection_name}') as bar:
+        for written, total in ingest_collection(collection, output, chunk_size):
+            bar.length = total
+            bar.update(written - bar.pos)
+
+    click.secho(f'Trajectory store of {collection_name} written in {output}', fg='green')
+
+
+@cli.command()
+@click.argument('input_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', required=True, type=click.Path(writable=True),
+              help='Output CSV file or Parquet directory.')
+@click.option('-c', '--collections', default=None, help='Collections identifier delimited by comma (default: all).')
+@click.option('--start-date', default=None, help='The begin of the time interval.')
+@click.option('--end-date', default=None, help='The end of the time interval.')
+@click.option('-f', '--format', 'output_format', type=click.Choice(['csv', 'parquet']), default='csv',
+              show_default=True, help='Output format.')
+@click.option('-w', '--workers', default=1, show_default=True, help='Number of worker processes.')
+@click.option('--batch-size', default=500, show_default=True, help='Number of points of each batch.')
+@click.option('--x-column', default='longitude', show_default=True, help='CSV column with the longitude.')
+@click.option('--y-column', default='latitude', show_default=True, help='CSV column with the latitude.')
+@click.option('--id-column', default=None, help='CSV column or GeoJSON property with the point identifier.')
+@click.option('--resume', is_flag=True, default=False, help='Resume an interrupted extraction.')
+def extract(input_file, output, collections, start_date, end_date, output_format, workers, batch_size,
+            x_column, y_column, id_column, resume):
+    """Extract the trajectory of the points of a CSV or GeoJSON file.
+
+    The trajectories are written as rows (id, longitude, latitude, collection, date, class).
+    """
+    from .extract import CSVWriter, ParquetWriter
+    from .extract import extract as extract_points
+    from .extract import read_points
+
+    points = read_points(input_file, x_column=x_column, y_column=y_column, id_column=id_column)
+
+    try:
+        writer = CSVWriter(output, batch_size, resume=resume) if output_format == 'csv' else \
+            ParquetWriter(output, batch_size, resume=resume)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--batch-size')
+
+    skipped = min(len(points), len(writer.done) * batch_size)
+
+    try:
+        with click.progressbar(length=len(points), label='Extracting trajectories') as bar:
+            bar.update(skipped)
+            for size in extract_points(points, writer, collections=collections.split(',') if collections else None,
+                                       start_date=start_date, end_date=end_date, workers=workers,
+                                       batch_size=batch_size):
+                bar.update(size)
+    finally:
+        writer.close()
+
+    click.secho(f'Trajectories of {len(points)} points written in {output}', fg='green')
+
+
+@cli.command()
+@click.argument('spec_file', type=click.Path(exists=True, dir_okay=False))
+def warmup(spec_file):
+    """Fill the tile cache with the image tiles of a warm-up specification file.
+
+    It runs the warm-up once for the deployment, e.g. before the service workers start.
+    See the ``/wlts/admin/warmup`` specification.
+    """
+    from .warmup import WarmupTask, load_spec
+
+    task = WarmupTask(load_spec(spec_file))
+
+    if not task.collections:
+        raise click.ClickException('No collection reads the tile cache, set WLTS_TILE_CACHE_DIR')
+
+    task.run()
+
+    progress = task.progress()
+
+    click.secho(f'{progress["done"]} points queried, {progress["errors"]} failed batches',
+                fg='red' if progress['errors'] else 'green')
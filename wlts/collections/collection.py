@@ -8,6 +8,8 @@
 """WLTS Collection Class."""
 from abc import ABCMeta, abstractmethod
 
+from werkzeug.exceptions import BadRequest
+
 from wlts.collections.class_system import ClassificationSystemClass as Class
 from wlts.datasources.ds_manager import datasource_manager
 
@@ -110,6 +112,35 @@ class Collection(metaclass=ABCMeta):
         """
         pass
 
+    def trajectory_batch(self, tj_attrs, xs, ys, start_date, end_date):
+        """Method to get the trajectory of a set of points.
+
+        The points are queried one by one, collections with a bulk access path override it.
+
+        Args:
+            tj_attrs (list): The list of trajectories of each point.
+            xs (list): The longitude values according to EPSG:4326.
+            ys (list): The latitude values according to EPSG:4326.
+            start_date (:obj:`str`, optional): The begin of a time interval.
+            end_date (:obj:`str`, optional): The begin of a time interval.
+        """
+        for tj_attr, x, y in zip(tj_attrs, xs, ys):
+            self.trajectory(tj_attr, x, y, start_date, end_date)
+
+    def area_trajectory(self, tj_attr, geom, start_date, end_date):
+        """Method to get the class composition trajectory of an area.
+
+        Args:
+            tj_attr (list): The list of trajectories.
+            geom (shapely.geometry.base.BaseGeometry): A polygon according to EPSG:4326.
+            start_date (:obj:`str`, optional): The begin of a time interval.
+            end_date (:obj:`str`, optional): The begin of a time interval.
+
+        Raises:
+            BadRequest: If the collection does not support area trajectories.
+        """
+        raise BadRequest('Collection "{}" does not support area trajectories'.format(self.get_name()))
+
     @abstractmethod
     def collection_type(self):
         """Abstract Method to get collections type.
@@ -7,8 +7,10 @@
 #
 """WLTS Feature Collection Class."""
 
+from ..config import Config
 from ..utils import get_date_from_str
 from .collection import Collection
+from .trajectory_entry import TrajectoryEntry
 
 
 class FeatureCollection(Collection):
@@ -36,6 +38,11 @@ class FeatureCollection(Collection):
         self.geom_property = collections_info["geom_property"]
         self.observations_properties = collections_info["observations_properties"]
 
+        # Each intersecting feature is a trajectory entry when all_features is set, otherwise only the first one
+        self.max_features = None
+        if collections_info.get("all_features", False):
+            self.max_features = collections_info.get("max_features", Config.WLTS_WFS_MAX_FEATURES)
+
     def collection_type(self):
         """Return collection type."""
         return "Feature"
@@ -51,65 +58,101 @@ class FeatureCollection(Collection):
             end_date (:obj:`str`, optional): The begin of a time interval.
 
          Returns:
-            list: A trajectory object as a list.
+            list: A trajectory as a list of TrajectoryEntry.
         """
         ds = self.datasource
 
-        for obs in self.observations_properties:
-
-            args = {
-                "feature_name": self.feature_name,
-                "temporal": self.temporal,
-                "x": x,
-                "y": y,
-                "obs": obs,
-                "geom_property": self.geom_property,
-                "start_date": start_date,
-                "end_date": end_date
-            }
-
-            result = ds.get_trajectory(**args)
+        args = {
+            "feature_name": self.feature_name,
+            "temporal": self.temporal,
+            "x": x,
+            "y": y,
+            "obs": self.observations_properties,
+            "geom_property": self.geom_property,
+            "start_date": start_date,
+            "end_date": end_date,
+            "max_features": self.max_features
+        }
 
-            obs_info = None
+        # All observations are answered by a single request to the datasource
+        for obs, result in ds.get_trajectory(**args):
+            tj_attr.append(self._entry(obs, result))
 
-            if result is not None:
+    def trajectory_batch(self, tj_attrs, xs, ys, start_date, end_date):
+        """Return the trajectory of a set of points.
 
-                # Get Class information by passing trajectory result
-                if self.temporal["type"] == "STRING":
-                    obs_info = get_date_from_str(obs["temporal_property"])
-                    obs_info = obs_info.strftime(self.temporal["string_format"])
+        The points are queried in chunks with one request each, datasources without
+        a batch access path fall back to one query per point.
 
-                elif self.temporal["type"] == "DATE":
-                    obs_info = result[obs["temporal_property"]]
-
-                # Get Class
-                if self.classification_class.get_type() == "Literal":
-                    class_info = obs["class_property_name"]
+        Args:
+            tj_attrs (list): The list of trajectories of each point.
+            xs (list): The longitude values according to EPSG:4326.
+            ys (list): The latitude values according to EPSG:4326.
+            start_date (:obj:`str`, optional): The begin of a time interval.
+            end_date (:obj:`str`, optional): The begin of a time interval.
+        """
+        ds = self.datasource
 
-                elif self.classification_class.get_type() == "Self":
-                    class_info = result[obs["class_property"]]
-                else:
-                    feature_id = result[obs["class_property"]]
+        if not hasattr(ds, 'get_trajectory_batch'):
+            return super().trajectory_batch(tj_attrs, xs, ys, start_date, end_date)
 
-                    ds_class = self.classification_class.get_class_ds()
+        args = {
+            "feature_name": self.feature_name,
+            "temporal": self.temporal,
+            "xs": xs,
+            "ys": ys,
+            "obs": self.observations_properties,
+            "geom_property": self.geom_property,
+            "start_date": start_date,
+            "end_date": end_date,
+            "max_features": self.max_features
+        }
 
-                    if self.classification_class.get_type() == 'Self':
-                        class_info = ds_class.get_classe(feature_id,
-                                                         self.classification_class.get_class_property_value(),
-                                                         self.classification_class.get_class_property_name(),
-                                                         self.classification_class.get_classification_system_name())
-                    else:
-                        class_info = ds_class.get_classe(feature_id,
-                                                         self.classification_class.get_class_property_value(),
-                                                         self.classification_class.get_class_property_name(),
-                                                         self.classification_class.get_property_name(),
-                                                         class_system=self.get_classification_system_name)
+        for tj_attr, observations in zip(tj_attrs, ds.get_trajectory_batch(**args)):
+            tj_attr.extend(self._entry(obs, result) for obs, result in observations)
 
-                trj = {
-                    "collection": self.get_name(),
-                    "class": class_info,
-                    "date": str(obs_info)
-                }
+    def _entry(self, obs, result):
+        """Return the trajectory entry of an observation of a feature.
 
-                tj_attr.append(trj)
+        Args:
+            obs (dict): The observation properties.
+            result (dict): The feature properties.
 
+        Returns:
+            TrajectoryEntry: The entry.
+        """
+        obs_info = None
+
+        # Get Class information by passing trajectory result
+        if self.temporal["type"] == "STRING":
+            obs_info = get_date_from_str(obs["temporal_property"])
+            obs_info = obs_info.strftime(self.temporal["string_format"])
+
+        elif self.temporal["type"] == "DATE":
+            obs_info = result[obs["temporal_property"]]
+
+        # Get Class
+        if self.classification_class.get_type() == "Literal":
+            class_info = obs["class_property_name"]
+
+        elif self.classification_class.get_type() == "Self":
+            class_info = result[obs["class_property"]]
+        else:
+            feature_id = result[obs["class_property"]]
+
+            ds_class = self.classification_class.get_class_ds()
+
+            if self.classification_class.get_type() == 'Self':
+                class_info = ds_class.get_classe(feature_id,
+                                                 self.classification_class.get_class_property_value(),
+                                                 self.classification_class.get_class_property_name(),
+                                                 self.classification_class.get_classification_system_name())
+            else:
+                class_info = ds_class.get_classe(feature_id,
+                                                 self.classification_class.get_class_property_value(),
+                                                 self.classification_class.get_class_property_name(),
+                                                 self.classification_class.get_property_name(),
+                                                 class_system=self.classification_class
+                                                 .get_classification_system_name())
+
+        return TrajectoryEntry(self.get_name(), class_info, str(obs_info))
@@ -6,8 +6,10 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 """WLTS Image Collection Class."""
+from .. import deadline
 from ..utils import get_date_from_str
 from .collection import Collection
+from .trajectory_entry import TrajectoryEntry
 
 
 class ImageCollection(Collection):
@@ -52,18 +54,22 @@ class ImageCollection(Collection):
             end_date (:obj:`str`, optional): The begin of a time interval.
 
          Returns:
-            list: A trajectory object as a list.
+            list: A trajectory as a list of TrajectoryEntry.
         """
         ds = self.get_datasource()
 
         for obs in self.observations_properties:
             for time in self.timeline:
+                # Stop at the end of the request time budget
+                deadline.check()
+
                 args = {
                     "image": self.image,
                     "temporal": self.temporal,
                     "x": x,
                     "y": y,
                     "grid": self.grid,
+                    "spatial_extent": self.spatial_extent,
                     "srid": self.spatial_ref_system["srid"],
                     "start_date": start_date,
                     "end_date": end_date,
@@ -99,10 +105,146 @@ class ImageCollection(Collection):
                                                          class_system=self.classification_class
                                                          .get_classification_system_name())
 
-                    trj = {
-                        "collection": self.get_name(),
+                    tj_attr.append(TrajectoryEntry(self.get_name(), class_info, str(obs_info)))
+
+    def trajectory_batch(self, tj_attrs, xs, ys, start_date, end_date):
+        """Return the trajectory of a set of points.
+
+        Each timeline step reads every image tile with points only once. Collections
+        without a grid resolution, or whose datasource can not sample a set of points,
+        fall back to one query per point.
+
+        Args:
+            tj_attrs (list): The list of trajectories of each point.
+            xs (list): The longitude values according to EPSG:4326.
+            ys (list): The latitude values according to EPSG:4326.
+            start_date (:obj:`str`, optional): The begin of a time interval.
+            end_date (:obj:`str`, optional): The begin of a time interval.
+        """
+        ds = self.get_datasource()
+
+        if 'resolution' not in self.grid or not hasattr(ds, 'sample_points'):
+            return super().trajectory_batch(tj_attrs, xs, ys, start_date, end_date)
+
+        for obs in self.observations_properties:
+            for time in self.timeline:
+                deadline.check()
+
+                args = {
+                    "image": self.image,
+                    "temporal": self.temporal,
+                    "xs": xs,
+                    "ys": ys,
+                    "grid": self.grid,
+                    "spatial_extent": self.spatial_extent,
+                    "srid": self.spatial_ref_system["srid"],
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "time": time
+                }
+
+                values = ds.sample_points(**args)
+
+                if values is None:
+                    continue
+
+                obs_info = str(get_date_from_str(time).strftime(self.temporal["string_format"]))
+
+                # Get Class of each distinct value only once
+                classes = dict()
+
+                for tj_attr, value in zip(tj_attrs, values.tolist()):
+                    if value is None:
+                        continue
+
+                    if value not in classes:
+                        if self.classification_class.get_type() == "Literal":
+                            classes[value] = obs["class_property_name"]
+
+                        elif self.classification_class.get_type() == "Self":
+                            classes[value] = value
+
+                        else:
+                            ds_class = self.classification_class.get_class_ds()
+
+                            classes[value] = ds_class.get_classe(value,
+                                                                 self.classification_class.get_class_property_value(),
+                                                                 self.classification_class.get_class_property_name(),
+                                                                 self.classification_class.get_property_name(),
+                                                                 class_system=self.classification_class
+                                                                 .get_classification_system_name())
+
+                    tj_attr.append(TrajectoryEntry(self.get_name(), classes[value], obs_info))
+
+    def area_trajectory(self, tj_attr, geom, start_date, end_date):
+        """Return the class composition trajectory of an area.
+
+        Each timeline step reads a single image window covering the area.
+
+        Args:
+            tj_attr (list): The list of trajectories.
+            geom (shapely.geometry.base.BaseGeometry): A polygon according to EPSG:4326.
+            start_date (:obj:`str`, optional): The begin of a time interval.
+            end_date (:obj:`str`, optional): The begin of a time interval.
+
+         Returns:
+            list: A trajectory object as a list.
+        """
+        ds = self.get_datasource()
+
+        for obs in self.observations_properties:
+            for time in self.timeline:
+                deadline.check()
+
+                args = {
+                    "image": self.image,
+                    "temporal": self.temporal,
+                    "geom": geom,
+                    "grid": self.grid,
+                    "srid": self.spatial_ref_system["srid"],
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "time": time
+                }
+
+                result = ds.get_area(**args)
+
+                if result is None:
+                    continue
+
+                obs_info = get_date_from_str(time).strftime(self.temporal["string_format"])
+
+                classes = []
+
+                for value, count, area in zip(result["values"].tolist(), result["counts"].tolist(),
+                                              result["areas"].tolist()):
+                    # Get Class
+                    if self.classification_class.get_type() == "Literal":
+                        class_info = obs["class_property_name"]
+
+                    elif self.classification_class.get_type() == "Self":
+                        class_info = value
+
+                    else:
+                        ds_class = self.classification_class.get_class_ds()
+
+                        class_info = ds_class.get_classe(value,
+                                                         self.classification_class.get_class_property_value(),
+                                                         self.classification_class.get_class_property_name(),
+                                                         self.classification_class.get_property_name(),
+                                                         class_system=self.classification_class
+                                                         .get_classification_system_name())
+
+                    classes.append({
                         "class": class_info,
-                        "date": str(obs_info)
-                    }
+                        "pixels": count,
+                        "area": area
+                    })
+
+                trj = {
+                    "collection": self.get_name(),
+                    "date": str(obs_info),
+                    "classes": classes
+                }
 
-                    tj_attr.append(trj)
+                tj_attr.append(trj)
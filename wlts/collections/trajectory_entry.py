@@ -0,0 +1,104 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS Trajectory Entry."""
+import heapq
+from operator import attrgetter
+
+by_date = attrgetter('date')
+
+
+class TrajectoryEntry:
+    """This class represents an observation of a trajectory.
+
+    It is a compact record (no instance dictionary), many of them are held while a
+    trajectory is built.
+    """
+
+    __slots__ = ('collection', 'classe', 'date')
+
+    def __init__(self, collection, classe, date):
+        """Creates a TrajectoryEntry.
+
+        Args:
+            collection (str): The collection name.
+            classe (str/int): The observed class.
+            date (str): The observation date.
+        """
+        self.collection = collection
+        self.classe = classe
+        self.date = date
+
+    def __repr__(self):
+        """Return the entry representation."""
+        return 'TrajectoryEntry({!r}, {!r}, {!r})'.format(self.collection, self.classe, self.date)
+
+    def __eq__(self, other):
+        """Compare two entries."""
+        if not isinstance(other, TrajectoryEntry):
+            return NotImplemented
+        return (self.collection, self.classe, self.date) == (other.collection, other.classe, other.date)
+
+    def to_dict(self):
+        """Export the entry to Python Dictionary."""
+        return {
+            "collection": self.collection,
+            "class": self.classe,
+            "date": self.date
+        }
+
+
+def merge_trajectories(trajectories):
+    """Merge the trajectories of several collections in date order.
+
+    Each trajectory is sorted first, which is linear when the collection already
+    emitted its entries in date order, then they are combined with a k-way merge.
+
+    Args:
+        trajectories (list): The list of entries of each collection.
+
+    Returns:
+        list: The entries of all trajectories ordered by date.
+    """
+    for trajectory in trajectories:
+        trajectory.sort(key=by_date)
+
+    return list(heapq.merge(*trajectories, key=by_date))
+
+
+def to_columnar(trajectories, rle=False):
+    """Group the trajectories by collection as parallel arrays of dates and classes.
+
+    Args:
+        trajectories (list): The list of entries of each collection, ordered by date.
+        rle (bool): Run-length encode the classes, so ``classes`` has the value of each
+            run of repeated classes and ``runs`` the length of each run.
+
+    Returns:
+        dict: The ``dates`` and ``classes`` of each collection.
+    """
+    result = dict()
+
+    for trajectory in trajectories:
+        for entry in trajectory:
+            columns = result.get(entry.collection)
+
+            if columns is None:
+                columns = result[entry.collection] = {"dates": [], "classes": []}
+                if rle:
+                    columns["runs"] = []
+
+            columns["dates"].append(entry.date)
+
+            if rle and columns["classes"] and columns["classes"][-1] == entry.classe:
+                columns["runs"][-1] += 1
+            else:
+                columns["classes"].append(entry.classe)
+                if rle:
+                    columns["runs"].append(1)
+
+    return result
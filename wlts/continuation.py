@@ -0,0 +1,95 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Continuation tokens of incremental trajectory requests.
+
+A token records, for a point, the date of the newest entry of each collection already
+returned. A request with the token only queries the observations after these dates.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import timedelta
+
+from werkzeug.exceptions import BadRequest
+
+from .utils import get_date_from_str
+
+VERSION = 1
+
+
+def point_key(longitude, latitude):
+    """Return the identifier of a point in the tokens."""
+    return hashlib.sha1('{!r},{!r}'.format(float(longitude), float(latitude)).encode('utf-8')).hexdigest()[:16]
+
+
+def entry_date(date):
+    """Return the date of a trajectory entry date string, as '2016-10-06Z' or '2017'."""
+    return get_date_from_str(str(date)[:10])
+
+
+def encode(longitude, latitude, dates):
+    """Return the continuation token of a point.
+
+    Args:
+        longitude (float): The point longitude.
+        latitude (float): The point latitude.
+        dates (dict): The date (``YYYY-MM-DD``) of the newest entry of each collection.
+
+    Returns:
+        str: The token.
+    """
+    document = {'v': VERSION, 'p': point_key(longitude, latitude), 'c': dates}
+
+    return base64.urlsafe_b64encode(json.dumps(document, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode(token, longitude, latitude):
+    """Return the collection dates of a continuation token.
+
+    Args:
+        token (str): The token.
+        longitude (float): The point longitude of the request.
+        latitude (float): The point latitude of the request.
+
+    Returns:
+        dict: The date (``YYYY-MM-DD``) of the newest entry of each collection.
+
+    Raises:
+        BadRequest: If the token is invalid or was issued for another point.
+    """
+    try:
+        document = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise BadRequest('Invalid continuation token')
+
+    if not isinstance(document, dict) or document.get('v') != VERSION or not isinstance(document.get('c'), dict):
+        raise BadRequest('Invalid continuation token')
+
+    if document.get('p') != point_key(longitude, latitude):
+        raise BadRequest('The continuation token was issued for another point')
+
+    return document['c']
+
+
+def start_after(date, start_date=None):
+    """Return the start date of a query for the observations after a date.
+
+    Args:
+        date (str): The date (``YYYY-MM-DD``) of the newest known observation.
+        start_date (:obj:`str`, optional): The start date of the request.
+
+    Returns:
+        str: The latest of the next day and the request start date.
+    """
+    next_day = get_date_from_str(date) + timedelta(days=1)
+
+    if start_date and get_date_from_str(start_date) > next_day:
+        return start_date
+
+    return next_day.strftime('%Y-%m-%d')
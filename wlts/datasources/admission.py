@@ -0,0 +1,145 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS admission control of datasource calls."""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from werkzeug.exceptions import ServiceUnavailable
+
+from wlts import deadline
+
+
+class DataSourceOverloaded(ServiceUnavailable):
+    """The datasource has no capacity to handle the call, the client should retry later."""
+
+    def __init__(self, description=None, retry_after=None):
+        """Create a DataSourceOverloaded error.
+
+        Args:
+            description (str): The error description.
+            retry_after (int): The number of seconds the client should wait before retrying.
+        """
+        super().__init__(description)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """This class limits the number of concurrent calls to a datasource.
+
+    At most ``max_in_flight`` calls run at once, up to ``max_queue`` other calls wait
+    for a slot during at most ``max_queue_time`` seconds, any call beyond that is
+    rejected immediately with :class:`DataSourceOverloaded`.
+    """
+
+    def __init__(self, name, max_in_flight, max_queue, max_queue_time):
+        """Create an AdmissionController.
+
+        Args:
+            name (str): The name of the controlled resource, used in error messages.
+            max_in_flight (int): The maximum number of concurrent calls.
+            max_queue (int): The maximum number of waiting calls.
+            max_queue_time (float): The maximum time in seconds a call waits for a slot.
+        """
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _reject(self, reason):
+        """Return the error of a rejected call."""
+        return DataSourceOverloaded(f'Datasource {self.name} is overloaded: {reason}',
+                                    retry_after=max(1, math.ceil(self.max_queue_time)))
+
+    @contextmanager
+    def admit(self):
+        """Context manager that holds a call slot while the call runs.
+
+        Nested calls of the same thread reuse the slot of the outer call. The wait for a
+        slot is also bounded by the request deadline.
+
+        Raises:
+            DataSourceOverloaded: If the queue is full or the call waited too long for a slot.
+            DeadlineExceeded: If the request deadline is over while waiting for a slot.
+        """
+        depth = getattr(self._local, 'depth', 0)
+
+        if depth > 0:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        with self._condition:
+            if self.in_flight >= self.max_in_flight or self.queued > 0:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise self._reject('too many queued calls')
+
+                self.queued += 1
+                wait_until = time.monotonic() + deadline.bound(self.max_queue_time)
+
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = wait_until - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            deadline.check()
+                            raise self._reject('queue time exceeded')
+                        self._condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+
+            self.in_flight += 1
+            self.admitted += 1
+
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def stats(self):
+        """Return the admission statistics."""
+        with self._condition:
+            return {
+                'in_flight': self.in_flight,
+                'queue_depth': self.queued,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'max_queue_time': self.max_queue_time,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out
+            }
+
+
+def admission_controlled(method):
+    """Decorator to run a datasource method under the datasource admission controller."""
+    @wraps(method)
+    def wrapped(self, *args, **kwargs):
+        with self.admission.admit():
+            return method(self, *args, **kwargs)
+
+    return wrapped
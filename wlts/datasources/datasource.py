@@ -8,18 +8,31 @@
 """WLTS DataSource Abstract Collection."""
 from abc import ABCMeta, abstractmethod
 
+from wlts.config import Config
+from wlts.datasources.admission import AdmissionController
+
 
 class DataSource(metaclass=ABCMeta):
     """Abstract class to represent an Data Source."""
 
-    def __init__(self, id):
+    def __init__(self, id, ds_info=None):
         """Abstraction to make DataSource.
 
         Args:
             id (str): Identifier of an datasource.
+            ds_info (:obj:`dict`, optional): A datasource information as a dictionary.
+                Its ``admission`` object may define the ``max_in_flight``, ``max_queue``
+                and ``max_queue_time`` of the datasource calls.
         """
         self._id = id
 
+        admission = (ds_info or dict()).get('admission', dict())
+
+        self.admission = AdmissionController(id,
+                                             admission.get('max_in_flight', Config.WLTS_DS_MAX_IN_FLIGHT),
+                                             admission.get('max_queue', Config.WLTS_DS_MAX_QUEUE),
+                                             admission.get('max_queue_time', Config.WLTS_DS_MAX_QUEUE_TIME))
+
     @property
     def get_id(self):
         """Return the datasource identifier (id)."""
@@ -29,3 +42,10 @@ class DataSource(metaclass=ABCMeta):
     def get_type(self):
         """Return the datasource type."""
         pass
+
+    def get_metrics(self):
+        """Return the datasource metrics."""
+        return {
+            'type': self.get_type(),
+            'admission': self.admission.stats()
+        }
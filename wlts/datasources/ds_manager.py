@@ -10,6 +10,9 @@ from json import loads as json_loads
 
 import pkg_resources
 
+from .mirror import MirrorDataSource
+from .replay import ReplayDataSource
+from .trajectory_store import TrajectoryStoreDataSource
 from .wcs import WCSDataSource
 from .wfs import WFSDataSource
 
@@ -32,7 +35,9 @@ class DataSourceFactory:
             Ex: factorys = {"POSTGIS": "PostGisDataSource", "WCS": "WCSDataSource", \
                             "WFS": "WFSDataSource", "RASTER FILE": "RasterFileDataSource"}
         """
-        factorys = {"WFS": "WFSDataSource", "WCS": "WCSDataSource"}
+        factorys = {"WFS": "WFSDataSource", "WCS": "WCSDataSource",
+                    "TRAJECTORY_STORE": "TrajectoryStoreDataSource", "REPLAY": "ReplayDataSource",
+                    "MIRROR": "MirrorDataSource"}
         datasource = eval(factorys[ds_type])(id, conn_info)
         return datasource
 
@@ -78,6 +83,10 @@ class DataSourceManager:
         except ValueError:
             raise RuntimeError(f"Datasource identifier {ds_id} not found in WLTS Datasources!")
 
+    def get_all_datasources(self):
+        """Returns a list with all datasources objects."""
+        return self._datasources
+
     def insert_datasource(self, conn_info):
         """Creates a new datasource and stores in list of datasource.
 
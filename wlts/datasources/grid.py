@@ -0,0 +1,189 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS Tile Grid of image collections."""
+import math
+
+import numpy
+from affine import Affine
+from pyproj import CRS
+from rasterio.features import geometry_mask
+from rasterio.warp import transform_bounds
+from shapely.geometry import mapping
+
+from wlts.utils import WGS84
+
+
+class TileGrid:
+    """This class represents the native pixel grid of an image collection split in square tiles."""
+
+    def __init__(self, origin_x, origin_y, resolution_x, resolution_y, tile_size, columns=None, rows=None):
+        """Create a TileGrid.
+
+        Args:
+            origin_x (float): The x coordinate of the upper left corner of the grid.
+            origin_y (float): The y coordinate of the upper left corner of the grid.
+            resolution_x (float): The pixel width.
+            resolution_y (float): The pixel height.
+            tile_size (int): The number of pixels of each tile side.
+            columns (:obj:`int`, optional): The number of pixel columns of the grid, unbounded when not given.
+            rows (:obj:`int`, optional): The number of pixel rows of the grid, unbounded when not given.
+        """
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.resolution_x = resolution_x
+        self.resolution_y = resolution_y
+        self.tile_size = tile_size
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def from_collection(cls, grid, spatial_extent, tile_size, srid=WGS84):
+        """Create the TileGrid of an image collection in the image reference system.
+
+        Args:
+            grid (dict): The collection grid with the pixel ``resolution`` (``x`` and ``y``) in the
+                image reference system units. It may also define the ``tile_size`` and the ``origin``
+                (``x`` and ``y``), the upper left corner of the image pixels in the image reference system.
+            spatial_extent (dict): The collection extent according to EPSG:4326. Its upper left
+                corner in the image reference system is the grid origin when the grid has no ``origin``.
+            tile_size (int): The default number of pixels of each tile side.
+            srid (int): The EPSG code of the image.
+
+        Returns:
+            TileGrid: The tile grid or None when the collection grid has no resolution.
+        """
+        if 'resolution' not in grid:
+            return None
+
+        resolution_x, resolution_y = grid['resolution']['x'], grid['resolution']['y']
+
+        min_x, min_y, max_x, max_y = (spatial_extent['xmin'], spatial_extent['ymin'],
+                                      spatial_extent['xmax'], spatial_extent['ymax'])
+
+        # The extent edges are densified, a longitude and latitude box is curved in most projections
+        if int(srid) != WGS84:
+            min_x, min_y, max_x, max_y = transform_bounds('EPSG:{}'.format(WGS84), 'EPSG:{}'.format(srid),
+                                                          min_x, min_y, max_x, max_y)
+
+        origin_x, origin_y = (grid['origin']['x'], grid['origin']['y']) if 'origin' in grid else (min_x, max_y)
+
+        # The pixels partially covered by the extent belong to the grid
+        columns = int(math.ceil(round((max_x - origin_x) / resolution_x, 6)))
+        rows = int(math.ceil(round((origin_y - min_y) / resolution_y, 6)))
+
+        return cls(origin_x, origin_y, resolution_x, resolution_y, grid.get('tile_size', tile_size),
+                   columns=columns, rows=rows)
+
+    def pixels(self, xs, ys):
+        """Return the grid column and row of each coordinate.
+
+        Args:
+            xs (numpy.ndarray): The x coordinates.
+            ys (numpy.ndarray): The y coordinates.
+
+        Returns:
+            tuple: The columns and rows as numpy integer arrays.
+        """
+        cols = numpy.floor((numpy.asarray(xs, dtype='float64') - self.origin_x) / self.resolution_x)
+        rows = numpy.floor((self.origin_y - numpy.asarray(ys, dtype='float64')) / self.resolution_y)
+
+        return cols.astype('int64'), rows.astype('int64')
+
+    def contains(self, cols, rows):
+        """Return a boolean array, True where the pixel (column, row) is inside of the grid."""
+        inside = (cols >= 0) & (rows >= 0)
+
+        if self.columns is not None:
+            inside &= cols < self.columns
+        if self.rows is not None:
+            inside &= rows < self.rows
+
+        return inside
+
+    def tiles(self, cols, rows):
+        """Return the tile index (tile column, tile row) of each pixel."""
+        return cols // self.tile_size, rows // self.tile_size
+
+    def tile_bounds(self, tile_x, tile_y):
+        """Return the extent (min_x, min_y, max_x, max_y) of a tile."""
+        min_x = self.origin_x + tile_x * self.tile_size * self.resolution_x
+        max_y = self.origin_y - tile_y * self.tile_size * self.resolution_y
+
+        return (min_x, max_y - self.tile_size * self.resolution_y,
+                min_x + self.tile_size * self.resolution_x, max_y)
+
+    def tile_transform(self, tile_x, tile_y):
+        """Return the affine transform of a tile."""
+        min_x, _, _, max_y = self.tile_bounds(tile_x, tile_y)
+
+        return Affine(self.resolution_x, 0.0, min_x, 0.0, -self.resolution_y, max_y)
+
+
+def pixel_areas(transform, height, srid):
+    """Return the area in square meters of a pixel of each row of a window.
+
+    Args:
+        transform (affine.Affine): The window transform.
+        height (int): The number of rows of the window.
+        srid (int): The EPSG code of the window coordinates.
+    """
+    crs = CRS.from_epsg(int(srid))
+
+    if not crs.is_geographic:
+        return numpy.full(height, abs(transform.a * transform.e))
+
+    # Area of a spherical cell between two parallels using the authalic earth radius
+    radius = 6371007.2
+    top = numpy.radians(transform.f + transform.e * numpy.arange(height))
+    bottom = numpy.radians(transform.f + transform.e * numpy.arange(1, height + 1))
+
+    return radius ** 2 * numpy.radians(abs(transform.a)) * numpy.abs(numpy.sin(top) - numpy.sin(bottom))
+
+
+def class_composition(values, transform, geom, nodata, srid):
+    """Return the class composition of the pixels of a window inside of a geometry.
+
+    The pixels outside the geometry and the nodata pixels are masked out and the
+    remaining pixels are counted by class value.
+
+    Args:
+        values (numpy.ndarray): The window values, it may be a masked array.
+        transform (affine.Affine): The window transform.
+        geom (shapely.geometry.base.BaseGeometry): The geometry in the window reference system.
+        nodata (int/float): The nodata value or None.
+        srid (int): The EPSG code of the window coordinates.
+
+    Returns:
+        dict: The class ``values`` with their pixel ``counts`` and ``areas`` (in square meters),
+        as numpy arrays.
+    """
+    if values.size:
+        mask = geometry_mask([mapping(geom)], out_shape=values.shape, transform=transform,
+                             all_touched=False, invert=True)
+    else:
+        mask = numpy.zeros(values.shape, dtype=bool)
+
+    # The masked pixels of a masked array have no value
+    mask &= ~numpy.ma.getmaskarray(values)
+    values = numpy.ma.getdata(values)
+
+    if nodata is not None:
+        mask &= values != nodata
+
+    classes, inverse, counts = numpy.unique(values[mask], return_inverse=True, return_counts=True)
+
+    # Each masked pixel weighted by the area of its row
+    rows = numpy.nonzero(mask)[0]
+    row_areas = pixel_areas(transform, values.shape[0], srid)
+    areas = numpy.bincount(inverse.ravel(), weights=row_areas[rows], minlength=len(classes))
+
+    return {
+        "values": classes,
+        "counts": counts,
+        "areas": areas
+    }
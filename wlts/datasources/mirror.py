@@ -0,0 +1,440 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS Mirror DataSource of WFS feature layers."""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from shapely.geometry import Point, shape
+
+from wlts import tracing
+from wlts.caches import CacheSelector, cache_stats, register
+from wlts.config import Config
+from wlts.datasources.datasource import DataSource
+from wlts.utils import (WGS84, GeometryIndex, get_date_from_str,
+                        transform_points)
+
+
+def _write(directory, path, text):
+    """Write a file atomically, with a temporary file of its own so concurrent workers do not mix their data."""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class LayerMirror:
+    """This class keeps a local copy of the features of a WFS layer.
+
+    The layer is downloaded in pages of ``WLTS_MIRROR_PAGE_SIZE`` features and kept in
+    memory with a spatial index. The features are stored in the ``features.jsonl`` file
+    of the mirror directory and the synchronization state in ``state.json``, so a
+    restarted server answers from the mirror without downloading it again.
+
+    With a temporal property, a refresh only downloads the features from the date of
+    the newest mirrored feature on; features removed from the layer are only dropped
+    by a full reload.
+    """
+
+    def __init__(self, wfs, type_name, srid, directory, temporal_property=None):
+        """Create a LayerMirror.
+
+        Args:
+            wfs (WFS): The WFS client.
+            type_name (str): The layer name, with its workspace.
+            srid (int): The EPSG code of the layer geometries.
+            directory (str): The mirror directory.
+            temporal_property (:obj:`str`, optional): The date property of the features, used
+                to download only the new features.
+        """
+        self.wfs = wfs
+        self.type_name = type_name
+        self.srid = srid
+        self.directory = directory
+        self.temporal_property = temporal_property
+
+        self._snapshot = ([], GeometryIndex([]))
+        self.synced = None
+        self.full_synced = None
+        self.expired = False
+        self.last_error = None
+
+        self._refresh_lock = threading.Lock()
+
+        self._load()
+
+    @property
+    def features(self):
+        """Return the mirrored GeoJSON features."""
+        return self._snapshot[0]
+
+    @property
+    def _features_path(self):
+        """Return the path of the features file."""
+        return os.path.join(self.directory, 'features.jsonl')
+
+    @property
+    def _state_path(self):
+        """Return the path of the state file."""
+        return os.path.join(self.directory, 'state.json')
+
+    def _load(self):
+        """Load the mirrored features, if any."""
+        if not os.path.exists(self._state_path):
+            return
+
+        with open(self._state_path) as f:
+            state = json.load(f)
+
+        with open(self._features_path) as f:
+            features = [json.loads(line) for line in f if line.strip()]
+
+        self._set_features(features)
+
+        self.synced = state['synced']
+        self.full_synced = state['full_synced']
+
+    def _set_features(self, features):
+        """Replace the features and their spatial index."""
+        features = [feature for feature in features if feature.get('geometry')]
+
+        index = GeometryIndex([shape(feature['geometry']) for feature in features])
+
+        # The queries read the features with their index, both are replaced in a single assignment
+        self._snapshot = (features, index)
+
+    def _last_date(self):
+        """Return the date of the newest mirrored feature."""
+        dates = [get_date_from_str(str(feature['properties'][self.temporal_property])[:10])
+                 for feature in self.features if feature['properties'].get(self.temporal_property)]
+
+        return max(dates) if dates else None
+
+    def _download(self, filter):
+        """Download the features that match a filter, page by page."""
+        features = []
+
+        while True:
+            page = self.wfs.get_features(self.type_name, self.srid, filter, max_features=Config.WLTS_MIRROR_PAGE_SIZE,
+                                         geometry=True, start_index=len(features))
+            features.extend(page)
+
+            if len(page) < Config.WLTS_MIRROR_PAGE_SIZE:
+                return features
+
+    def refresh(self, full=False):
+        """Download the new features of the layer.
+
+        Args:
+            full (bool): True to download the whole layer even with a temporal property.
+        """
+        with self._refresh_lock:
+            try:
+                last_date = self._last_date() if self.temporal_property and not full else None
+
+                if last_date is None:
+                    features = self._download('')
+                    full = True
+                else:
+                    # The features of the last date are downloaded again, they are matched by identifier
+                    filter = "&CQL_FILTER={} >= {}".format(self.temporal_property, last_date.strftime('%Y-%m-%d'))
+                    new_features = self._download(filter)
+
+                    identifiers = set(feature['id'] for feature in new_features if feature.get('id') is not None)
+                    features = [feature for feature in self.features
+                                if feature.get('id') is None or feature['id'] not in identifiers]
+                    features.extend(new_features)
+            except Exception as e:
+                self.last_error = repr(e)
+                raise
+
+            self._save(features)
+            self._set_features(features)
+
+            self.synced = time.time()
+            if full:
+                self.full_synced = self.synced
+
+            self._save_state()
+            self.expired = False
+            self.last_error = None
+
+    def _save(self, features):
+        """Write the features to the mirror directory."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        _write(self.directory, self._features_path, ''.join(json.dumps(feature) + '\n' for feature in features))
+
+    def _save_state(self):
+        """Write the synchronization state to the mirror directory."""
+        state = {'synced': self.synced, 'full_synced': self.full_synced, 'count': len(self.features)}
+
+        _write(self.directory, self._state_path, json.dumps(state))
+
+    def expire(self):
+        """Stop answering from the mirror until the next refresh, which reloads the whole layer."""
+        self.synced = None
+        self.expired = True
+
+    def age(self):
+        """Return the time in seconds since the last synchronization or None."""
+        return time.time() - self.synced if self.synced is not None else None
+
+    def query(self, geom, limit=None):
+        """Return the properties of the features that intersect a geometry, in the layer order.
+
+        Args:
+            geom (shapely.geometry.base.BaseGeometry): The geometry in the layer reference system.
+            limit (:obj:`int`, optional): The maximum number of features to return.
+        """
+        features, index = self._snapshot
+
+        return [features[position]['properties'] for position in index.intersecting(geom)[:limit]]
+
+    def stats(self):
+        """Return the mirror state."""
+        return {
+            'features': len(self.features),
+            'synced': self.synced,
+            'full_synced': self.full_synced,
+            'age': self.age(),
+            'last_error': self.last_error
+        }
+
+
+class MirrorDataSource(DataSource):
+    """This class implements a datasource that answers from local mirrors of the layers of a WFS datasource.
+
+    A layer is mirrored from its first query on and refreshed in background every
+    ``refresh_interval`` seconds. The queries are answered by the wrapped WFS
+    datasource while the layer mirror is missing or older than ``max_age`` seconds.
+    """
+
+    def __init__(self, id, ds_info):
+        """Create a MirrorDataSource.
+
+        Args:
+            id (str): the datasource identifier.
+            ds_info (dict): A datasource information as a dictionary. The ``datasource`` is the
+                information of the wrapped WFS datasource, ``path`` the mirrors directory,
+                ``refresh_interval`` and ``max_age`` are in seconds and ``full_refresh_interval``
+                is the time in seconds between two full reloads of a layer (never by default).
+        """
+        from wlts.datasources.ds_manager import DataSourceFactory
+
+        super().__init__(id, ds_info)
+
+        inner_info = ds_info['datasource']
+
+        if inner_info['type'] != 'WFS':
+            raise ValueError(f'Datasource type {inner_info["type"]} can not be mirrored')
+
+        self.path = ds_info['path']
+        self.refresh_interval = ds_info.get('refresh_interval', Config.WLTS_MIRROR_REFRESH_INTERVAL)
+        self.max_age = ds_info.get('max_age', Config.WLTS_MIRROR_MAX_AGE)
+        self.full_refresh_interval = ds_info.get('full_refresh_interval')
+
+        self.datasource = DataSourceFactory.make(inner_info['type'], id, inner_info)
+
+        self._layers = dict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self.created = time.time()
+        self.hits = 0
+        self.misses = 0
+
+        register('mirror:{}'.format(id), self)
+
+    def get_type(self):
+        """Return the datasource type."""
+        return "MIRROR"
+
+    def __getattr__(self, name):
+        """Delegate the other datasource operations to the wrapped datasource."""
+        if name == 'datasource':
+            raise AttributeError(name)
+        return getattr(self.datasource, name)
+
+    def get_metrics(self):
+        """Return the wrapped datasource metrics with the state of each layer mirror."""
+        metrics = self.datasource.get_metrics()
+        metrics['mirror'] = {name: layer.stats() for name, layer in list(self._layers.items())}
+        return metrics
+
+    def stats(self):
+        """Return the cache statistics of the layer mirrors."""
+        layers = list(self._layers.values())
+
+        return cache_stats(entries=sum(len(layer.features) for layer in layers), size=None, hits=self.hits,
+                           misses=self.misses, evictions=0, created=self.created)
+
+    def invalidate(self, selector):
+        """Expire the layer mirrors selected by a CacheSelector, they are reloaded in background.
+
+        The layers are reloaded entirely, whatever the time interval and area of the selector.
+
+        Returns:
+            int: The number of expired features.
+        """
+        expired = 0
+
+        # A layer has features of any time and area, only its server and name are tested
+        layer_selector = CacheSelector(hosts=selector.hosts, names=selector.names)
+
+        for layer in list(self._layers.values()):
+            if layer_selector.match(host=self.datasource._wfs.host, name=layer.type_name):
+                expired += len(layer.features)
+                layer.expire()
+
+        if expired:
+            self._wake.set()
+
+        return expired
+
+    def get_layer(self, kwargs):
+        """Return the mirror of the layer of a trajectory query, it is created on first use.
+
+        Args:
+            kwargs (dict): The keyword arguments of a trajectory query.
+        """
+        type_name = self.datasource.workspace + ":" + kwargs['feature_name']
+        srid = kwargs['geom_property']['srid']
+
+        key = '{}.{}'.format(type_name.replace(':', '.'), srid)
+
+        if key in self._layers:
+            return self._layers[key]
+
+        observations = kwargs['obs'] if isinstance(kwargs['obs'], list) else [kwargs['obs']]
+        temporal_properties = set(obs['temporal_property'] for obs in observations)
+
+        # Only the layers with a single date property are refreshed incrementally
+        temporal_property = None
+        if kwargs['temporal']['type'] == 'DATE' and len(temporal_properties) == 1:
+            temporal_property = temporal_properties.pop()
+
+        with self._lock:
+            if key not in self._layers:
+                self._layers[key] = LayerMirror(self.datasource._wfs, type_name, srid, os.path.join(self.path, key),
+                                                temporal_property=temporal_property)
+                self._start()
+
+        return self._layers[key]
+
+    def _start(self):
+        """Start the refresh thread or wake it to synchronize a new layer."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name='wlts-mirror', daemon=True)
+            self._thread.start()
+
+        self._wake.set()
+
+    def _refresh_loop(self):
+        """Refresh the layers that are older than the refresh interval."""
+        while True:
+            self._wake.clear()
+
+            for layer in list(self._layers.values()):
+                age = layer.age()
+
+                if age is not None and age < self.refresh_interval:
+                    continue
+
+                full = layer.expired or self.full_refresh_interval is not None and \
+                    (layer.full_synced is None or time.time() - layer.full_synced >= self.full_refresh_interval)
+
+                try:
+                    layer.refresh(full=full)
+                except Exception:
+                    # The error is kept in the layer state and the layer is retried on the next round
+                    pass
+
+            self._wake.wait(self.refresh_interval)
+
+    def _fresh_layer(self, kwargs):
+        """Return the layer mirror of a query when it can answer it or None."""
+        layer = self.get_layer(kwargs)
+
+        age = layer.age()
+
+        fresh = age is not None and age <= self.max_age
+        tracing.set_attribute('mirror', 'hit' if fresh else 'stale')
+
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return layer if fresh else None
+
+    @tracing.traced('datasource.get_trajectory')
+    def get_trajectory(self, **kwargs):
+        """Return the trajectory observations of a point, see :meth:`WFSDataSource.get_trajectory`."""
+        layer = self._fresh_layer(kwargs)
+
+        if layer is None:
+            return self.datasource.get_trajectory(**kwargs)
+
+        observations, _, _, local_filter = self.datasource._observations_query(kwargs, local=True)
+
+        if not observations:
+            return []
+
+        xs, ys = transform_points([kwargs['x']], [kwargs['y']], WGS84, layer.srid)
+
+        return self._observations(observations, layer.query(Point(xs[0], ys[0])), local_filter,
+                                  kwargs.get('max_features') or 1)
+
+    @tracing.traced('datasource.get_trajectory_batch')
+    def get_trajectory_batch(self, **kwargs):
+        """Return the trajectory observations of a set of points, see :meth:`WFSDataSource.get_trajectory_batch`."""
+        layer = self._fresh_layer(kwargs)
+
+        if layer is None:
+            return self.datasource.get_trajectory_batch(**kwargs)
+
+        observations, _, _, local_filter = self.datasource._observations_query(kwargs, local=True)
+
+        if not observations:
+            return [[] for _ in kwargs['xs']]
+
+        xs, ys = transform_points(kwargs['xs'], kwargs['ys'], WGS84, layer.srid)
+
+        limit = kwargs.get('max_features') or 1
+
+        return [self._observations(observations, layer.query(Point(x, y)), local_filter, limit)
+                for x, y in zip(xs.tolist(), ys.tolist())]
+
+    def _observations(self, observations, features, local_filter, limit):
+        """Return the pairs (observation, feature properties) of the first features with observations.
+
+        As the WFS service filters by period before the ``limit``, the features without an
+        observation in the period are skipped.
+        """
+        pairs = []
+        count = 0
+
+        for feature in features:
+            feature_pairs = self.datasource._observations(observations, [feature], local_filter)
+
+            if feature_pairs:
+                pairs.extend(feature_pairs)
+                count += 1
+
+                if count == limit:
+                    break
+
+        return pairs
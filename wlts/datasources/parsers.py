@@ -0,0 +1,176 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS incremental parsers for datasource responses."""
+import codecs
+import re
+from json import JSONDecodeError, JSONDecoder
+from xml.etree.ElementTree import XMLPullParser
+
+_FEATURES_ARRAY = re.compile(r'"features"\s*:\s*\[')
+
+_WHITESPACE = ' \t\n\r,'
+
+# The characters that change the nesting of a JSON value, outside and inside of a string
+_STRUCTURE = re.compile(r'[{}\[\]"]')
+_STRING = re.compile(r'["\\]')
+
+
+def iter_geojson_features(chunks, limit=None):
+    """Iterate over the features of a GeoJSON FeatureCollection read from a byte stream.
+
+    The features are decoded one by one as the bytes arrive, so the whole document is
+    never held in memory and the stream is left as soon as ``limit`` features are read.
+
+    The nesting depth and the string state of the current feature are kept while its
+    bytes arrive, so each feature is scanned once and decoded once it is complete.
+
+    Args:
+        chunks (iterable): The response body as an iterable of bytes.
+        limit (:obj:`int`, optional): The maximum number of features to read.
+
+    Returns:
+        generator: The GeoJSON features as dictionaries.
+
+    Raises:
+        ValueError: If the stream ends before the features array is complete.
+    """
+    decoder = JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    buffer = ''
+    pos = None
+    count = 0
+
+    # The position of the current feature in the buffer, its depth and string state
+    start = None
+    depth = 0
+    in_string = False
+
+    for chunk in chunks:
+        buffer += utf8.decode(chunk)
+
+        if pos is None:
+            match = _FEATURES_ARRAY.search(buffer)
+            if match is None:
+                continue
+            pos = match.end()
+
+        while True:
+            if start is None:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+
+                if pos >= len(buffer):
+                    break
+
+                if buffer[pos] == ']':
+                    return
+
+                if buffer[pos] != '{':
+                    raise ValueError('Invalid GeoJSON features array at "{}"'.format(buffer[pos:pos + 20]))
+
+                start = pos
+                depth = 1
+                pos += 1
+
+            match = (_STRING if in_string else _STRUCTURE).search(buffer, pos)
+
+            if match is None:
+                # The feature is incomplete, wait for more bytes
+                pos = max(pos, len(buffer))
+                break
+
+            char = match.group()
+            pos = match.end()
+
+            if char == '"':
+                in_string = not in_string
+            elif char == '\\':
+                # Skip the escaped character, it may be in the next chunk
+                pos += 1
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+
+                if depth == 0:
+                    try:
+                        feature = decoder.decode(buffer[start:pos])
+                    except JSONDecodeError as e:
+                        raise ValueError('Invalid GeoJSON feature: {}'.format(e))
+
+                    start = None
+
+                    yield feature
+
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+
+        # Discard the already decoded features
+        offset = start if start is not None else min(pos, len(buffer))
+
+        buffer = buffer[offset:]
+        pos -= offset
+        if start is not None:
+            start = 0
+
+    raise ValueError('Unexpected end of GeoJSON features stream')
+
+
+def _local_name(tag):
+    """Return the tag name without the namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_xml_elements(chunks, tag, stop=None):
+    """Iterate over the XML elements with the given tag read from a byte stream.
+
+    Each element is yielded as soon as it is closed and then cleared, so the document
+    tree is never fully built and the caller can stop reading as soon as it finds
+    what it is looking for.
+
+    Args:
+        chunks (iterable): The response body as an iterable of bytes.
+        tag (str): The element name, optionally qualified with a namespace prefix
+            (e.g. ``workspace:property``). Without a prefix any namespace is accepted.
+        stop (:obj:`str`, optional): The name of an element whose end finishes the reading.
+
+    Returns:
+        generator: The ``xml.etree.ElementTree.Element`` matching the tag.
+    """
+    prefix, _, name = tag.rpartition(':')
+
+    namespace = None
+
+    parser = XMLPullParser(events=('start-ns', 'end'))
+
+    for chunk in chunks:
+        parser.feed(chunk)
+
+        for event, data in parser.read_events():
+            if event == 'start-ns':
+                if prefix and data[0] == prefix:
+                    namespace = data[1]
+                continue
+
+            element_name = _local_name(data.tag)
+
+            if element_name == name and (not prefix or data.tag == '{{{}}}{}'.format(namespace, name)):
+                yield data
+                data.clear()
+            elif stop is not None and element_name == stop:
+                return
+
+
+def find_xml_child_text(element, name):
+    """Return the text of the first child element with the given name (without namespace)."""
+    for child in element:
+        if _local_name(child.tag) == name:
+            return child.text
+    return None
@@ -0,0 +1,253 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS Record/Replay DataSource."""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from functools import wraps
+
+from wlts.datasources.datasource import DataSource
+
+# The client attribute and the transport methods of each datasource type
+TRANSPORTS = {
+    "WFS": ('_wfs', {'_get': 'call', '_stream': 'stream'}),
+    "WCS": ('_wcs', {'_get_coverage': 'call', 'list_image': 'call'})
+}
+
+
+class ReplayArchive:
+    """This class implements an on-disk archive of upstream request/response pairs.
+
+    The ``index.jsonl`` file has one line for each recorded request, with its key,
+    the response kind and the latency observed while recording. Each response body
+    is a zlib compressed file named after the request key hash.
+    """
+
+    def __init__(self, directory):
+        """Open a ReplayArchive, it is created if it does not exist.
+
+        Args:
+            directory (str): The archive directory.
+        """
+        self.directory = directory
+
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        index_path = os.path.join(directory, 'index.jsonl')
+
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._index[record['key']] = record
+
+    @staticmethod
+    def make_key(method, args, kwargs):
+        """Return the archive key of a transport call."""
+        return json.dumps([method, list(args), kwargs], sort_keys=True, default=str)
+
+    def _body_path(self, key):
+        """Return the file path of a response body."""
+        return os.path.join(self.directory, 'bodies', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.zlib')
+
+    def put(self, key, value, latency):
+        """Record a response.
+
+        Args:
+            key (str): The request key.
+            value (bytes/str/list): The response.
+            latency (float): The time in seconds the upstream took to answer.
+        """
+        if isinstance(value, bytes):
+            kind, body = 'bytes', value
+        elif isinstance(value, str):
+            kind, body = 'text', value.encode('utf-8')
+        else:
+            kind, body = 'json', json.dumps(value).encode('utf-8')
+
+        path = self._body_path(key)
+
+        with open(path + '.tmp', 'wb') as f:
+            f.write(zlib.compress(body, 6))
+        os.replace(path + '.tmp', path)
+
+        record = {'key': key, 'kind': kind, 'latency': latency, 'size': len(body)}
+
+        with self._lock:
+            with open(os.path.join(self.directory, 'index.jsonl'), 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+            self._index[key] = record
+            self.recorded += 1
+
+    def get(self, key):
+        """Return a recorded response.
+
+        Args:
+            key (str): The request key.
+
+        Returns:
+            tuple: The response and the latency observed while recording.
+
+        Raises:
+            LookupError: If the request was not recorded.
+        """
+        record = self._index.get(key)
+
+        if record is None:
+            self.misses += 1
+            raise LookupError('No recorded response for {}'.format(key))
+
+        with open(self._body_path(key), 'rb') as f:
+            body = zlib.decompress(f.read())
+
+        self.hits += 1
+
+        if record['kind'] == 'text':
+            return body.decode('utf-8'), record['latency']
+        if record['kind'] == 'json':
+            return json.loads(body.decode('utf-8')), record['latency']
+
+        return body, record['latency']
+
+    def stats(self):
+        """Return the archive statistics."""
+        return {
+            'requests': len(self._index),
+            'hits': self.hits,
+            'misses': self.misses,
+            'recorded': self.recorded
+        }
+
+
+class ReplayDataSource(DataSource):
+    """This class implements a datasource that records or replays the upstream traffic of another one.
+
+    In ``record`` mode the requests of the wrapped datasource go to the live service
+    and their responses are stored in the archive. In ``replay`` mode they are served
+    from the archive without network, optionally delayed by the recorded latency or by
+    a fixed latency.
+    """
+
+    def __init__(self, id, ds_info):
+        """Create a ReplayDataSource.
+
+        Args:
+            id (str): the datasource identifier.
+            ds_info (dict): A datasource information as a dictionary. The ``datasource`` is the
+                information of the wrapped WFS/WCS datasource, ``archive`` the archive directory,
+                ``mode`` is ``record`` or ``replay`` (default) and ``latency`` is ``recorded``
+                or a fixed number of seconds (no latency by default).
+        """
+        from wlts.datasources.ds_manager import DataSourceFactory
+
+        super().__init__(id, ds_info)
+
+        self.mode = ds_info.get('mode', 'replay')
+        self.latency = ds_info.get('latency')
+
+        if self.mode not in ('record', 'replay'):
+            raise ValueError(f'Invalid replay mode "{self.mode}", use record or replay')
+
+        inner_info = ds_info['datasource']
+
+        if inner_info['type'] not in TRANSPORTS:
+            raise ValueError(f'Datasource type {inner_info["type"]} can not be replayed')
+
+        self.archive = ReplayArchive(ds_info['archive'])
+        self.datasource = DataSourceFactory.make(inner_info['type'], id, inner_info)
+
+        client_name, methods = TRANSPORTS[inner_info['type']]
+        client = getattr(self.datasource, client_name)
+
+        for name, kind in methods.items():
+            wrapper = self._wrap_stream if kind == 'stream' else self._wrap_call
+            setattr(client, name, wrapper(name, getattr(client, name)))
+
+    def get_type(self):
+        """Return the datasource type."""
+        return "REPLAY"
+
+    def __getattr__(self, name):
+        """Delegate the datasource operations to the wrapped datasource."""
+        if name == 'datasource':
+            raise AttributeError(name)
+        return getattr(self.datasource, name)
+
+    def get_metrics(self):
+        """Return the wrapped datasource metrics with the archive statistics."""
+        metrics = self.datasource.get_metrics()
+        metrics['replay'] = dict(self.archive.stats(), mode=self.mode)
+        return metrics
+
+    def _delay(self, recorded_latency):
+        """Wait the configured latency of a replayed response."""
+        if self.latency == 'recorded':
+            time.sleep(recorded_latency)
+        elif self.latency:
+            time.sleep(float(self.latency))
+
+    def _wrap_call(self, name, method):
+        """Return a transport method that records or replays its results."""
+        @wraps(method)
+        def wrapped(*args, **kwargs):
+            key = self.archive.make_key(name, args, kwargs)
+
+            if self.mode == 'replay':
+                value, latency = self.archive.get(key)
+                self._delay(latency)
+                return value
+
+            start = time.monotonic()
+            value = method(*args, **kwargs)
+            self.archive.put(key, value, time.monotonic() - start)
+
+            return value
+
+        return wrapped
+
+    def _wrap_stream(self, name, method):
+        """Return a streaming transport method that records or replays its chunks."""
+        @wraps(method)
+        def wrapped(uri, chunk_size=16384):
+            key = self.archive.make_key(name, [uri], dict())
+
+            if self.mode == 'replay':
+                body, latency = self.archive.get(key)
+                self._delay(latency)
+                for offset in range(0, len(body), chunk_size):
+                    yield body[offset:offset + chunk_size]
+                return
+
+            start = time.monotonic()
+            chunks = []
+            upstream = iter(method(uri, chunk_size))
+
+            try:
+                for chunk in upstream:
+                    chunks.append(chunk)
+                    yield chunk
+            except GeneratorExit:
+                # The consumer stopped early (e.g. maxFeatures), the whole response is recorded anyway
+                chunks.extend(upstream)
+                self.archive.put(key, b''.join(chunks), time.monotonic() - start)
+                raise
+
+            self.archive.put(key, b''.join(chunks), time.monotonic() - start)
+
+        return wrapped
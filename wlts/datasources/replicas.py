@@ -0,0 +1,218 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS selection of the replica hosts of a datasource."""
+import threading
+import time
+
+import requests
+
+from wlts import deadline
+from wlts.config import Config
+
+
+class Replica:
+    """This class keeps the recent latency and error rate of a replica host."""
+
+    __slots__ = ('host', 'latency', 'error_rate', 'down_until', 'calls', 'failures')
+
+    def __init__(self, host):
+        """Create a Replica.
+
+        Args:
+            host (str): The replica server URL.
+        """
+        self.host = host
+        self.latency = None
+        self.error_rate = 0.0
+        self.down_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def score(self, error_penalty):
+        """Return the expected cost of a call, the replica without measures is tried first."""
+        return (self.latency or 0.0) * (1.0 + error_penalty * self.error_rate)
+
+    def to_dict(self):
+        """Export the replica state to Python Dictionary."""
+        return {
+            'host': self.host,
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'available': self.down_until <= time.monotonic(),
+            'calls': self.calls,
+            'failures': self.failures
+        }
+
+
+class ReplicaPool:
+    """This class routes the calls of a datasource client to its replica hosts.
+
+    Each replica keeps an exponentially weighted moving average (EWMA) of its latency
+    and of its error rate. A call goes to the available replica with the lowest latency,
+    weighted by its error rate, and fails over to the next one when the replica cannot
+    be reached or answers with a server error. A replica that fails is set aside for
+    ``cooldown`` seconds; with ``health_interval``, a background thread probes the
+    replicas to bring them back and to refresh their latency.
+    """
+
+    def __init__(self, hosts, probe=None, alpha=0.3, error_penalty=10.0, cooldown=30.0, health_interval=None):
+        """Create a ReplicaPool.
+
+        Args:
+            hosts (str/list): The replica server URLs, the first one is the primary host.
+            probe (:obj:`callable`, optional): The health check, called with a host, it raises on failure.
+            alpha (float): The weight of the last measure in the moving averages.
+            error_penalty (float): The latency increase factor of a replica that always fails.
+            cooldown (float): The time in seconds a failed replica is not selected.
+            health_interval (:obj:`float`, optional): The time in seconds between two health checks.
+        """
+        hosts = [hosts] if isinstance(hosts, str) else list(hosts)
+
+        if not hosts:
+            raise ValueError('At least one host is required')
+
+        self.replicas = [Replica(host.rstrip('/')) for host in hosts]
+        self.probe = probe
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.cooldown = cooldown
+        self.health_interval = health_interval
+
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    @property
+    def primary(self):
+        """Return the primary host."""
+        return self.replicas[0].host
+
+    def candidates(self):
+        """Return the replicas in the order they should be tried."""
+        now = time.monotonic()
+
+        with self._lock:
+            return sorted(self.replicas,
+                          key=lambda replica: (replica.down_until > now, replica.score(self.error_penalty)))
+
+    def record(self, replica, latency=None, error=False):
+        """Update the moving averages of a replica with the result of a call.
+
+        Args:
+            replica (Replica): The called replica.
+            latency (:obj:`float`, optional): The call latency in seconds, not known for a failed call.
+            error (bool): True when the replica failed.
+        """
+        with self._lock:
+            replica.calls += 1
+
+            if latency is not None:
+                replica.latency = latency if replica.latency is None else \
+                    self.alpha * latency + (1 - self.alpha) * replica.latency
+
+            replica.error_rate = self.alpha * float(error) + (1 - self.alpha) * replica.error_rate
+
+            if error:
+                replica.failures += 1
+                replica.down_until = time.monotonic() + self.cooldown
+            else:
+                replica.down_until = 0.0
+
+    def call(self, function):
+        """Call a function with the best replica host, failing over to the others.
+
+        Args:
+            function (callable): The call, receives the host. A ``requests.RequestException``
+                means the replica failed, any other error is returned to the caller.
+
+        Returns:
+            The function result.
+        """
+        self._start_health_checks()
+
+        error = None
+
+        for replica in self.candidates():
+            deadline.check()
+
+            start = time.monotonic()
+
+            try:
+                result = function(replica.host)
+            except requests.RequestException as e:
+                self.record(replica, error=True)
+                error = e
+                continue
+
+            self.record(replica, latency=time.monotonic() - start)
+
+            return result
+
+        raise error
+
+    def check(self):
+        """Probe every replica once and update its state."""
+        for replica in list(self.replicas):
+            start = time.monotonic()
+
+            try:
+                self.probe(replica.host)
+            except Exception:
+                self.record(replica, error=True)
+            else:
+                self.record(replica, latency=time.monotonic() - start)
+
+    def _start_health_checks(self):
+        """Start the background health checks on first use, only for more than one replica."""
+        if self._health_thread is not None or not self.health_interval or self.probe is None \
+                or len(self.replicas) < 2:
+            return
+
+        with self._lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name='wlts-replica-health',
+                                                   daemon=True)
+
+        self._health_thread.start()
+
+    def _health_loop(self):
+        """Probe the replicas every ``health_interval`` seconds."""
+        while True:
+            time.sleep(self.health_interval)
+            self.check()
+
+    def stats(self):
+        """Return the state of each replica."""
+        with self._lock:
+            return [replica.to_dict() for replica in self.replicas]
+
+
+def make_pool(hosts, probe=None):
+    """Create the ReplicaPool of a datasource client with the ``WLTS_REPLICA_*`` settings."""
+    return ReplicaPool(hosts, probe=probe, alpha=Config.WLTS_REPLICA_EWMA_ALPHA,
+                       error_penalty=Config.WLTS_REPLICA_ERROR_PENALTY, cooldown=Config.WLTS_REPLICA_COOLDOWN,
+                       health_interval=Config.WLTS_REPLICA_HEALTH_INTERVAL)
+
+
+def http_probe(path, auth=None, timeout=5):
+    """Return a health check that requests a path of the host.
+
+    The replica is healthy when it answers without a server error; the response body is not read.
+
+    Args:
+        path (str): The path, relative to the host, to request.
+        auth (:obj:`tuple`, optional): The credentials of the request.
+        timeout (float): The probe timeout in seconds.
+    """
+    def probe(host):
+        with requests.get('{}/{}'.format(host, path), auth=auth, stream=True,
+                          timeout=timeout) as response:
+            if response.status_code >= 500:
+                raise requests.HTTPError('Health check fail: {}'.format(response.status_code), response=response)
+
+    return probe
@@ -0,0 +1,102 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS single-flight coalescing of upstream requests."""
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import wraps
+
+from wlts import deadline
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share the same key into a single execution.
+
+    The first caller of a key runs the function, every concurrent caller with the
+    same key waits for it and receives the same result (or exception). Once the call
+    finishes the key is released, so this is not a cache.
+
+    A caller waits at most until its own deadline. When the call fails because the
+    deadline of its first caller is over, the other callers retry it, one of them runs it.
+    """
+
+    def __init__(self):
+        """Create a SingleFlight group."""
+        self._lock = threading.Lock()
+        self._calls = dict()
+
+    def do(self, key, fn, *args, **kwargs):
+        """Execute ``fn(*args, **kwargs)`` once for all concurrent callers of ``key``.
+
+        Args:
+            key (hashable): The call identifier.
+            fn (callable): The function to execute.
+            *args: The positional arguments of ``fn``.
+            **kwargs: The keyword arguments of ``fn``.
+
+        Returns:
+            The result of ``fn``.
+        """
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._calls[key] = future
+
+            if leader:
+                break
+
+            try:
+                return future.result(timeout=deadline.remaining())
+            except FutureTimeoutError:
+                raise deadline.DeadlineExceeded('The request time budget is over')
+            except deadline.DeadlineExceeded:
+                # The budget of the leader is over, not necessarily the one of this caller
+                deadline.check()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+
+        self._release(key)
+        future.set_result(result)
+
+        return result
+
+    def _release(self, key):
+        """Release a key, it is done before the waiting callers are woken up so a retry starts a new call."""
+        with self._lock:
+            del self._calls[key]
+
+    def in_flight(self):
+        """Return the number of keys currently being executed."""
+        with self._lock:
+            return len(self._calls)
+
+
+def single_flight(method):
+    """Decorator to coalesce concurrent identical calls of a client method.
+
+    The call key is built from the client instance, the method name and its arguments,
+    so all arguments must be hashable.
+    """
+    group = SingleFlight()
+
+    @wraps(method)
+    def wrapped(self, *args, **kwargs):
+        key = (id(self), method.__name__, args, tuple(sorted(kwargs.items())))
+        return group.do(key, method, self, *args, **kwargs)
+
+    wrapped.single_flight = group
+
+    return wrapped
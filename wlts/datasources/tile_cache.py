@@ -0,0 +1,262 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS on-disk tile cache of image data."""
+import ast
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+import numpy
+
+from wlts import tracing
+from wlts.caches import cache_stats, register
+from wlts.config import Config
+from wlts.datasources.grid import TileGrid
+
+
+class TileCache:
+    """This class implements a persistent cache of decoded image tiles.
+
+    Each tile is stored as a raw ``.npy`` file and read back as a read-only memory
+    map, so cache hits involve neither network nor image decoding. The directory can
+    be shared by all the workers of a host: files are written atomically and the
+    least recently used tiles are evicted when the total size exceeds the limit.
+    """
+
+    def __init__(self, directory, max_size):
+        """Create a TileCache.
+
+        Args:
+            directory (str): The cache directory.
+            max_size (int): The maximum total size of the cached tiles in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._size = self._disk_usage()
+
+        self.created = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        """Return the file path of a tile key, without extension."""
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+    def _files(self):
+        """Return the cached tile files."""
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.npy')]
+
+    def _disk_usage(self):
+        """Return the total size of the cached tiles."""
+        return sum(entry.stat().st_size for entry in self._files())
+
+    def get(self, key):
+        """Return a cached tile.
+
+        Args:
+            key (tuple): The tile key.
+
+        Returns:
+            tuple: The tile values as a read-only memory map and its nodata value,
+            or None if the tile is not cached.
+        """
+        path = self._path(key)
+
+        try:
+            with open(path + '.json') as f:
+                nodata = json.load(f)['nodata']
+            values = numpy.load(path + '.npy', mmap_mode='r')
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # The modification time is the last access time of the LRU policy
+        try:
+            os.utime(path + '.npy')
+        except OSError:
+            pass
+
+        self.hits += 1
+
+        return values, nodata
+
+    def put(self, key, values, nodata):
+        """Store a tile in cache.
+
+        Args:
+            key (tuple): The tile key.
+            values (numpy.ndarray): The tile values.
+            nodata (int/float): The tile nodata value.
+        """
+        path = self._path(key)
+
+        # A tile stored again replaces its file, only the size difference is added
+        try:
+            previous = os.stat(path + '.npy').st_size
+        except OSError:
+            previous = 0
+
+        self._write(path + '.json', lambda f: f.write(json.dumps({'key': repr(key), 'nodata': nodata}).encode()))
+        size = self._write(path + '.npy', lambda f: numpy.save(f, numpy.ascontiguousarray(values)))
+
+        with self._lock:
+            self._size += size - previous
+            exceeded = self._size > self.max_size
+
+        if exceeded:
+            self.evict()
+
+    def _write(self, path, writer):
+        """Write a file atomically, it returns the file size."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        return size
+
+    def get_or_load(self, key, loader):
+        """Return a cached tile, loading and storing it when it is not cached.
+
+        Args:
+            key (tuple): The tile key.
+            loader (callable): Function that returns the tile values and its nodata value.
+        """
+        cached = self.get(key)
+
+        if cached is not None:
+            tracing.add_to_attribute('tile_cache_hits')
+            return cached
+
+        tracing.add_to_attribute('tile_cache_misses')
+
+        values, nodata = loader()
+
+        self.put(key, values, nodata)
+
+        return values, nodata
+
+    def evict(self):
+        """Remove the least recently used tiles until the cache is below 90% of its size."""
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            # Only one worker of the host evicts at a time
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            files = []
+            for entry in self._files():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            size = sum(file_size for _, file_size, _ in files)
+
+            for _, file_size, path in sorted(files):
+                if size <= self.max_size * 0.9:
+                    break
+
+                for file_path in (path, path[:-len('.npy')] + '.json'):
+                    try:
+                        os.unlink(file_path)
+                    except OSError:
+                        pass
+
+                size -= file_size
+                self.evictions += 1
+
+            with self._lock:
+                self._size = size
+
+    def clear(self):
+        """Remove all cached tiles."""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.npy', '.json')):
+                os.unlink(entry.path)
+
+        with self._lock:
+            self._size = 0
+
+    def invalidate(self, selector):
+        """Remove the tiles selected by a CacheSelector.
+
+        The tile keys are read from the ``.json`` file of each tile, they are the
+        WCS host, the image name, the time, the EPSG code and the tile grid and position.
+        """
+        removed = 0
+
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+
+            try:
+                with open(entry.path) as f:
+                    key = ast.literal_eval(json.load(f)['key'])
+
+                host, image, image_time, srid, origin_x, origin_y, resolution_x, resolution_y, tile_size, \
+                    tile_x, tile_y = key
+            except (OSError, KeyError, SyntaxError, TypeError, ValueError):
+                continue
+
+            tile_grid = TileGrid(origin_x, origin_y, resolution_x, resolution_y, tile_size)
+            tile_bounds = tile_grid.tile_bounds(tile_x, tile_y)
+
+            if not selector.match(host=host, name=image, time=image_time, bounds=tile_bounds, srid=srid):
+                continue
+
+            path = entry.path[:-len('.json')]
+
+            try:
+                size = os.stat(path + '.npy').st_size
+                os.unlink(path + '.npy')
+            except OSError:
+                size = 0
+
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+            with self._lock:
+                self._size -= size
+
+            removed += 1
+
+        return removed
+
+    def stats(self):
+        """Return the cache statistics."""
+        stats = cache_stats(entries=len(self._files()), size=self._size, hits=self.hits, misses=self.misses,
+                            evictions=self.evictions, created=self.created)
+        stats['max_size'] = self.max_size
+
+        return stats
+
+
+@lru_cache()
+def get_tile_cache():
+    """Return the host tile cache or None when ``WLTS_TILE_CACHE_DIR`` is not set."""
+    if not Config.WLTS_TILE_CACHE_DIR:
+        return None
+
+    return register('tiles', TileCache(Config.WLTS_TILE_CACHE_DIR, Config.WLTS_TILE_CACHE_MAX_SIZE))
@@ -0,0 +1,444 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""WLTS precomputed per-pixel Trajectory Store."""
+import json
+import math
+import os
+import tempfile
+import zlib
+from functools import lru_cache
+
+import numpy
+from affine import Affine
+
+from wlts import tracing
+from wlts.datasources.admission import admission_controlled
+from wlts.datasources.datasource import DataSource
+from wlts.datasources.grid import TileGrid, class_composition
+from wlts.utils import (WGS84, get_date_from_str, transform_geometry,
+                        transform_points)
+
+
+def _write(directory, path, data):
+    """Write a file atomically, with a temporary file of its own so concurrent writers do not mix their data."""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class TrajectoryStore:
+    """This class implements a chunked array store of the time series of each pixel of an image.
+
+    The image grid is split in square chunks, each one stored as a zlib compressed
+    array with shape (rows, columns, timeline), so the whole time series of a pixel is
+    contiguous and a trajectory is a single chunk read and slice. The ``index.json``
+    file describes the grid geotransform, the chunk size, the timeline and the data type.
+    """
+
+    def __init__(self, directory):
+        """Open a TrajectoryStore.
+
+        Args:
+            directory (str): The store directory.
+        """
+        self.directory = directory
+
+        with open(os.path.join(directory, 'index.json')) as f:
+            self.index = json.load(f)
+
+        origin_x, resolution_x, _, origin_y, _, resolution_y = self.index['geotransform']
+
+        self.grid = TileGrid(origin_x, origin_y, resolution_x, -resolution_y, self.index['chunk_size'])
+        self.timeline = self.index['timeline']
+        self.dtype = numpy.dtype(self.index['dtype'])
+        self.nodata = self.index['nodata']
+
+        self._time_index = {time: position for position, time in enumerate(self.timeline)}
+        self._read_chunk = lru_cache(maxsize=64)(self._read_chunk)
+
+    @classmethod
+    def create(cls, directory, tile_grid, width, height, timeline, dtype, nodata, **metadata):
+        """Create an empty TrajectoryStore.
+
+        Args:
+            directory (str): The store directory.
+            tile_grid (TileGrid): The image grid, its tiles are the store chunks.
+            width (int): The number of columns of the image.
+            height (int): The number of rows of the image.
+            timeline (list): The image times.
+            dtype (str): The data type of the values.
+            nodata (int/float): The nodata value.
+            **metadata: Additional information to keep in the index.
+        """
+        os.makedirs(os.path.join(directory, 'chunks'), exist_ok=True)
+
+        index = dict(metadata)
+        index.update({
+            'geotransform': [tile_grid.origin_x, tile_grid.resolution_x, 0.0,
+                             tile_grid.origin_y, 0.0, -tile_grid.resolution_y],
+            'width': width,
+            'height': height,
+            'chunk_size': tile_grid.tile_size,
+            'timeline': list(timeline),
+            'dtype': numpy.dtype(dtype).str,
+            'nodata': nodata
+        })
+
+        _write(directory, os.path.join(directory, 'index.json'), json.dumps(index, indent=2).encode('utf-8'))
+
+        return cls(directory)
+
+    def chunks(self):
+        """Return the number of chunk columns and rows."""
+        chunk_size = self.index['chunk_size']
+        return math.ceil(self.index['width'] / chunk_size), math.ceil(self.index['height'] / chunk_size)
+
+    def _chunk_path(self, chunk_x, chunk_y):
+        """Return the file path of a chunk."""
+        return os.path.join(self.directory, 'chunks', '{}_{}.zlib'.format(chunk_y, chunk_x))
+
+    def write_chunk(self, chunk_x, chunk_y, values):
+        """Write a chunk.
+
+        Args:
+            chunk_x (int): The chunk column.
+            chunk_y (int): The chunk row.
+            values (numpy.ndarray): The chunk values with shape (chunk_size, chunk_size, timeline).
+        """
+        values = numpy.ascontiguousarray(values, dtype=self.dtype)
+
+        path = self._chunk_path(chunk_x, chunk_y)
+
+        _write(os.path.dirname(path), path, zlib.compress(values.tobytes(), 6))
+
+    def _read_chunk(self, chunk_x, chunk_y):
+        """Read and decompress a chunk, it returns None if the chunk does not exist."""
+        chunk_size = self.index['chunk_size']
+
+        try:
+            with open(self._chunk_path(chunk_x, chunk_y), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+        return numpy.frombuffer(data, dtype=self.dtype).reshape(chunk_size, chunk_size, len(self.timeline))
+
+    def read_series(self, x, y):
+        """Return the time series of the pixel of a location.
+
+        Args:
+            x (int/float): The location x coordinate in the store grid reference system.
+            y (int/float): The location y coordinate in the store grid reference system.
+
+        Returns:
+            numpy.ndarray: The pixel value of each time of the timeline, or None when the
+            location is outside of the store.
+        """
+        cols, rows = self.grid.pixels([x], [y])
+        col, row = int(cols[0]), int(rows[0])
+
+        if not (0 <= col < self.index['width'] and 0 <= row < self.index['height']):
+            return None
+
+        chunk_size = self.index['chunk_size']
+
+        chunk = self._read_chunk(col // chunk_size, row // chunk_size)
+
+        if chunk is None:
+            return None
+
+        return chunk[row % chunk_size, col % chunk_size]
+
+    def read_values(self, xs, ys, position):
+        """Return the values of a set of locations at a time.
+
+        The locations are grouped by chunk, so each chunk is read once.
+
+        Args:
+            xs (numpy.ndarray): The x coordinates in the store grid reference system.
+            ys (numpy.ndarray): The y coordinates in the store grid reference system.
+            position (int): The position of the time in the store timeline.
+
+        Returns:
+            numpy.ma.MaskedArray: The value of each location, masked where the location is
+            outside of the store or has no data.
+        """
+        cols, rows = self.grid.pixels(xs, ys)
+
+        values = numpy.ma.masked_all(len(cols), dtype=self.dtype)
+
+        positions = numpy.flatnonzero((cols >= 0) & (cols < self.index['width']) &
+                                      (rows >= 0) & (rows < self.index['height']))
+
+        chunk_size = self.index['chunk_size']
+
+        chunks, inverse = numpy.unique(numpy.stack([cols[positions] // chunk_size, rows[positions] // chunk_size],
+                                                   axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        for index, (chunk_x, chunk_y) in enumerate(chunks.tolist()):
+            chunk = self._read_chunk(chunk_x, chunk_y)
+
+            if chunk is None:
+                continue
+
+            selected = positions[inverse == index]
+
+            values[selected] = chunk[rows[selected] % chunk_size, cols[selected] % chunk_size, position]
+
+        if self.nodata is not None:
+            values[values.data == self.nodata] = numpy.ma.masked
+
+        return values
+
+    def read_window(self, bounds, position):
+        """Return the values at a time of the pixels that intersect an extent.
+
+        Args:
+            bounds (tuple): The extent (min_x, min_y, max_x, max_y) in the store grid reference system.
+            position (int): The position of the time in the store timeline.
+
+        Returns:
+            tuple: The window values as a numpy masked array, masked where a chunk is missing,
+            and its affine transform.
+        """
+        min_x, min_y, max_x, max_y = bounds
+
+        grid = self.grid
+
+        col_start = max(0, math.floor((min_x - grid.origin_x) / grid.resolution_x))
+        col_end = min(self.index['width'], math.ceil((max_x - grid.origin_x) / grid.resolution_x))
+        row_start = max(0, math.floor((grid.origin_y - max_y) / grid.resolution_y))
+        row_end = min(self.index['height'], math.ceil((grid.origin_y - min_y) / grid.resolution_y))
+
+        width, height = max(0, col_end - col_start), max(0, row_end - row_start)
+
+        values = numpy.ma.masked_all((height, width), dtype=self.dtype)
+
+        chunk_size = self.index['chunk_size']
+
+        for chunk_y in range(row_start // chunk_size, (row_start + height - 1) // chunk_size + 1 if height else 0):
+            for chunk_x in range(col_start // chunk_size, (col_start + width - 1) // chunk_size + 1 if width else 0):
+                chunk = self._read_chunk(chunk_x, chunk_y)
+
+                if chunk is None:
+                    continue
+
+                # The part of the chunk inside of the window
+                r0, r1 = max(row_start, chunk_y * chunk_size), min(row_end, (chunk_y + 1) * chunk_size)
+                c0, c1 = max(col_start, chunk_x * chunk_size), min(col_end, (chunk_x + 1) * chunk_size)
+
+                values[r0 - row_start:r1 - row_start, c0 - col_start:c1 - col_start] = \
+                    chunk[r0 - chunk_y * chunk_size:r1 - chunk_y * chunk_size,
+                          c0 - chunk_x * chunk_size:c1 - chunk_x * chunk_size, position]
+
+        transform = Affine(grid.resolution_x, 0.0, grid.origin_x + col_start * grid.resolution_x,
+                           0.0, -grid.resolution_y, grid.origin_y - row_start * grid.resolution_y)
+
+        return values, transform
+
+    def time_position(self, time):
+        """Return the position of a time in the store timeline, or None if it is not stored."""
+        return self._time_index.get(time)
+
+
+def ingest(collection, directory, chunk_size):
+    """Read a whole image collection from its datasource and write its TrajectoryStore.
+
+    Args:
+        collection (ImageCollection): The image collection to ingest, its grid must have a resolution.
+        directory (str): The store directory.
+        chunk_size (int): The number of pixels of each chunk side.
+
+    Returns:
+        generator: Yields the number of chunks written and the total of chunks as the ingestion progresses.
+    """
+    grid = dict(collection.grid, tile_size=chunk_size)
+
+    srid = collection.spatial_ref_system["srid"]
+
+    # The store grid is the image grid, in the image reference system
+    tile_grid = TileGrid.from_collection(grid, collection.spatial_extent, chunk_size, srid=srid)
+
+    if tile_grid is None:
+        raise ValueError('The collection {} grid has no resolution'.format(collection.get_name()))
+
+    width, height = tile_grid.columns, tile_grid.rows
+
+    ds = collection.get_datasource()
+
+    store = None
+
+    chunks_x, chunks_y = math.ceil(width / chunk_size), math.ceil(height / chunk_size)
+
+    for chunk_y in range(chunks_y):
+        for chunk_x in range(chunks_x):
+            series = None
+
+            for position, time in enumerate(collection.timeline):
+                values, nodata = ds.read_tile(collection.image, time, tile_grid, chunk_x, chunk_y, srid=srid)
+
+                if store is None:
+                    store = TrajectoryStore.create(directory, tile_grid, width, height, collection.timeline,
+                                                   values.dtype, nodata, image=collection.image,
+                                                   collection=collection.get_name(), srid=srid)
+
+                if series is None:
+                    series = numpy.empty((chunk_size, chunk_size, len(collection.timeline)), dtype=values.dtype)
+
+                series[:, :, position] = values
+
+            store.write_chunk(chunk_x, chunk_y, series)
+
+            yield chunk_y * chunks_x + chunk_x + 1, chunks_x * chunks_y
+
+
+class TrajectoryStoreDataSource(DataSource):
+    """This class implements a datasource of precomputed per-pixel trajectories."""
+
+    def __init__(self, id, ds_info):
+        """Create a TrajectoryStoreDataSource.
+
+        Args:
+            id (str): the datasource identifier.
+            ds_info (dict): A datasource information as a dictionary. The ``path`` is the
+                directory with one TrajectoryStore for each image.
+        """
+        super().__init__(id, ds_info)
+
+        self.path = ds_info['path']
+
+        self._stores = dict()
+
+    def get_type(self):
+        """Return the datasource type."""
+        return "TRAJECTORY_STORE"
+
+    def get_store(self, image):
+        """Return the TrajectoryStore of an image."""
+        if image not in self._stores:
+            self._stores[image] = TrajectoryStore(os.path.join(self.path, image))
+
+        return self._stores[image]
+
+    @tracing.traced('datasource.get_trajectory')
+    @admission_controlled
+    def get_trajectory(self, **kwargs):
+        """Return a trajectory instance for the trajectory store datasource.
+
+        Args:
+            **kwargs: The keyword arguments.
+        """
+        invalid_parameters = set(kwargs) - {"image", "temporal",
+                                            "x", "y", "srid",
+                                            "grid", "spatial_extent", "start_date", "end_date", "time"}
+        if invalid_parameters:
+            raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
+
+        ts = get_date_from_str(kwargs['time'])
+
+        if kwargs['start_date'] and ts < get_date_from_str(kwargs['start_date']):
+            return None
+        if kwargs['end_date'] and ts > get_date_from_str(kwargs['end_date']):
+            return None
+
+        store = self.get_store(kwargs['image'])
+
+        position = store.time_position(kwargs['time'])
+
+        if position is None:
+            return None
+
+        xs, ys = transform_points([kwargs['x']], [kwargs['y']], WGS84, store.index.get('srid', kwargs['srid']))
+
+        series = store.read_series(xs[0], ys[0])
+
+        if series is None or series[position] == store.nodata:
+            return None
+
+        return {'raster_value': series[position].item()}
+
+    @tracing.traced('datasource.sample_points')
+    @admission_controlled
+    def sample_points(self, **kwargs):
+        """Return the stored values of a set of points.
+
+        Args:
+            **kwargs: The keyword arguments of :meth:`WCSDataSource.sample_points`.
+
+        Returns:
+            numpy.ma.MaskedArray: The value of each point, masked where the point is outside
+            of the store or has no data, or None when the time is outside of the period or
+            is not stored.
+        """
+        invalid_parameters = set(kwargs) - {"image", "temporal", "xs", "ys", "srid", "grid",
+                                            "spatial_extent", "start_date", "end_date", "time"}
+        if invalid_parameters:
+            raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
+
+        ts = get_date_from_str(kwargs['time'])
+
+        if kwargs['start_date'] and ts < get_date_from_str(kwargs['start_date']):
+            return None
+        if kwargs['end_date'] and ts > get_date_from_str(kwargs['end_date']):
+            return None
+
+        store = self.get_store(kwargs['image'])
+
+        position = store.time_position(kwargs['time'])
+
+        if position is None:
+            return None
+
+        xs, ys = transform_points(kwargs['xs'], kwargs['ys'], WGS84, store.index.get('srid', kwargs['srid']))
+
+        return store.read_values(xs, ys, position)
+
+    @tracing.traced('datasource.get_area')
+    @admission_controlled
+    def get_area(self, **kwargs):
+        """Return the class composition of an area from the stored values.
+
+        Args:
+            **kwargs: The keyword arguments of :meth:`WCSDataSource.get_area`.
+
+        Returns:
+            dict: The class ``values`` with their pixel ``counts`` and ``areas`` (in square meters),
+            as numpy arrays, or None when the time is outside of the period or is not stored.
+        """
+        invalid_parameters = set(kwargs) - {"image", "temporal", "geom", "srid",
+                                            "grid", "start_date", "end_date", "time"}
+        if invalid_parameters:
+            raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
+
+        ts = get_date_from_str(kwargs['time'])
+
+        if kwargs['start_date'] and ts < get_date_from_str(kwargs['start_date']):
+            return None
+        if kwargs['end_date'] and ts > get_date_from_str(kwargs['end_date']):
+            return None
+
+        store = self.get_store(kwargs['image'])
+
+        position = store.time_position(kwargs['time'])
+
+        if position is None:
+            return None
+
+        srid = store.index.get('srid', kwargs['srid'])
+
+        geom = transform_geometry(kwargs['geom'], WGS84, srid)
+
+        values, transform = store.read_window(geom.bounds, position)
+
+        return class_composition(values, transform, geom, store.nodata, srid)
@@ -6,15 +6,31 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 """WLTS WCS DataSource."""
-from functools import lru_cache
+import math
 
+import numpy
 from owslib.util import Authentication
 from owslib.wcs import WebCoverageService
 from rasterio.io import MemoryFile
 from shapely.geometry import Point
+from werkzeug.exceptions import RequestEntityTooLarge
 
+from wlts import deadline, tracing
+from wlts.caches import memoize
+from wlts.config import Config
+from wlts.datasources.admission import admission_controlled
 from wlts.datasources.datasource import DataSource
-from wlts.utils import get_date_from_str
+from wlts.datasources.grid import TileGrid, class_composition
+from wlts.datasources.replicas import http_probe, make_pool
+from wlts.datasources.singleflight import single_flight
+from wlts.datasources.tile_cache import get_tile_cache
+from wlts.utils import (WGS84, get_date_from_str, transform_bounds,
+                        transform_geometry, transform_points)
+
+
+def _describe_image(wcs, image, min_x, max_x, min_y, max_y, width, height, time, x, y, r_flag, crs='EPSG:4326'):
+    """Return the cache description of an image value request."""
+    return dict(host=wcs.host, name=image, time=time, bounds=(min_x, min_y, max_x, max_y), srid=int(crs.split(':')[-1]))
 
 
 class WCS:
@@ -24,7 +40,7 @@ class WCS:
         """Create a WCS client attached to the given host address (an URL).
 
         Args:
-            host (str): the server URL.
+            host (str/list): the server URL or the URLs of its replicas, the first one is the primary.
             **kwargs: The keyword arguments with credentials to access OGC WCS.
         """
         invalid_parameters = set(kwargs) - {"username", "password"}
@@ -32,30 +48,74 @@ class WCS:
         if invalid_parameters:
             raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
 
+        self._auth = None
+        probe_auth = None
         if 'username' in kwargs:
-                auth = Authentication(username=kwargs['username'], password=kwargs['password'])
-                self.wcs_owslib = WebCoverageService(host, version='1.0.0', auth=auth)
-        else:
-            self.wcs_owslib = WebCoverageService(host, version='1.0.0')
+            self._auth = Authentication(username=kwargs['username'], password=kwargs['password'])
+            probe_auth = (kwargs['username'], kwargs['password'])
+
+        self.pool = make_pool(host, probe=http_probe("wcs?service=WCS&version=1.0.0&request=GetCapabilities",
+                                                     auth=probe_auth))
+        self.host = self.pool.primary
+
+        self._clients = dict()
+
+    def client(self, host):
+        """Return the OWSLib client of a replica, its capabilities are only requested on first use."""
+        if host not in self._clients:
+            if self._auth is not None:
+                self._clients[host] = WebCoverageService(host, version='1.0.0', auth=self._auth)
+            else:
+                self._clients[host] = WebCoverageService(host, version='1.0.0')
+
+        return self._clients[host]
+
+    @property
+    def wcs_owslib(self):
+        """Return the OWSLib client of the primary host."""
+        return self.client(self.host)
+
+    def _get_coverage(self, **kwargs):
+        """Request a coverage (WCS GetCoverage) and return the response body.
+
+        Args:
+            **kwargs: The OWSLib ``getCoverage`` keyword arguments.
+        """
+        def get_coverage(host):
+            timeout = deadline.bound(None)
+            if timeout is not None:
+                kwargs['timeout'] = timeout
 
-    def _get(self, name, bbox, width, height, time, x, y, r_flag):
+            tracing.set_attribute('replica', host)
+
+            return self.client(host).getCoverage(**kwargs).read()
+
+        with tracing.span('http.get_coverage', url=self.host, coverage=kwargs.get('identifier')) as span:
+            data = self.pool.call(get_coverage)
+
+            if span is not None:
+                span.set_attribute('bytes', len(data))
+
+            return data
+
+    def _get(self, name, bbox, width, height, time, x, y, r_flag, crs='EPSG:4326'):
         """Return the image value for a location.
 
         Args:
             name (str): The image(coverage) name to retrieve from service.
             bbox (str): The extent of the image(coverage) to retrieve.
-            x (int/float): A longitude value according to EPSG:4326.
-            y (int/float): A latitude value according to EPSG:4326.
+            x (int/float): A x coordinate according to crs.
+            y (int/float): A y coordinate according to crs.
+            crs (str): The reference system of the extent and of the location.
         """
-        output = self.wcs_owslib.getCoverage(identifier=name, format='GeoTIFF',
-                                             bbox=bbox,
-                                             crs='EPSG:4326',
-                                             time=[time],
-                                             width=width, height=height)
+        data = self._get_coverage(identifier=name, format='GeoTIFF',
+                                  bbox=bbox,
+                                  crs=crs,
+                                  time=[time],
+                                  width=width, height=height)
 
         data_array = None
 
-        data = output.read()
         result = dict()
         try:
             memfile = MemoryFile(data)
@@ -76,18 +136,44 @@ class WCS:
         except:
             return None
 
-    @lru_cache()
-    def get_image(self, image, min_x, max_x, min_y, max_y, width, height, time, x, y, r_flag):
+    @memoize('wcs.get_image', describe=_describe_image)
+    @single_flight
+    def get_image(self, image, min_x, max_x, min_y, max_y, width, height, time, x, y, r_flag, crs='EPSG:4326'):
         """Returns the image value."""
         bbox = (min_x, min_y, max_x, max_y)
 
-        image_infos = self._get(image, bbox, width, height, time, x, y, r_flag)
+        image_infos = self._get(image, bbox, width, height, time, x, y, r_flag, crs=crs)
 
         return image_infos
 
+    @single_flight
+    def get_window(self, image, bbox, width, height, time, crs='EPSG:4326'):
+        """Return the first band of an image window.
+
+        Args:
+            image (str): The image(coverage) name to retrieve from service.
+            bbox (tuple): The window extent as (min_x, min_y, max_x, max_y).
+            width (int): The window width in pixels.
+            height (int): The window height in pixels.
+            time (str): The image time.
+            crs (str): The reference system of the window extent.
+
+        Returns:
+            tuple: The band values as a numpy array, its affine transform and its nodata value.
+        """
+        data = self._get_coverage(identifier=image, format='GeoTIFF',
+                                  bbox=bbox,
+                                  crs=crs,
+                                  time=[time],
+                                  width=width, height=height)
+
+        with MemoryFile(data) as memfile:
+            with memfile.open() as dataset:
+                return dataset.read(1), dataset.transform, dataset.nodata
+
     def list_image(self):
         """Returns the list of all available image in service."""
-        return self.wcs_owslib.contents.keys()
+        return self.pool.call(lambda host: list(self.client(host).contents.keys()))
 
 
 class WCSDataSource(DataSource):
@@ -100,7 +186,7 @@ class WCSDataSource(DataSource):
             id (str): the datasource identifier.
             ds_info (dict): A datasource information as a dictionary.
         """
-        super().__init__(id)
+        super().__init__(id, ds_info)
 
         if 'username' in ds_info and 'password' in ds_info:
             self._wcs = WCS(ds_info['host'], username=ds_info["username"], password=ds_info["password"])
@@ -109,10 +195,19 @@ class WCSDataSource(DataSource):
 
         self.workspace = ds_info['workspace']
 
+        self._tile_cache = get_tile_cache()
+
     def get_type(self):
         """Return the datasource type."""
         return "WCS"
 
+    def get_metrics(self):
+        """Return the datasource metrics, with the state of each replica host."""
+        metrics = super().get_metrics()
+        metrics['replicas'] = self._wcs.pool.stats()
+
+        return metrics
+
     def check_image_exist(self, ft_name):
         """Utility to check image existence in wcs.
 
@@ -122,8 +217,10 @@ class WCSDataSource(DataSource):
         images = self._wcs.list_image()
 
         if ft_name not in images:
-            raise ValueError(f'Image "{ft_name}" not found in host {self._wcs.url}')
+            raise ValueError(f'Image "{ft_name}" not found in host {self._wcs.host}')
 
+    @tracing.traced('datasource.get_trajectory')
+    @admission_controlled
     def get_trajectory(self, **kwargs):
         """Return a trajectory instance for wcs datasource.
 
@@ -132,7 +229,7 @@ class WCSDataSource(DataSource):
         """
         invalid_parameters = set(kwargs) - {"image", "temporal",
                                             "x", "y", "srid",
-                                            "grid", "start_date", "end_date", "time"}
+                                            "grid", "spatial_extent", "start_date", "end_date", "time"}
         if invalid_parameters:
             raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
 
@@ -147,14 +244,195 @@ class WCSDataSource(DataSource):
             if ts > end_date:
                 return None
 
+        # With the tile cache the whole tile of the point is read, so the next points of the tile are local reads
+        if self._tile_cache is not None and 'resolution' in kwargs['grid'] and kwargs.get('spatial_extent'):
+            values = self.sample_points(image=kwargs['image'], temporal=kwargs['temporal'],
+                                        xs=[kwargs['x']], ys=[kwargs['y']], srid=kwargs['srid'],
+                                        grid=kwargs['grid'], spatial_extent=kwargs['spatial_extent'],
+                                        start_date=None, end_date=None, time=kwargs['time'])
+
+            if values[0] is numpy.ma.masked:
+                return None
+
+            return {'raster_value': values[0].item()}
+
         image_name = self.workspace + ":" + kwargs['image']
 
-        min_x, min_y, max_x, max_y = Point(kwargs['x'], kwargs['y']).buffer(0.002).bounds
+        srid = kwargs['srid']
+
+        # The window is requested in the image reference system
+        min_x, min_y, max_x, max_y = transform_bounds(Point(kwargs['x'], kwargs['y']).buffer(0.002).bounds,
+                                                      WGS84, srid)
+        xs, ys = transform_points([kwargs['x']], [kwargs['y']], WGS84, srid)
 
         r_flag = False
 
         image_infos = self._wcs.get_image(image_name, min_x, max_x, min_y, max_y, (kwargs['grid'])['column'],
                                           (kwargs['grid'])['row'],
-                                          kwargs['time'], kwargs['x'], kwargs['y'], r_flag=r_flag)
+                                          kwargs['time'], float(xs[0]), float(ys[0]), r_flag=r_flag,
+                                          crs='EPSG:{}'.format(srid))
 
         return image_infos
+
+    @tracing.traced('datasource.sample_points')
+    @admission_controlled
+    def sample_points(self, **kwargs):
+        """Return the image values of a set of points for wcs datasource.
+
+        The points are grouped by the tiles of the image native grid, each tile is read
+        once and all of its points are sampled with array indexing.
+
+        Args:
+            **kwargs: The keyword arguments. ``xs`` and ``ys`` are the point coordinates according
+                to EPSG:4326, they are transformed to the image reference system ``srid``.
+
+        Returns:
+            numpy.ma.MaskedArray: The value of each point, masked where the point is outside
+            of the image or has no data, or None when the time is outside of the period.
+
+        Raises:
+            ValueError: If the grid does not define the image resolution.
+        """
+        invalid_parameters = set(kwargs) - {"image", "temporal", "xs", "ys", "srid", "grid",
+                                            "spatial_extent", "start_date", "end_date", "time"}
+        if invalid_parameters:
+            raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
+
+        ts = get_date_from_str(kwargs['time'])
+
+        if kwargs['start_date'] and ts < get_date_from_str(kwargs['start_date']):
+            return None
+        if kwargs['end_date'] and ts > get_date_from_str(kwargs['end_date']):
+            return None
+
+        tile_grid = TileGrid.from_collection(kwargs['grid'], kwargs['spatial_extent'], Config.WLTS_TILE_SIZE,
+                                             srid=kwargs['srid'])
+
+        if tile_grid is None:
+            raise ValueError('The image grid resolution is required to sample points')
+
+        xs, ys = transform_points(kwargs['xs'], kwargs['ys'], WGS84, kwargs['srid'])
+
+        cols, rows = tile_grid.pixels(xs, ys)
+        tiles_x, tiles_y = tile_grid.tiles(cols, rows)
+
+        values = None
+
+        # The points outside of the collection extent are left masked, their tiles are not requested
+        positions = numpy.flatnonzero(tile_grid.contains(cols, rows))
+
+        tiles, inverse = numpy.unique(numpy.stack([tiles_x[positions], tiles_y[positions]], axis=1), axis=0,
+                                      return_inverse=True)
+        inverse = inverse.ravel()
+
+        for index, (tile_x, tile_y) in enumerate(tiles.tolist()):
+            selected = positions[inverse == index]
+
+            band, nodata = self.read_tile(kwargs['image'], kwargs['time'], tile_grid, tile_x, tile_y,
+                                          srid=kwargs['srid'])
+
+            if values is None:
+                values = numpy.ma.masked_all(len(cols), dtype=band.dtype)
+
+            tile_values = band[rows[selected] - tile_y * tile_grid.tile_size,
+                               cols[selected] - tile_x * tile_grid.tile_size]
+
+            values[selected] = tile_values
+
+            if nodata is not None:
+                values[selected[tile_values == nodata]] = numpy.ma.masked
+
+        if values is None:
+            return numpy.ma.masked_all(len(cols))
+
+        return values
+
+    def read_tile(self, image, time, tile_grid, tile_x, tile_y, srid=WGS84):
+        """Return the values of an image tile, using the tile cache when it is enabled.
+
+        Args:
+            image (str): The image name (without workspace).
+            time (str): The image time.
+            tile_grid (TileGrid): The image native tile grid.
+            tile_x (int): The tile column.
+            tile_y (int): The tile row.
+            srid (int): The EPSG code of the tile grid.
+
+        Returns:
+            tuple: The tile values as a numpy array and its nodata value.
+        """
+        image_name = self.workspace + ":" + image
+
+        def load():
+            band, _, nodata = self._wcs.get_window(image_name, tile_grid.tile_bounds(tile_x, tile_y),
+                                                   tile_grid.tile_size, tile_grid.tile_size, time,
+                                                   crs='EPSG:{}'.format(srid))
+            return band, nodata
+
+        if self._tile_cache is None:
+            return load()
+
+        # The replicas serve the same images, the tiles are cached by the primary host
+        key = (self._wcs.host, image_name, time, int(srid), tile_grid.origin_x, tile_grid.origin_y,
+               tile_grid.resolution_x, tile_grid.resolution_y, tile_grid.tile_size, tile_x, tile_y)
+
+        return self._tile_cache.get_or_load(key, load)
+
+    @tracing.traced('datasource.get_area')
+    @admission_controlled
+    def get_area(self, **kwargs):
+        """Return the class composition of an area for wcs datasource.
+
+        A single image window covering the geometry is read. The pixels outside the
+        geometry and the nodata pixels are masked out and the remaining pixels are
+        counted by class value.
+
+        Args:
+            **kwargs: The keyword arguments.
+
+        Returns:
+            dict: The class ``values`` with their pixel ``counts`` and ``areas`` (in square meters),
+            as numpy arrays, or None when the time is outside of the period.
+
+        Raises:
+            RequestEntityTooLarge: If the window has more than ``WLTS_AREA_MAX_PIXELS`` pixels.
+        """
+        invalid_parameters = set(kwargs) - {"image", "temporal", "geom", "srid",
+                                            "grid", "start_date", "end_date", "time"}
+        if invalid_parameters:
+            raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
+
+        ts = get_date_from_str(kwargs['time'])
+
+        if kwargs['start_date'] and ts < get_date_from_str(kwargs['start_date']):
+            return None
+        if kwargs['end_date'] and ts > get_date_from_str(kwargs['end_date']):
+            return None
+
+        image_name = self.workspace + ":" + kwargs['image']
+
+        srid = kwargs['srid']
+
+        # The window is read in the image reference system
+        geom = transform_geometry(kwargs['geom'], WGS84, srid)
+        grid = kwargs['grid']
+
+        min_x, min_y, max_x, max_y = geom.bounds
+
+        # Read the window in the image native resolution when it is known
+        if 'resolution' in grid:
+            width = max(1, math.ceil(round((max_x - min_x) / grid['resolution']['x'], 6)))
+            height = max(1, math.ceil(round((max_y - min_y) / grid['resolution']['y'], 6)))
+        else:
+            width, height = grid['column'], grid['row']
+
+        # The whole window is held in memory, it is rejected before it is requested
+        if width * height > Config.WLTS_AREA_MAX_PIXELS:
+            raise RequestEntityTooLarge('The area has {} pixels, at most {} are allowed'.format(
+                width * height, Config.WLTS_AREA_MAX_PIXELS))
+
+        values, transform, nodata = self._wcs.get_window(image_name, (min_x, min_y, max_x, max_y),
+                                                         width, height, kwargs['time'],
+                                                         crs='EPSG:{}'.format(srid))
+
+        return class_composition(values, transform, geom, nodata, srid)
@@ -6,16 +6,29 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 """WLTS WFS DataSource."""
-from functools import lru_cache
-from json import loads as json_loads
-from xml.dom import minidom
+from contextlib import closing
+from urllib.parse import parse_qsl
 
 import requests
-from shapely.geometry import Point
+from shapely.geometry import MultiPoint, Point, shape
 from werkzeug.exceptions import NotFound
 
+from wlts import deadline, tracing
+from wlts.caches import memoize
+from wlts.config import Config
+from wlts.datasources.admission import admission_controlled
 from wlts.datasources.datasource import DataSource
-from wlts.utils import get_date_from_str
+from wlts.datasources.parsers import (find_xml_child_text,
+                                      iter_geojson_features, iter_xml_elements)
+from wlts.datasources.replicas import http_probe, make_pool
+from wlts.datasources.singleflight import single_flight
+from wlts.utils import (WGS84, GeometryIndex, get_date_from_str,
+                        transform_points)
+
+
+def _describe_class(wfs, type_name, tag_name, filter):
+    """Return the cache description of a class request."""
+    return dict(host=wfs.host, name=type_name)
 
 
 class WFS:
@@ -25,7 +38,7 @@ class WFS:
         """Create a WFS client attached to the given host address (an URL).
 
         Args:
-            host (str): the server URL.
+            host (str/list): the server URL or the URLs of its replicas, the first one is the primary.
             **kwargs: The keyword arguments with credentials to access WFS.
         """
         invalid_parameters = set(kwargs) - {"auth"}
@@ -33,7 +46,6 @@ class WFS:
         if invalid_parameters:
             raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
 
-        self.host = host
         self.base_path = "wfs?service=WFS&version=1.0.0"
 
         self._auth = None
@@ -46,33 +58,106 @@ class WFS:
                     raise AttributeError('auth must be a tuple with 2 values ("user", "pass")')
                 self._auth = kwargs['auth']
 
+        # The URLs are built with the primary host and sent to the selected replica
+        self.pool = make_pool(host, probe=http_probe(self.base_path + "&request=GetCapabilities", auth=self._auth))
+        self.host = self.pool.primary
+
+    def _replica_url(self, host, uri):
+        """Return the URL of a request in a replica host."""
+        return host + uri[len(self.host):] if uri.startswith(self.host) else uri
+
+    def _request(self, uri, stream=False, span=None):
+        """Send a HTTP GET request to the best replica, failing over to the others on server errors.
+
+        The request is sent as a form encoded POST when the URL is longer than
+        ``WLTS_WFS_MAX_URL_LENGTH``, as for the filters of many points.
+
+        Args:
+            uri (str): URL for the WFS server.
+            stream (bool): True to read the response body on demand.
+            span (:obj:`Span`, optional): The request span, it gets the selected replica.
+        """
+        def get(host):
+            if span is not None:
+                span.set_attribute('replica', host)
+
+            url = self._replica_url(host, uri)
+
+            if len(url) > Config.WLTS_WFS_MAX_URL_LENGTH:
+                base, _, query = url.partition('?')
+                response = requests.post(base, data=parse_qsl(query, keep_blank_values=True), auth=self._auth,
+                                         stream=stream, timeout=deadline.bound(None))
+            else:
+                response = requests.get(url, auth=self._auth, stream=stream, timeout=deadline.bound(None))
+
+            if response.status_code >= 500:
+                response.close()
+                raise requests.HTTPError("Request Fail: {} ".format(response.status_code), response=response)
+
+            return response
+
+        return self.pool.call(get)
+
     def _get(self, uri):
         """Query the WFS service using HTTP GET verb.
 
         Args:
             uri (str): URL for the WCS server.
         """
-        response = requests.get(uri, auth=self._auth)
+        with tracing.span('http.get', url=uri) as span:
+            response = self._request(uri, span=span)
 
-        if response.status_code != 200:
-            raise Exception("Request Fail: {} ".format(response.status_code))
+            if span is not None:
+                span.set_attribute('status', response.status_code)
+                span.set_attribute('bytes', len(response.content))
 
-        return response.content.decode('utf-8')
+            if response.status_code != 200:
+                raise Exception("Request Fail: {} ".format(response.status_code))
 
-    def _list_features(self):
-        """Returns the list of all available feature in service."""
-        url = "{}/{}&request=GetCapabilities&outputFormat=application/json".format(self.host, self.base_path)
+            return response.content.decode('utf-8')
+
+    def _stream(self, uri, chunk_size=16384):
+        """Query the WFS service using HTTP GET verb and iterate over the response body.
 
-        doc = self._get(url)
+        Args:
+            uri (str): URL for the WFS server.
+            chunk_size (int): The size in bytes of each chunk read from the response.
+        """
+        # The chunks are consumed outside of this generator, so its span is not made current
+        span = tracing.start_span('http.get', url=uri, bytes=0)
+        error = None
+
+        try:
+            with self._request(uri, stream=True, span=span) as response:
+                if span is not None:
+                    span.set_attribute('status', response.status_code)
+
+                if response.status_code != 200:
+                    raise Exception("Request Fail: {} ".format(response.status_code))
+
+                for chunk in response.iter_content(chunk_size):
+                    if span is not None:
+                        span.attributes['bytes'] += len(chunk)
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if span is not None:
+                span.finish(error=error)
+
+    def _iter_features(self):
+        """Iterate over the available features in service while the capabilities are read."""
+        url = "{}/{}&request=GetCapabilities&outputFormat=application/json".format(self.host, self.base_path)
 
-        xmldoc = minidom.parseString(doc)
-        itemlist = xmldoc.getElementsByTagName('FeatureType')
+        with closing(self._stream(url)) as chunks:
+            for feature_type in iter_xml_elements(chunks, 'FeatureType', stop='FeatureTypeList'):
+                yield find_xml_child_text(feature_type, 'Name')
 
+    def _list_features(self):
+        """Returns the list of all available feature in service."""
         features = dict()
-        features[u'features'] = []
-
-        for s in itemlist:
-            features[u'features'].append(s.childNodes[0].firstChild.nodeValue)
+        features[u'features'] = list(self._iter_features())
 
         return features
 
@@ -82,10 +167,12 @@ class WFS:
         Args:
             ft_name (str): The feature name to check.
         """
-        features = self._list_features()
+        features = self._iter_features()
 
-        if ft_name not in features['features']:
-            raise NotFound('Feature "{}" not found'.format(ft_name))
+        # Stop reading the capabilities as soon as the feature is found
+        with closing(features):
+            if not any(feature == ft_name for feature in features):
+                raise NotFound('Feature "{}" not found'.format(ft_name))
 
     def mount_url(self, type_name, **kwargs):
         """Mount the url for get a feature from server based on GetFeature request.
@@ -95,11 +182,14 @@ class WFS:
             **kwargs: The keyword arguments:
                 srid (int): EPSG code
                 propertyName (str): Feature property names
+                maxFeatures (int): Maximum number of features to retrieve.
+                startIndex (int): Position of the first feature to retrieve, to read the features in pages.
                 filter (str): Filter to use in request.
                 outputformat (str): Requested response format of the request.
 
         """
-        invalid_parameters = set(kwargs) - {'srid', 'propertyName', 'filter', 'outputformat'}
+        invalid_parameters = set(kwargs) - {'srid', 'propertyName', 'maxFeatures', 'startIndex', 'filter',
+                                            'outputformat'}
 
         if invalid_parameters:
             raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
@@ -109,6 +199,12 @@ class WFS:
         if 'propertyName' in kwargs:
             url += "&propertyName={}".format(kwargs['propertyName'])
 
+        if 'maxFeatures' in kwargs:
+            url += "&maxFeatures={}".format(kwargs['maxFeatures'])
+
+        if 'startIndex' in kwargs:
+            url += "&startIndex={}".format(kwargs['startIndex'])
+
         if 'outputformat' in kwargs:
             url += kwargs['outputformat']
 
@@ -122,35 +218,75 @@ class WFS:
 
         return url
 
-    def get_feature(self, type_name, srid, filter):
-        """Retrieve the feature collection given feature."""
+    def get_feature(self, type_name, srid, filter, property_names=None):
+        """Retrieve the properties of the first feature that matches the filter.
+
+        Args:
+            type_name (str): Name of the feature type.
+            srid (int): EPSG code.
+            filter (str): Filter to use in request.
+            property_names (:obj:`tuple`, optional): The feature properties to retrieve.
+                All properties are retrieved when it is not given.
+        """
+        features = self.get_features(type_name, srid, filter, property_names=property_names, max_features=1)
+
+        return features[0] if features else None
+
+    @single_flight
+    def get_features(self, type_name, srid, filter, property_names=None, max_features=None, geometry=False,
+                     start_index=None):
+        """Retrieve the properties of the features that matches the filter.
+
+        The response is parsed while it is downloaded and the download stops as soon
+        as ``max_features`` features are read.
+
+        Args:
+            type_name (str): Name of the feature type.
+            srid (int): EPSG code.
+            filter (str): Filter to use in request.
+            property_names (:obj:`tuple`, optional): The feature properties to retrieve.
+                All properties are retrieved when it is not given.
+            max_features (:obj:`int`, optional): The maximum number of features to retrieve.
+            geometry (bool): True to retrieve the GeoJSON features, with their geometry, instead
+                of their properties. The geometry property must be in ``property_names``.
+            start_index (:obj:`int`, optional): The position of the first feature to retrieve.
+
+        Returns:
+            list: The properties of each feature.
+        """
         args = {"srid": srid, "filter": filter, "outputformat": "&outputformat=json"}
 
-        url = self.mount_url(type_name, **args)
+        if property_names:
+            args['propertyName'] = ",".join(property_names)
 
-        doc = self._get(url)
+        if max_features:
+            args['maxFeatures'] = max_features
 
-        js = json_loads(doc)
+        if start_index:
+            args['startIndex'] = start_index
 
-        if not js["features"]:
-            return None
-        else:
-            return js["features"][0]["properties"]
+        url = self.mount_url(type_name, **args)
 
-    @lru_cache()
+        with closing(self._stream(url)) as chunks:
+            features = iter_geojson_features(chunks, limit=max_features)
+
+            return list(features) if geometry else [feature["properties"] for feature in features]
+
+    @memoize('wfs.get_class', describe=_describe_class)
+    @single_flight
     def get_class(self, type_name, tag_name, filter):
-        """Return a class of given feature."""
+        """Return a class of given feature.
+
+        The GetFeature response is read only until the first ``tag_name`` element.
+        """
         args = {"filter": "&cql_filter={}".format(filter)}
 
         url = self.mount_url(type_name, **args)
 
-        doc = self._get(url)
-
-        xmldoc = minidom.parseString(doc)
-
-        itemlist = xmldoc.getElementsByTagName(tag_name)
+        with closing(self._stream(url)) as chunks:
+            element = next(iter_xml_elements(chunks, tag_name), None)
 
-        return itemlist[0].firstChild.nodeValue
+            return element.text if element is not None else None
 
 
 class WFSDataSource(DataSource):
@@ -163,7 +299,7 @@ class WFSDataSource(DataSource):
             id (str): the datasource identifier.
             ds_info (dict): A datasource information as a dictionary.
         """
-        super().__init__(id)
+        super().__init__(id, ds_info)
 
         if 'user' in ds_info and 'password' in ds_info:
             self._wfs = WFS(ds_info['host'], auth=(ds_info["user"], ds_info["password"]))
@@ -176,6 +312,15 @@ class WFSDataSource(DataSource):
         """Return the datasource type."""
         return "WFS"
 
+    def get_metrics(self):
+        """Return the datasource metrics, with the state of each replica host."""
+        metrics = super().get_metrics()
+        metrics['replicas'] = self._wfs.pool.stats()
+
+        return metrics
+
+    @tracing.traced('datasource.get_classe')
+    @admission_controlled
     def get_classe(self, feature_id, value, class_property_name, ft_name, **kwargs):
         """Return a class of feature based on his classification system."""
         type_name = self.workspace + ":" + ft_name
@@ -189,44 +334,191 @@ class WFSDataSource(DataSource):
 
         return self._wfs.get_class(type_name=type_name, tag_name=tag_name, filter=filter)
 
+    def _observations_query(self, kwargs, local=False):
+        """Return the observations in the period and the filter and properties to retrieve them.
+
+        Args:
+            kwargs (dict): The keyword arguments of a trajectory query.
+            local (bool): True when the features are not filtered by the server, the period
+                is then always checked by the observation filter.
+
+        Returns:
+            tuple: The observations, the temporal filter to append to the spatial one, the feature
+            properties to retrieve and the observation filter to apply to each feature, if any.
+        """
+        observations = kwargs['obs'] if isinstance(kwargs['obs'], list) else [kwargs['obs']]
+
+        temporal = kwargs['temporal']
+
+        string_format = temporal["string_format"]
+
+        start_date = get_date_from_str(kwargs['start_date']).strftime(string_format) if kwargs['start_date'] else None
+        end_date = get_date_from_str(kwargs['end_date']).strftime(string_format) if kwargs['end_date'] else None
+
+        temporal_filter = ""
+
+        property_names = set(obs["class_property"] for obs in observations if "class_property" in obs)
+
+        local_filter = None
+
+        if temporal["type"] == "STRING":
+            observations = [obs for obs in observations
+                            if self._in_period(obs["temporal_property"], string_format, start_date, end_date)]
+        else:
+            temporal_properties = set(obs["temporal_property"] for obs in observations)
+            property_names.update(temporal_properties)
+
+            # The period can only be pushed to the server when all observations share the temporal property
+            if len(temporal_properties) == 1 and not local:
+                temporal_property = temporal_properties.pop()
+                if start_date:
+                    temporal_filter += " AND {} >= {}".format(temporal_property, start_date)
+                if end_date:
+                    temporal_filter += " AND {} <= {}".format(temporal_property, end_date)
+            else:
+                local_filter = self._period_filter(string_format, start_date, end_date)
+
+        return observations, temporal_filter, property_names, local_filter
+
+    @staticmethod
+    def _observations(observations, features, local_filter):
+        """Return the pairs (observation, feature properties) of a set of features."""
+        if local_filter is not None:
+            return [(obs, feature) for feature in features for obs in observations if local_filter(obs, feature)]
+
+        return [(obs, feature) for feature in features for obs in observations]
+
+    @tracing.traced('datasource.get_trajectory')
+    @admission_controlled
     def get_trajectory(self, **kwargs):
-        """Return a trajectory observation of this datasource."""
+        """Return the trajectory observations of this datasource.
+
+        All the observations are retrieved with a single GetFeature request, limited to
+        the temporal and class properties they need.
+
+        Only the first intersecting feature is used, unless ``max_features`` is given,
+        then each intersecting feature (up to ``max_features``) is an observation.
+
+        Args:
+            **kwargs: The keyword arguments. The ``obs`` argument may be a single
+                observation property or a list of them.
+
+        Returns:
+            list: A list of pairs (observation, feature properties).
+        """
         invalid_parameters = set(kwargs) - {"feature_name", "temporal",
                                             "x", "y", "obs", "geom_property",
-                                            "classification_class", "start_date", "end_date"}
+                                            "classification_class", "start_date", "end_date",
+                                            "max_features"}
         if invalid_parameters:
             raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
 
+        observations, temporal_filter, property_names, local_filter = self._observations_query(kwargs)
+
+        if not observations:
+            return []
+
         typeName = self.workspace + ":" + kwargs['feature_name']
 
-        geom = Point(kwargs['x'], kwargs['y'])
+        # The filter geometry is expressed in the layer geometry reference system
+        xs, ys = transform_points([kwargs['x']], [kwargs['y']], WGS84, (kwargs['geom_property'])['srid'])
+        geom = Point(xs[0], ys[0])
 
         cql_filter = "&CQL_FILTER=INTERSECTS({}, {})".format((kwargs['geom_property'])['property_name'], geom.wkt)
 
-        if (kwargs['temporal'])["type"] == "STRING":
+        features = self._wfs.get_features(typeName, (kwargs['geom_property'])['srid'], cql_filter + temporal_filter,
+                                          property_names=tuple(sorted(property_names)),
+                                          max_features=kwargs.get('max_features') or 1)
 
-            temporal_observation = get_date_from_str((kwargs['obs'])["temporal_property"]).strftime(
-                (kwargs['temporal'])["string_format"])
+        return self._observations(observations, features, local_filter)
 
-            if kwargs['start_date']:
-                start_date = get_date_from_str(kwargs['start_date']).strftime((kwargs['temporal'])["string_format"])
-                if (start_date > temporal_observation):
-                    return
-            if kwargs['end_date']:
-                end_date = get_date_from_str(kwargs['end_date']).strftime((kwargs['temporal'])["string_format"])
-                if (temporal_observation > end_date):
-                    return
-        else:
-            if kwargs['start_date']:
-                start_date = get_date_from_str(kwargs['start_date'])
-                cql_filter += " AND {} >= {}".format((kwargs['obs'])["temporal_property"],
-                                                     start_date.strftime((kwargs['temporal'])["string_format"]))
+    @tracing.traced('datasource.get_trajectory_batch')
+    @admission_controlled
+    def get_trajectory_batch(self, **kwargs):
+        """Return the trajectory observations of a set of points.
+
+        The points are queried in chunks of ``WLTS_WFS_BATCH_SIZE`` with a single GetFeature
+        request for each chunk, filtered by the multipoint of the chunk. The features are
+        assigned back to their points with a spatial index, each point gets the same
+        observations as :meth:`get_trajectory`.
 
-            if kwargs['end_date']:
-                end_date = get_date_from_str(kwargs['end_date'])
-                cql_filter += " AND {} <= {}".format((kwargs['obs'])["temporal_property"],
-                                                     end_date.strftime((kwargs['temporal'])["string_format"]))
+        Args:
+            **kwargs: The keyword arguments of :meth:`get_trajectory`, with the ``xs`` and ``ys``
+                coordinates according to EPSG:4326 instead of ``x`` and ``y``.
 
-        retval = self._wfs.get_feature(typeName, (kwargs['geom_property'])['srid'], cql_filter)
+        Returns:
+            list: For each point, a list of pairs (observation, feature properties).
+        """
+        invalid_parameters = set(kwargs) - {"feature_name", "temporal",
+                                            "xs", "ys", "obs", "geom_property",
+                                            "classification_class", "start_date", "end_date",
+                                            "max_features"}
+        if invalid_parameters:
+            raise AttributeError('invalid parameter(s): {}'.format(invalid_parameters))
+
+        observations, temporal_filter, property_names, local_filter = self._observations_query(kwargs)
+
+        if not observations:
+            return [[] for _ in kwargs['xs']]
+
+        typeName = self.workspace + ":" + kwargs['feature_name']
+
+        geom_property = kwargs['geom_property']
+
+        # The geometry is required to assign the features to the points
+        property_names.add(geom_property['property_name'])
+
+        max_features = kwargs.get('max_features') or 1
+
+        xs, ys = transform_points(kwargs['xs'], kwargs['ys'], WGS84, geom_property['srid'])
+        points = [Point(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+
+        results = []
+
+        for offset in range(0, len(points), Config.WLTS_WFS_BATCH_SIZE):
+            chunk = points[offset:offset + Config.WLTS_WFS_BATCH_SIZE]
+
+            cql_filter = "&CQL_FILTER=INTERSECTS({}, {})".format(geom_property['property_name'],
+                                                                 MultiPoint(chunk).wkt)
+
+            features = self._wfs.get_features(typeName, geom_property['srid'], cql_filter + temporal_filter,
+                                              property_names=tuple(sorted(property_names)), geometry=True)
+
+            features = [feature for feature in features if feature.get('geometry')]
+
+            index = GeometryIndex([shape(feature['geometry']) for feature in features])
+
+            # Each point keeps the first features in the server order, as a query of its own
+            for point in chunk:
+                point_features = [features[position]['properties']
+                                  for position in index.intersecting(point)[:max_features]]
+
+                results.append(self._observations(observations, point_features, local_filter))
+
+        return results
+
+    @classmethod
+    def _period_filter(cls, string_format, start_date, end_date):
+        """Return the observation filter of the features dated inside the period boundaries."""
+        def period_filter(obs, feature):
+            return cls._in_period(feature[obs["temporal_property"]], string_format, start_date, end_date)
+
+        return period_filter
+
+    @staticmethod
+    def _in_period(date, string_format, start_date, end_date):
+        """Check if a date is inside the period boundaries, at the granularity of the collection format.
+
+        Args:
+            date (str): The date, as '2016', '2016-10-06' or '2016-10-06Z'.
+            string_format (str): The date format of the collection.
+            start_date (:obj:`str`, optional): The begin of the period, formatted.
+            end_date (:obj:`str`, optional): The end of the period, formatted.
+        """
+        date = get_date_from_str(str(date)[:10]).strftime(string_format)
 
-        return retval
+        if start_date and start_date > date:
+            return False
+        if end_date and date > end_date:
+            return False
+        return True
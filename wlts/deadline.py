@@ -0,0 +1,82 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Request time budgets of Web Land Trajectory Service.
+
+The deadline of a request is kept in a context variable, so every collection and
+datasource call made for the request (in its thread or in a copied context) can check
+the remaining time and bound its waits and upstream requests by it.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from werkzeug.exceptions import GatewayTimeout
+
+_deadline = ContextVar('wlts_deadline', default=None)
+
+
+class DeadlineExceeded(GatewayTimeout):
+    """The time budget of the request is over."""
+
+
+@contextmanager
+def deadline(seconds):
+    """Context manager that runs a block with a time budget.
+
+    An enclosing deadline that ends earlier is kept.
+
+    Args:
+        seconds (float): The time budget in seconds, no budget when it is None.
+    """
+    if seconds is None:
+        yield
+        return
+
+    current = _deadline.get()
+    new = time.monotonic() + seconds
+
+    token = _deadline.set(new if current is None else min(current, new))
+
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Return the remaining time in seconds of the current deadline, or None without deadline."""
+    current = _deadline.get()
+
+    if current is None:
+        return None
+
+    return max(0.0, current - time.monotonic())
+
+
+def check():
+    """Raise DeadlineExceeded if the current deadline is over."""
+    left = remaining()
+
+    if left is not None and left <= 0:
+        raise DeadlineExceeded('The request time budget is over')
+
+
+def bound(seconds):
+    """Return a timeout bounded by the remaining time of the current deadline.
+
+    Args:
+        seconds (float): The timeout, no timeout when it is None.
+    """
+    left = remaining()
+
+    if left is None:
+        return seconds
+    if seconds is None:
+        return left
+
+    return min(seconds, left)
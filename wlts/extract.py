@@ -0,0 +1,268 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Bulk trajectory extraction of Web Land Trajectory Service."""
+import csv
+import json
+import multiprocessing
+import os
+
+from .trajectory import Trajectory
+
+FIELDS = ('id', 'longitude', 'latitude', 'collection', 'date', 'class')
+
+
+def read_points(path, x_column='longitude', y_column='latitude', id_column=None):
+    """Read the points of a CSV or GeoJSON file.
+
+    Args:
+        path (str): The file path, GeoJSON files must have the ``.geojson`` or ``.json`` extension.
+        x_column (str): The CSV column with the longitude.
+        y_column (str): The CSV column with the latitude.
+        id_column (:obj:`str`, optional): The CSV column or GeoJSON property with the point identifier.
+            The point position in the file is used when it is not given.
+
+    Returns:
+        list: The points as tuples (id, longitude, latitude).
+    """
+    points = []
+
+    if path.lower().endswith(('.geojson', '.json')):
+        with open(path) as f:
+            features = json.load(f)['features']
+
+        for position, feature in enumerate(features):
+            if feature['geometry']['type'] != 'Point':
+                raise ValueError(f'Feature {position} is not a Point')
+
+            x, y = feature['geometry']['coordinates'][:2]
+            point_id = feature['properties'][id_column] if id_column else feature.get('id', position)
+            points.append((point_id, float(x), float(y)))
+    else:
+        with open(path, newline='') as f:
+            for position, row in enumerate(csv.DictReader(f)):
+                point_id = row[id_column] if id_column else position
+                points.append((point_id, float(row[x_column]), float(row[y_column])))
+
+    return points
+
+
+def extract_batch(args):
+    """Return the trajectory rows of a batch of points.
+
+    Args:
+        args (tuple): The batch index, the points, the collections names, the start and end dates.
+
+    Returns:
+        tuple: The batch index and its rows.
+    """
+    batch, points, collections, start_date, end_date = args
+
+    ids, xs, ys = zip(*points)
+
+    trajectories = Trajectory.get_batch_trajectory(collections, list(xs), list(ys), start_date, end_date)
+
+    rows = []
+    for point_id, x, y, trajectory in zip(ids, xs, ys, trajectories):
+        for entry in trajectory:
+            rows.append((point_id, x, y, entry.collection, entry.date, entry.classe))
+
+    return batch, rows
+
+
+def _check_batch_size(previous, batch_size):
+    """Check that an extraction is resumed with the batch size it was started with.
+
+    The batches are identified by their index, so another batch size would skip or repeat points.
+
+    Raises:
+        ValueError: If the batch sizes differ.
+    """
+    if previous is not None and previous != batch_size:
+        raise ValueError(f'The extraction was started with batch size {previous}, '
+                         f'it must be resumed with the same batch size')
+
+
+class CSVWriter:
+    """This class writes the extraction rows incrementally to a CSV file.
+
+    The finished batches, the batch size and the file size after each of them are kept
+    in a progress file, so an interrupted extraction is resumed from the last finished batch.
+    """
+
+    def __init__(self, path, batch_size, resume=False):
+        """Open a CSVWriter.
+
+        Args:
+            path (str): The CSV file path.
+            batch_size (int): The number of points of each batch.
+            resume (bool): Continue a previous extraction instead of overwriting it.
+
+        Raises:
+            ValueError: If the extraction to resume was started with another batch size.
+        """
+        self.path = path
+        self.progress_path = path + '.progress'
+        self.batch_size = batch_size
+        self.done = set()
+
+        offset = 0
+
+        if resume and os.path.exists(self.progress_path) and os.path.exists(path):
+            with open(self.progress_path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    _check_batch_size(record.get('batch_size'), batch_size)
+                    self.done.add(record['batch'])
+                    offset = max(offset, record['offset'])
+
+            self._file = open(path, 'r+', newline='')
+            # Discard the rows of a batch that was being written when the extraction stopped
+            self._file.truncate(offset)
+            self._file.seek(offset)
+            self._progress = open(self.progress_path, 'a')
+        else:
+            self._file = open(path, 'w', newline='')
+            self._progress = open(self.progress_path, 'w')
+
+        self._writer = csv.writer(self._file)
+
+        if offset == 0:
+            self._writer.writerow(FIELDS)
+
+    def write(self, batch, rows):
+        """Write the rows of a finished batch."""
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._progress.write(json.dumps({'batch': batch, 'batch_size': self.batch_size,
+                                         'offset': self._file.tell()}) + '\n')
+        self._progress.flush()
+
+        self.done.add(batch)
+
+    def close(self):
+        """Close the files."""
+        self._file.close()
+        self._progress.close()
+
+
+class ParquetWriter:
+    """This class writes the extraction rows incrementally as a directory of Parquet files.
+
+    Each finished batch is a ``part-<batch>.parquet`` file written atomically, so the
+    existing parts are the progress of an interrupted extraction. The batch size is kept
+    in the ``_extraction.json`` file of the directory.
+    """
+
+    def __init__(self, path, batch_size, resume=False):
+        """Open a ParquetWriter.
+
+        Args:
+            path (str): The output directory.
+            batch_size (int): The number of points of each batch.
+            resume (bool): Continue a previous extraction instead of overwriting it.
+
+        Raises:
+            ValueError: If the extraction to resume was started with another batch size.
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Parquet output requires pyarrow. Install it with "pip install wlts[parquet]"')
+
+        self._pyarrow = pyarrow
+        self.path = path
+        self.batch_size = batch_size
+        self.done = set()
+
+        os.makedirs(path, exist_ok=True)
+
+        info_path = os.path.join(path, '_extraction.json')
+
+        if resume and os.path.exists(info_path):
+            with open(info_path) as f:
+                _check_batch_size(json.load(f).get('batch_size'), batch_size)
+
+        with open(info_path, 'w') as f:
+            json.dump({'batch_size': batch_size}, f)
+
+        for name in os.listdir(path):
+            if name.startswith('part-') and name.endswith('.parquet'):
+                if resume:
+                    self.done.add(int(name[len('part-'):-len('.parquet')]))
+                else:
+                    os.unlink(os.path.join(path, name))
+
+    def write(self, batch, rows):
+        """Write the rows of a finished batch."""
+        columns = list(zip(*rows)) if rows else [[] for _ in FIELDS]
+
+        table = self._pyarrow.table({
+            'id': self._pyarrow.array([str(value) for value in columns[0]], type=self._pyarrow.string()),
+            'longitude': self._pyarrow.array(columns[1], type=self._pyarrow.float64()),
+            'latitude': self._pyarrow.array(columns[2], type=self._pyarrow.float64()),
+            'collection': self._pyarrow.array(columns[3], type=self._pyarrow.string()),
+            'date': self._pyarrow.array(columns[4], type=self._pyarrow.string()),
+            'class': self._pyarrow.array([str(value) for value in columns[5]], type=self._pyarrow.string()),
+        })
+
+        path = os.path.join(self.path, 'part-{:06d}.parquet'.format(batch))
+
+        self._pyarrow.parquet.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+        self.done.add(batch)
+
+    def close(self):
+        """Nothing to close, each part is a complete file."""
+
+
+def extract(points, writer, collections=None, start_date=None, end_date=None, workers=1, batch_size=500):
+    """Extract the trajectory of a set of points with a pool of processes.
+
+    The points are split in batches, each batch is extracted with the bulk access path
+    of the collections and written as soon as it is finished. Batches already done by
+    the writer (in a resumed extraction) are skipped.
+
+    Args:
+        points (list): The points as tuples (id, longitude, latitude).
+        writer (CSVWriter/ParquetWriter): The output writer.
+        collections (:obj:`list`, optional): The collections names, all collections when it is not given.
+        start_date (:obj:`str`, optional): The begin of a time interval.
+        end_date (:obj:`str`, optional): The end of a time interval.
+        workers (int): The number of processes.
+        batch_size (int): The number of points of each batch.
+
+    Returns:
+        generator: Yields the number of points of each batch written.
+
+    Raises:
+        ValueError: If the writer was opened with another batch size.
+    """
+    _check_batch_size(writer.batch_size, batch_size)
+
+    tasks = [(batch, points[start:start + batch_size], collections, start_date, end_date)
+             for batch, start in enumerate(range(0, len(points), batch_size))
+             if batch not in writer.done]
+
+    if workers == 1:
+        for task in tasks:
+            writer.write(*extract_batch(task))
+            yield len(task[1])
+        return
+
+    sizes = {task[0]: len(task[1]) for task in tasks}
+
+    # Workers are spawned, not forked: this process holds the locks of the trajectory thread pool,
+    # a forked child could wait forever on one. The tile cache (WLTS_TILE_CACHE_DIR) is shared on disk.
+    with multiprocessing.get_context('spawn').Pool(processes=workers) as pool:
+        for batch, rows in pool.imap_unordered(extract_batch, tasks):
+            writer.write(batch, rows)
+            yield sizes[batch]
@@ -0,0 +1,169 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Response formats of Web Land Trajectory Service."""
+import gzip
+import json
+
+from flask import Response, jsonify, request
+from werkzeug.exceptions import NotAcceptable
+
+from .config import Config
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+
+def _has_module(name):
+    """Return True if an optional dependency is installed."""
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def available_mimetypes():
+    """Return the response media types supported by the installed dependencies.
+
+    MessagePack requires ``msgpack`` and Arrow IPC requires ``pyarrow``, install them
+    with ``pip install wlts[msgpack]`` and ``pip install wlts[arrow]``.
+    """
+    mimetypes = [JSON]
+
+    if _has_module('msgpack'):
+        mimetypes.append(MSGPACK)
+    if _has_module('pyarrow'):
+        mimetypes.append(ARROW)
+
+    return mimetypes
+
+
+def negotiate():
+    """Return the response media type that best matches the request ``Accept`` header.
+
+    Raises:
+        NotAcceptable: If none of the requested media types is supported.
+    """
+    if not request.accept_mimetypes:
+        return JSON
+
+    mimetype = request.accept_mimetypes.best_match(available_mimetypes())
+
+    if mimetype is None:
+        raise NotAcceptable('Supported media types: {}'.format(', '.join(available_mimetypes())))
+
+    return mimetype
+
+
+def trajectory_table(trajectory, query=None, status=None, token=None):
+    """Build an Arrow table with one row for each trajectory entry.
+
+    Args:
+        trajectory (list/dict): The trajectory entries as dictionaries or, in the columnar
+            format, the dates and classes of each collection.
+        query (:obj:`dict`, optional): The query parameters, kept in the schema metadata.
+        status (:obj:`dict`, optional): The status of each collection, kept in the schema metadata.
+        token (:obj:`str`, optional): The continuation token, kept in the schema metadata.
+
+    Returns:
+        pyarrow.Table: The table with the ``collection``, ``class`` and ``date`` columns.
+    """
+    import pyarrow
+
+    collections, classes, dates = [], [], []
+
+    if isinstance(trajectory, dict):
+        for collection, columns in trajectory.items():
+            runs = columns.get('runs') or [1] * len(columns['classes'])
+            for classe, run in zip(columns['classes'], runs):
+                classes.extend([classe] * run)
+            collections.extend([collection] * len(columns['dates']))
+            dates.extend(columns['dates'])
+    else:
+        for entry in trajectory:
+            collections.append(entry['collection'])
+            classes.append(entry['class'])
+            dates.append(entry['date'])
+
+    metadata = dict()
+    if query is not None:
+        metadata['query'] = json.dumps(query)
+    if status is not None:
+        metadata['status'] = json.dumps(status)
+    if token is not None:
+        metadata['token'] = token
+
+    return pyarrow.table({
+        'collection': pyarrow.array(collections, type=pyarrow.string()).dictionary_encode(),
+        'class': pyarrow.array([str(classe) for classe in classes], type=pyarrow.string()),
+        'date': pyarrow.array(dates, type=pyarrow.string())
+    }, metadata=metadata or None)
+
+
+def make_response(result, mimetype):
+    """Serialize a trajectory result in a media type.
+
+    Args:
+        result (dict): The trajectory result, with the ``query`` and the ``result`` trajectory.
+        mimetype (str): The media type returned by :func:`negotiate`.
+
+    Returns:
+        flask.Response: The response.
+    """
+    if mimetype == MSGPACK:
+        import msgpack
+
+        response = Response(msgpack.packb(result, use_bin_type=True), mimetype=MSGPACK)
+    elif mimetype == ARROW:
+        import pyarrow
+
+        table = trajectory_table(result['result']['trajectory'], result.get('query'), result['result'].get('status'),
+                                 result['result'].get('token'))
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        response = Response(sink.getvalue().to_pybytes(), mimetype=ARROW)
+    else:
+        response = jsonify(result)
+
+    response.vary.add('Accept')
+
+    return response
+
+
+def compress_response(response):
+    """Compress a response body with gzip when the client accepts it.
+
+    Small bodies, streamed and already encoded responses are left unchanged.
+
+    Args:
+        response (flask.Response): The response.
+
+    Returns:
+        flask.Response: The response.
+    """
+    if response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if 'gzip' not in request.accept_encodings:
+        return response
+
+    data = response.get_data()
+
+    if len(data) < Config.WLTS_COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=Config.WLTS_COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+
+    return response
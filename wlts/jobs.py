@@ -0,0 +1,524 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Asynchronous trajectory jobs of Web Land Trajectory Service.
+
+A job queries the trajectories of a large set of points in background. Its points are
+split in chunks of ``WLTS_JOBS_CHUNK_SIZE``, the trajectories of each chunk are written
+to a file of the job directory as soon as they are retrieved. A job interrupted by a
+restart resumes from its first missing chunk.
+
+The jobs directory is shared by the processes of the service: a job is run by the
+process that holds the lock of its directory, and the other processes read its state
+from the directory.
+"""
+import fcntl
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from shapely.geometry import Point, shape
+from shapely.prepared import prep
+from werkzeug.exceptions import BadRequest, NotFound, RequestEntityTooLarge
+
+from .config import Config
+from .trajectory import Trajectory
+from .warmup import expand_targets, grid_shape
+
+PENDING_STATES = ('queued', 'running')
+
+_JOB_ID = re.compile('[0-9a-f]{32}')
+
+
+def _write_json(path, document):
+    """Write a JSON document, a reader never sees a partial file."""
+    tmp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+
+    with open(tmp, 'w') as f:
+        json.dump(document, f)
+
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    """Read a JSON document."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def _job_geometries(spec):
+    """Return the geometries of a job specification.
+
+    Raises:
+        BadRequest: If a geometry is not a valid Polygon or MultiPolygon.
+    """
+    geometries = []
+
+    for geom in spec.get('geoms') or []:
+        try:
+            geometry = shape(geom)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise BadRequest('Invalid GeoJSON geometry')
+
+        if geometry.geom_type not in ('Polygon', 'MultiPolygon') or not geometry.is_valid:
+            raise BadRequest('The geometry must be a valid Polygon or MultiPolygon')
+
+        geometries.append(geometry)
+
+    return geometries
+
+
+def _job_step(spec):
+    """Return the sampling step of a job specification.
+
+    Raises:
+        BadRequest: If the step is not positive.
+    """
+    step = spec.get('step')
+
+    if step is None:
+        return Config.WLTS_WARMUP_STEP
+
+    # The step comes from the request, a bool is an int for Python and the JSON parser accepts NaN
+    if isinstance(step, bool) or not isinstance(step, (int, float)) or not math.isfinite(step) or step <= 0:
+        raise BadRequest('The step must be a number greater than 0')
+
+    return step
+
+
+def estimate_job_points(spec):
+    """Return the maximum number of points of a job, without building them.
+
+    The geometries count the points of the grid of their extent.
+
+    Args:
+        spec (dict): The job specification, see :func:`expand_job_targets`.
+
+    Returns:
+        int: The number of points.
+
+    Raises:
+        BadRequest: If a geometry is invalid or the step is not positive.
+    """
+    step = _job_step(spec)
+
+    extents = list(spec.get('bboxes') or []) + [geometry.bounds for geometry in _job_geometries(spec)]
+
+    total = len(spec.get('points') or [])
+
+    for bounds in extents:
+        columns, rows = grid_shape(bounds, step)
+        total += columns * rows
+
+    return total
+
+
+def expand_job_targets(spec):
+    """Return the coordinates of the points of a job.
+
+    Args:
+        spec (dict): The job specification with the ``points``, the ``bboxes``, the ``geoms``
+            (GeoJSON polygons) and their sampling ``step``.
+
+    Returns:
+        tuple: The longitude and latitude lists.
+
+    Raises:
+        BadRequest: If a geometry is not a valid Polygon or MultiPolygon or the step is not positive.
+    """
+    step = _job_step(spec)
+
+    xs, ys = expand_targets(spec.get('points'), spec.get('bboxes'), step)
+
+    for geometry in _job_geometries(spec):
+        # The grid of the geometry extent, without the points outside of it
+        prepared = prep(geometry)
+        grid_xs, grid_ys = expand_targets(bboxes=[geometry.bounds], step=step)
+
+        for x, y in zip(grid_xs, grid_ys):
+            if prepared.intersects(Point(x, y)):
+                xs.append(x)
+                ys.append(y)
+
+    return xs, ys
+
+
+class TrajectoryJob:
+    """This class keeps the state of a trajectory job in its directory.
+
+    The directory has the ``job.json`` document, with the specification and the state
+    of the job, the ``points.json`` coordinates, a ``chunk-<n>.json`` file for each
+    retrieved chunk and the ``run.lock`` file locked by the process that runs the job.
+    """
+
+    def __init__(self, directory, document):
+        """Create a TrajectoryJob.
+
+        Args:
+            directory (str): The job directory.
+            document (dict): The job document, see :meth:`create`.
+        """
+        self.directory = directory
+        self.document = document
+
+        self._cancel = threading.Event()
+        self._lock_file = None
+
+    @classmethod
+    def create(cls, root, spec, chunk_size):
+        """Create a queued job in a new directory.
+
+        Args:
+            root (str): The jobs directory.
+            spec (dict): The job specification.
+            chunk_size (int): The number of points of each result chunk.
+
+        Returns:
+            TrajectoryJob: The job.
+
+        Raises:
+            BadRequest: If the job has no point or an invalid geometry or step.
+            RequestEntityTooLarge: If the job has more than ``WLTS_JOBS_MAX_POINTS`` points,
+                counting the grid of the extent of its geometries.
+        """
+        # The points are counted before they are built, a large area with a small step is rejected at once
+        total = estimate_job_points(spec)
+
+        if total > Config.WLTS_JOBS_MAX_POINTS:
+            raise RequestEntityTooLarge('The job has up to {} points, at most {} are allowed'.format(
+                total, Config.WLTS_JOBS_MAX_POINTS))
+
+        xs, ys = expand_job_targets(spec)
+
+        if not xs:
+            raise BadRequest('The job has no point')
+
+        job_id = uuid.uuid4().hex
+        directory = os.path.join(root, job_id)
+
+        os.makedirs(directory)
+
+        _write_json(os.path.join(directory, 'points.json'), {'xs': xs, 'ys': ys})
+
+        document = {
+            'id': job_id,
+            'spec': spec,
+            'state': 'queued',
+            'total': len(xs),
+            'chunk_size': chunk_size,
+            'chunks': (len(xs) + chunk_size - 1) // chunk_size,
+            'ready': 0,
+            'error': None,
+            'created': time.time(),
+            'started': None,
+            'finished': None
+        }
+
+        job = cls(directory, document)
+        job.save()
+
+        return job
+
+    @classmethod
+    def load(cls, directory):
+        """Load a job from its directory."""
+        return cls(directory, _read_json(os.path.join(directory, 'job.json')))
+
+    @property
+    def id(self):
+        """Return the job identifier."""
+        return self.document['id']
+
+    @property
+    def state(self):
+        """Return the job state: queued, running, finished, failed or cancelled."""
+        return self.document['state']
+
+    def save(self):
+        """Write the job document."""
+        _write_json(os.path.join(self.directory, 'job.json'), self.document)
+
+    def reload(self):
+        """Read the job document again, as written by the process that runs the job."""
+        self.document = _read_json(os.path.join(self.directory, 'job.json'))
+
+    def acquire(self):
+        """Lock the job, so no other process runs it.
+
+        The lock is released by :meth:`release` or when the process exits.
+
+        Returns:
+            bool: True when the job is locked, False when another process holds the lock.
+        """
+        try:
+            lock_file = open(os.path.join(self.directory, 'run.lock'), 'w')
+        except OSError:
+            return False
+
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+
+        return True
+
+    def release(self):
+        """Unlock the job."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def chunk_path(self, index):
+        """Return the file of a result chunk."""
+        return os.path.join(self.directory, 'chunk-{:06d}.json'.format(index))
+
+    def chunk_ready(self, index):
+        """Return True when a result chunk was retrieved."""
+        return os.path.exists(self.chunk_path(index))
+
+    def run(self):
+        """Retrieve the missing chunks, it returns when all of them are retrieved or the job is cancelled."""
+        if self._cancel.is_set() or self.state not in PENDING_STATES or not os.path.isdir(self.directory):
+            return
+
+        spec = self.document['spec']
+        points = _read_json(os.path.join(self.directory, 'points.json'))
+        chunk_size = self.document['chunk_size']
+
+        self.document.update(state='running', started=self.document['started'] or time.time())
+        self.save()
+
+        try:
+            for index in range(self.document['chunks']):
+                # The job is deleted by removing its directory, maybe by another process
+                if self._cancel.is_set() or not os.path.isdir(self.directory):
+                    break
+
+                if self.chunk_ready(index):
+                    continue
+
+                xs = points['xs'][index * chunk_size:(index + 1) * chunk_size]
+                ys = points['ys'][index * chunk_size:(index + 1) * chunk_size]
+
+                trajectories = Trajectory.get_batch_trajectory(spec.get('collections'), xs, ys,
+                                                               spec.get('start_date'), spec.get('end_date'))
+
+                _write_json(self.chunk_path(index), {
+                    'chunk': index,
+                    'points': [
+                        {'longitude': x, 'latitude': y, 'trajectory': [entry.to_dict() for entry in tj_attr]}
+                        for x, y, tj_attr in zip(xs, ys, trajectories)
+                    ]
+                })
+
+                self.document['ready'] = index + 1
+                self.save()
+        except Exception as e:
+            self.document.update(state='failed', error=getattr(e, 'description', str(e)))
+        else:
+            self.document['state'] = 'cancelled' if self._cancel.is_set() else 'finished'
+
+        self.document['finished'] = time.time()
+
+        # The directory of a deleted job is removed
+        if os.path.isdir(self.directory):
+            self.save()
+
+    def cancel(self):
+        """Stop the job after the current chunk."""
+        self._cancel.set()
+
+        if self.state == 'queued':
+            self.document.update(state='cancelled', finished=time.time())
+            self.save()
+
+    def progress(self):
+        """Return the job state and progress."""
+        progress = {k: v for k, v in self.document.items() if k != 'spec'}
+        progress['done'] = min(self.document['ready'] * self.document['chunk_size'], self.document['total'])
+
+        return progress
+
+
+class JobManager:
+    """This class runs the trajectory jobs in a pool of background workers.
+
+    The jobs use their own worker threads, so the bulk requests do not take the workers
+    of the interactive trajectory requests. The finished jobs are removed after ``ttl``
+    seconds.
+
+    Only the jobs run by this process are kept in memory, the other jobs of the directory
+    are read from it, so any process of the service answers for any job.
+    """
+
+    def __init__(self, directory, workers=2, chunk_size=1000, ttl=86400):
+        """Create a JobManager.
+
+        The unfinished jobs of the directory that no other process runs are resumed.
+
+        Args:
+            directory (str): The jobs directory.
+            workers (int): The number of jobs run at the same time.
+            chunk_size (int): The number of points of each result chunk.
+            ttl (float): The time in seconds the results of a job are kept after it ends.
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+
+        self._jobs = dict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wlts-job')
+
+        os.makedirs(directory, exist_ok=True)
+
+        for name in sorted(os.listdir(directory)):
+            try:
+                job = TrajectoryJob.load(os.path.join(directory, name))
+            except (OSError, ValueError):
+                continue
+
+            if job.state not in PENDING_STATES or not job.acquire():
+                continue
+
+            # Another process may have finished the job before the lock was taken
+            job.reload()
+
+            if job.state not in PENDING_STATES:
+                job.release()
+                continue
+
+            # A job interrupted by a restart is queued again
+            job.document['state'] = 'queued'
+            self._start(job)
+
+    def _start(self, job):
+        """Queue a locked job in the workers."""
+        with self._lock:
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        """Run a job, it is unlocked and forgotten when it ends."""
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+            job.release()
+
+    def submit(self, spec):
+        """Queue a trajectory job.
+
+        Args:
+            spec (dict): The job specification with the ``collections`` names (all when not
+                given), the ``points``, the ``bboxes``, the ``geoms`` and their sampling ``step``,
+                the ``start_date`` and the ``end_date``.
+
+        Returns:
+            TrajectoryJob: The queued job.
+        """
+        for collection in spec.get('collections') or []:
+            Trajectory.check_collection(collection)
+
+        self.purge()
+
+        job = TrajectoryJob.create(self.directory, spec, self.chunk_size)
+        job.acquire()
+
+        self._start(job)
+
+        return job
+
+    def get(self, job_id):
+        """Return a job, the job run by another process is read from its directory.
+
+        Raises:
+            NotFound: If the job does not exist.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is not None and os.path.isdir(job.directory):
+            return job
+
+        # The identifier is a directory name, it must not reach outside of the jobs directory
+        if not _JOB_ID.fullmatch(job_id):
+            raise NotFound('Job "{}" not found'.format(job_id))
+
+        try:
+            return TrajectoryJob.load(os.path.join(self.directory, job_id))
+        except (OSError, ValueError):
+            raise NotFound('Job "{}" not found'.format(job_id))
+
+    def chunk(self, job_id, index):
+        """Return the file of a retrieved result chunk of a job.
+
+        Raises:
+            NotFound: If the job or the chunk does not exist or the chunk is not retrieved yet.
+        """
+        job = self.get(job_id)
+
+        if not 0 <= index < job.document['chunks']:
+            raise NotFound('The job has {} chunks'.format(job.document['chunks']))
+
+        if not job.chunk_ready(index):
+            raise NotFound('The chunk {} is not ready'.format(index))
+
+        return job.chunk_path(index)
+
+    def delete(self, job_id):
+        """Cancel a job and remove its results.
+
+        A job run by another process stops after its current chunk, when it finds its
+        directory removed.
+        """
+        job = self.get(job_id)
+        job.cancel()
+
+        # A running job writes its current chunk in a directory being removed
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    def purge(self):
+        """Remove the jobs that ended more than ``ttl`` seconds ago."""
+        limit = time.time() - self.ttl
+
+        for name in os.listdir(self.directory):
+            try:
+                job = TrajectoryJob.load(os.path.join(self.directory, name))
+            except (OSError, ValueError):
+                continue
+
+            if job.state not in PENDING_STATES and (job.document['finished'] or 0) < limit:
+                shutil.rmtree(job.directory, ignore_errors=True)
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the job manager, it is created with the ``WLTS_JOBS_*`` settings on first use."""
+    global _job_manager
+
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(Config.WLTS_JOBS_DIR, workers=Config.WLTS_JOBS_WORKERS,
+                                      chunk_size=Config.WLTS_JOBS_CHUNK_SIZE, ttl=Config.WLTS_JOBS_TTL)
+
+    return _job_manager
@@ -30,4 +30,9 @@ collections_list_response = load_schema('list_collections_response.json')
 describe_collection = load_schema('describe_collection_request.json')
 describe_collection_response = load_schema('describe_collection_response.json')
 trajectory = load_schema('trajectory_request.json')
-trajectory_response = load_schema('trajectory_response.json')
\ No newline at end of file
+trajectory_response = load_schema('trajectory_response.json')
+area_trajectory = load_schema('area_trajectory_request.json')
+area_trajectory_response = load_schema('area_trajectory_response.json')
+warmup = load_schema('warmup_request.json')
+cache_invalidation = load_schema('cache_invalidation_request.json')
+trajectory_job = load_schema('trajectory_job_request.json')
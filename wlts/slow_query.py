@@ -0,0 +1,151 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Slow query log of Web Land Trajectory Service."""
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+
+
+class SlowQueryLog:
+    """This class is a span exporter that logs the cost breakdown of slow requests.
+
+    The spans of each trace are kept until its root span finishes. When the root took
+    longer than the threshold, a JSON record with the query, the wall time of each
+    collection and datasource, the number of upstream calls, the cache hits and the
+    response size is logged. Records go through a queue and are written by a background
+    thread, so the request thread never waits for the log file.
+
+    The spans that finish after their root (e.g. of a background thread) are dropped, and
+    the traces whose root never finishes are discarded after ``trace_ttl`` seconds.
+    """
+
+    def __init__(self, threshold, path=None, trace_ttl=300):
+        """Create a SlowQueryLog.
+
+        Args:
+            threshold (float): The minimum duration in seconds of a logged request.
+            path (:obj:`str`, optional): The log file, the standard error is used when it is not given.
+            trace_ttl (float): The seconds that the spans of an unfinished trace, or the id of a finished one, are kept.
+        """
+        self.threshold = threshold
+        self.trace_ttl = trace_ttl
+
+        self._lock = threading.Lock()
+        # trace id -> (time of its first span, spans), in the order the traces were seen
+        self._traces = OrderedDict()
+        # trace id -> time its root finished
+        self._finished = OrderedDict()
+
+        handler = logging.FileHandler(path) if path else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+        self._queue = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+
+        self.logger = logging.getLogger('wlts.slow_query.{}'.format(id(self)))
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(QueueHandler(self._queue))
+
+    def export(self, span):
+        """Keep a span of a trace and log the trace when its root span is slow."""
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+
+            if span.parent_id is not None:
+                if span.trace_id not in self._finished:
+                    self._traces.setdefault(span.trace_id, (now, []))[1].append(span)
+                return
+
+            _, spans = self._traces.pop(span.trace_id, (now, []))
+            self._finished[span.trace_id] = now
+
+        if span.duration >= self.threshold:
+            self.logger.info(json.dumps(self.make_record(span, spans), default=str))
+
+    def _expire(self, now):
+        """Discard the traces and the finished trace ids older than the TTL, the caller holds the lock."""
+        for entries in (self._traces, self._finished):
+            while entries:
+                trace_id, value = next(iter(entries.items()))
+                seen = value[0] if isinstance(value, tuple) else value
+
+                if now - seen < self.trace_ttl:
+                    break
+
+                entries.popitem(last=False)
+
+    @staticmethod
+    def make_record(root, spans):
+        """Build the slow query record of a trace.
+
+        Args:
+            root (Span): The request span.
+            spans (list): The other spans of the trace.
+
+        Returns:
+            dict: The record.
+        """
+        collections = defaultdict(float)
+        datasources = defaultdict(float)
+        upstream_calls = 0
+        upstream_bytes = 0
+        cache = defaultdict(int)
+
+        for span in spans:
+            if span.name.startswith('collection.'):
+                collections[span.attributes.get('collection')] += span.duration
+            elif span.name.startswith('datasource.'):
+                datasources[span.attributes.get('datasource')] += span.duration
+            elif span.name.startswith('http.'):
+                upstream_calls += 1
+                upstream_bytes += span.attributes.get('bytes', 0)
+
+            for key in ('tile_cache_hits', 'tile_cache_misses'):
+                cache[key] += span.attributes.get(key, 0)
+
+        attributes = dict(root.attributes)
+
+        return {
+            'trace_id': root.trace_id,
+            'start': root.start,
+            'name': root.name,
+            'duration': root.duration,
+            'query': attributes.pop('query', None),
+            'response_bytes': attributes.pop('response_bytes', None),
+            'error': attributes.pop('error', None),
+            'collections': dict(collections),
+            'datasources': dict(datasources),
+            'upstream_calls': upstream_calls,
+            'upstream_bytes': upstream_bytes,
+            'cache': dict(cache),
+            'attributes': attributes
+        }
+
+    def close(self):
+        """Write the pending records and stop the background thread."""
+        self._listener.stop()
+
+
+@lru_cache()
+def get_slow_query_log(threshold, path=None, trace_ttl=300):
+    """Return the SlowQueryLog of a threshold and file, one for each of them."""
+    slow_query_log = SlowQueryLog(threshold, path, trace_ttl)
+
+    atexit.register(slow_query_log.close)
+
+    return slow_query_log
@@ -0,0 +1,212 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Tracing spans of Web Land Trajectory Service.
+
+A span measures an operation of a request (the trajectory, each collection, each
+datasource call and each upstream HTTP request) and is nested in the span that was
+current when it started. Finished spans are handed to the registered exporters; while
+there is no exporter, no span is created.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+
+_current_span = ContextVar('wlts_current_span', default=None)
+
+_exporters = []
+
+
+class Span:
+    """This class represents a timed operation of a trace."""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start', 'duration', 'thread', '_clock')
+
+    def __init__(self, name, parent=None, **attributes):
+        """Start a Span.
+
+        Args:
+            name (str): The operation name.
+            parent (:obj:`Span`, optional): The enclosing span, a new trace is started without it.
+            **attributes: The span attributes.
+        """
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = None
+        self.thread = threading.current_thread().name
+        self._clock = time.perf_counter()
+
+    def set_attribute(self, key, value):
+        """Set a span attribute."""
+        self.attributes[key] = value
+
+    def finish(self, error=None):
+        """Finish the span and export it.
+
+        Args:
+            error (:obj:`Exception`, optional): The error that ended the operation.
+        """
+        self.duration = time.perf_counter() - self._clock
+
+        if error is not None:
+            self.attributes['error'] = repr(error)
+
+        for exporter in list(_exporters):
+            exporter.export(self)
+
+    def to_dict(self):
+        """Export the span to Python Dictionary."""
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'thread': self.thread,
+            'attributes': self.attributes
+        }
+
+
+class JSONLinesExporter:
+    """This class writes each finished span as a JSON line of a file."""
+
+    def __init__(self, path):
+        """Create a JSONLinesExporter.
+
+        Args:
+            path (str): The file path, spans are appended to it.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', buffering=1)
+
+    def export(self, span):
+        """Write a span."""
+        line = json.dumps(span.to_dict(), default=str)
+
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+@lru_cache()
+def get_file_exporter(path):
+    """Return the JSONLinesExporter of a file, one for each path."""
+    return JSONLinesExporter(path)
+
+
+def add_exporter(exporter):
+    """Register a span exporter, any object with an ``export(span)`` method."""
+    if exporter not in _exporters:
+        _exporters.append(exporter)
+
+
+def remove_exporter(exporter):
+    """Unregister a span exporter."""
+    _exporters.remove(exporter)
+
+
+def enabled():
+    """Return True when there is a registered exporter."""
+    return bool(_exporters)
+
+
+def current_span():
+    """Return the current span or None."""
+    return _current_span.get()
+
+
+def start_span(name, **attributes):
+    """Start a span in the current span without making it current.
+
+    Used for operations that outlive a block, as streamed responses. The caller must
+    call :meth:`Span.finish`.
+
+    Returns:
+        Span: The span or None when tracing is disabled.
+    """
+    if not _exporters:
+        return None
+
+    return Span(name, parent=_current_span.get(), **attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Context manager that runs a block in a new current span.
+
+    Args:
+        name (str): The operation name.
+        **attributes: The span attributes.
+
+    Returns:
+        Span: The span or None when tracing is disabled.
+    """
+    if not _exporters:
+        yield None
+        return
+
+    new_span = Span(name, parent=_current_span.get(), **attributes)
+    token = _current_span.set(new_span)
+
+    try:
+        yield new_span
+    except BaseException as e:
+        _current_span.reset(token)
+        new_span.finish(error=e)
+        raise
+
+    _current_span.reset(token)
+    new_span.finish()
+
+
+def set_attribute(key, value):
+    """Set an attribute of the current span, if any."""
+    current = _current_span.get()
+
+    if current is not None:
+        current.attributes[key] = value
+
+
+def add_to_attribute(key, value=1):
+    """Add a value to a counter attribute of the current span, if any."""
+    current = _current_span.get()
+
+    if current is not None:
+        current.attributes[key] = current.attributes.get(key, 0) + value
+
+
+def traced(name):
+    """Decorator to run a datasource method in a span.
+
+    The span has the ``datasource`` identifier and, when it is a keyword argument, the ``time`` step.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapped(self, *args, **kwargs):
+            if not _exporters:
+                return method(self, *args, **kwargs)
+
+            with span(name, datasource=self.get_id, time=kwargs.get('time')):
+                return method(self, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
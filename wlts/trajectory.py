@@ -6,9 +6,18 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 """This class implements a  for WLTS."""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+from shapely.geometry import shape
 from werkzeug.exceptions import BadRequest, NotFound
 
+from wlts import continuation, deadline, tracing
 from wlts.collections.collection_manager import collection_manager
+from wlts.collections.trajectory_entry import (by_date, merge_trajectories,
+                                               to_columnar)
+from wlts.config import Config
 
 
 class TrajectoryParams:
@@ -25,6 +34,44 @@ class TrajectoryParams:
         self.latitude = float(properties.get('latitude'))
         self.start_date = properties.get('start_date') if properties.get('start_date') else None
         self.end_date = properties.get('end_date') if properties.get('end_date') else None
+        self.format = properties.get('format') if properties.get('format') else 'list'
+        self.rle = str(properties.get('rle', 'false')).lower() == 'true'
+
+        if self.format not in ('list', 'columnar'):
+            raise BadRequest('Invalid format "{}", use list or columnar'.format(self.format))
+
+        try:
+            self.timeout = float(properties['timeout']) if properties.get('timeout') else Config.WLTS_TRAJECTORY_TIMEOUT
+        except ValueError:
+            raise BadRequest('Invalid timeout "{}"'.format(properties['timeout']))
+
+        if self.timeout <= 0:
+            raise BadRequest('The timeout must be positive')
+
+        self.timeout = min(self.timeout, Config.WLTS_TRAJECTORY_MAX_TIMEOUT)
+
+        self.since = properties.get('since') if properties.get('since') else None
+        self.token = properties.get('token') if properties.get('token') else None
+
+        # The date of the newest entry the client has, for all collections and for each one
+        try:
+            self._since = continuation.entry_date(self.since).strftime('%Y-%m-%d') if self.since else None
+        except ValueError:
+            raise BadRequest('Invalid since date "{}"'.format(self.since))
+
+        self._known = continuation.decode(self.token, self.longitude, self.latitude) if self.token else dict()
+
+    def known_date(self, collection):
+        """Return the date of the newest entry of a collection the client already has or None."""
+        dates = [date for date in (self._since, self._known.get(collection)) if date]
+
+        return max(dates) if dates else None
+
+    def collection_start_date(self, collection):
+        """Return the start date of the query of a collection, after the entries the client already has."""
+        known = self.known_date(collection)
+
+        return continuation.start_after(known, self.start_date) if known else self.start_date
 
     def to_dict(self):
         """Export Trajectory params to Python Dictionary."""
@@ -34,6 +81,44 @@ class TrajectoryParams:
             }
 
 
+class AreaTrajectoryParams:
+    """Object wrapper for Area Trajectory Request Parameters.
+
+    :param properties: area trajectory parameter object
+    :type properties:dict
+    """
+
+    def __init__(self, **properties):
+        """Creates an area trajectory parameter object."""
+        self.collections = properties.get('collections').split(',') if properties.get('collections') else None
+        self.geom = properties.get('geom')
+        self.start_date = properties.get('start_date') if properties.get('start_date') else None
+        self.end_date = properties.get('end_date') if properties.get('end_date') else None
+
+        try:
+            self._geometry = shape(self.geom)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise BadRequest('Invalid GeoJSON geometry')
+
+        if self._geometry.geom_type not in ('Polygon', 'MultiPolygon') or not self._geometry.is_valid:
+            raise BadRequest('The geometry must be a valid Polygon or MultiPolygon')
+
+    def get_geometry(self):
+        """Return the area as a shapely geometry."""
+        return self._geometry
+
+    def to_dict(self):
+        """Export Area Trajectory params to Python Dictionary."""
+        return {
+            k: v
+            for k, v in vars(self).items() if not k.startswith('_')
+            }
+
+
+# Collections of a trajectory request are queried concurrently
+_executor = ThreadPoolExecutor(max_workers=Config.WLTS_TRAJECTORY_WORKERS, thread_name_prefix='wlts-collection')
+
+
 class Trajectory:
     """Trajectory Class.
 
@@ -74,6 +159,98 @@ class Trajectory:
         :rtype: dict
 
         """
+        with tracing.span('trajectory', longitude=ts_params.longitude, latitude=ts_params.latitude):
+            with deadline.deadline(ts_params.timeout):
+                return cls._get_trajectory(ts_params)
+
+    @staticmethod
+    def _collection_trajectory(collection, tj_attr, ts_params):
+        """Retrieves the trajectory of a collection, its entries are appended to tj_attr."""
+        with tracing.span('collection.trajectory', collection=collection.get_name()) as span:
+            collection.trajectory(tj_attr, ts_params.longitude, ts_params.latitude,
+                                  ts_params.collection_start_date(collection.get_name()), ts_params.end_date)
+            if span is not None:
+                span.set_attribute('entries', len(tj_attr))
+
+    @staticmethod
+    def _new_entries(tj_attr, known):
+        """Return the entries after the date of the newest entry the client has, all of them without date."""
+        if known is None:
+            return list(tj_attr)
+
+        known = continuation.entry_date(known)
+
+        # The datasources filter by date with their own precision, as years, so the entries are filtered again
+        return [entry for entry in list(tj_attr) if continuation.entry_date(entry.date) > known]
+
+    @classmethod
+    def _get_collections_trajectories(cls, collections, ts_params):
+        """Retrieves the trajectory of each collection concurrently, within the request deadline.
+
+        The collections that do not finish in time keep the entries they already retrieved.
+        Only the entries after the ones the client has (``since`` and ``token``) are retrieved.
+
+        :returns: The trajectory (list of TrajectoryEntry), the status of each collection and
+            the date of the newest entry of each collection.
+        :rtype: tuple
+        """
+        start = time.monotonic()
+
+        tasks = []
+        for collection in collections:
+            tj_attr = []
+            # Each task runs in a copy of the request context, with its deadline and trace span
+            future = _executor.submit(copy_context().run, cls._collection_trajectory, collection, tj_attr, ts_params)
+            tasks.append((collection, tj_attr, future))
+
+        wait([future for _, _, future in tasks], timeout=deadline.remaining())
+
+        trajectories = []
+        status = dict()
+        dates = dict()
+        errors = []
+
+        for collection, tj_attr, future in tasks:
+            info = {"status": "ok"}
+
+            if not future.done():
+                info = {"status": "timeout"}
+            elif future.exception() is not None:
+                error = future.exception()
+
+                # Any failure after the end of the budget is a consequence of it
+                if isinstance(error, deadline.DeadlineExceeded) or deadline.remaining() == 0:
+                    info = {"status": "timeout"}
+                else:
+                    info = {"status": "error", "description": getattr(error, 'description', str(error))}
+                    errors.append(error)
+
+            info["elapsed"] = round(time.monotonic() - start, 3)
+
+            name = collection.get_name()
+            known = ts_params.known_date(name)
+
+            entries = cls._new_entries(tj_attr, known)
+
+            trajectories.append(entries)
+            status[name] = info
+
+            # The client is only ahead of the collections that answered completely
+            if info["status"] == "ok" and entries:
+                newest = max(continuation.entry_date(entry.date) for entry in entries).strftime('%Y-%m-%d')
+                known = max(known, newest) if known else newest
+            if known:
+                dates[name] = known
+
+        # Without a single answer, the error itself is the response
+        if errors and len(errors) == len(tasks):
+            raise errors[0]
+
+        return trajectories, status, dates
+
+    @classmethod
+    def _get_trajectory(cls, ts_params):
+        """Retrieves trajectory object in the current trace span."""
         if (ts_params.collections):
             # Validate collection existence
             for collection in ts_params.collections:
@@ -83,10 +260,91 @@ class Trajectory:
             collections = collection_manager.get_all_collections()
 
         # Retrieves the collections that matches the Trajectory collections name arguments
+        trajectories, status, dates = cls._get_collections_trajectories(collections, ts_params)
+
+        if ts_params.format == 'columnar':
+            for tj_attr in trajectories:
+                tj_attr.sort(key=by_date)
+            newtraj = to_columnar(trajectories, rle=ts_params.rle)
+        else:
+            newtraj = [entry.to_dict() for entry in merge_trajectories(trajectories)]
+
+        return {
+            "query": ts_params.to_dict(),
+            "result": {
+                "trajectory": newtraj,
+                "status": status,
+                "token": continuation.encode(ts_params.longitude, ts_params.latitude, dates)
+            }
+
+        }
+
+    @classmethod
+    def get_batch_trajectory(cls, collections_names, xs, ys, start_date=None, end_date=None):
+        """
+        Retrieves the trajectory of a set of points.
+
+        :param collections_names: Collections identifier, all collections when it is None.
+        :type collections_names: list
+        :param xs: The longitude values according to EPSG:4326.
+        :type xs: list
+        :param ys: The latitude values according to EPSG:4326.
+        :type ys: list
+        :param start_date: The begin of a time interval.
+        :type start_date: str
+        :param end_date: The end of a time interval.
+        :type end_date: str
+
+        :returns: The trajectory of each point as a list of TrajectoryEntry.
+        :rtype: list
+
+        """
+        if collections_names:
+            for collection in collections_names:
+                cls.check_collection(collection)
+            collections = [collection_manager.get_collection(name) for name in collections_names]
+        else:
+            collections = collection_manager.get_all_collections()
+
+        tj_attrs = [[] for _ in xs]
+        with tracing.span('batch_trajectory', points=len(xs)):
+            for collection in collections:
+                with tracing.span('collection.trajectory_batch', collection=collection.get_name()):
+                    collection.trajectory_batch(tj_attrs, xs, ys, start_date, end_date)
+
+        # Each collection appended a sorted run to every point, so sorting merges the runs
+        for tj_attr in tj_attrs:
+            tj_attr.sort(key=by_date)
+
+        return tj_attrs
+
+    @classmethod
+    def get_area_trajectory(cls, ts_params: AreaTrajectoryParams):
+        """
+        Retrieves the class composition trajectory of an area.
+
+        Only image collections support area trajectories, so the feature collections
+        are ignored when no collection is given.
+
+        :param ts_params: WLTS Request area trajectory parameters
+        :type ts_params: AreaTrajectoryParams
+
+        :returns: Area Trajectory.
+        :rtype: dict
+
+        """
+        if (ts_params.collections):
+            # Validate collection existence
+            for collection in ts_params.collections:
+                cls.check_collection(collection)
+            collections = cls.get_collections(ts_params)
+        else:
+            collections = [collection for collection in collection_manager.get_all_collections()
+                           if collection.collection_type() == "Image"]
+
         tj_attr = []
         for collection in collections:
-            collection.trajectory(tj_attr, ts_params.longitude, ts_params.latitude, ts_params.start_date,
-                                  ts_params.end_date)
+            collection.area_trajectory(tj_attr, ts_params.get_geometry(), ts_params.start_date, ts_params.end_date)
 
         newtraj = sorted(tj_attr, key=lambda k: k['date'])
 
@@ -7,6 +7,15 @@
 #
 """Utils for Web Land Trajectory Service."""
 from datetime import datetime
+from functools import lru_cache
+
+import numpy
+from pyproj import CRS, Transformer
+from shapely.ops import transform
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+WGS84 = 4326
 
 
 def get_date_from_str(date, date_ref=None):
@@ -25,3 +34,127 @@ def get_date_from_str(date, date_ref=None):
         date = date.replace(day=31, month=12)
 
     return date
+
+
+@lru_cache()
+def get_transformer(source_srid, target_srid):
+    """Return the cached coordinate transformer between two EPSG codes.
+
+    Coordinates are always handled in x, y (longitude, latitude) order.
+
+    Args:
+        source_srid (int): The EPSG code of the input coordinates.
+        target_srid (int): The EPSG code of the output coordinates.
+
+    Returns:
+        pyproj.Transformer: The transformer.
+    """
+    return Transformer.from_crs(CRS.from_epsg(int(source_srid)), CRS.from_epsg(int(target_srid)), always_xy=True)
+
+
+def transform_points(xs, ys, source_srid, target_srid):
+    """Transform arrays of coordinates between two EPSG codes.
+
+    Args:
+        xs (list/numpy.ndarray): The x (longitude) coordinates.
+        ys (list/numpy.ndarray): The y (latitude) coordinates.
+        source_srid (int): The EPSG code of the input coordinates.
+        target_srid (int): The EPSG code of the output coordinates.
+
+    Returns:
+        tuple: The transformed x and y coordinates as numpy arrays.
+    """
+    xs = numpy.asarray(xs, dtype='float64')
+    ys = numpy.asarray(ys, dtype='float64')
+
+    if int(source_srid) == int(target_srid):
+        return xs, ys
+
+    return get_transformer(source_srid, target_srid).transform(xs, ys)
+
+
+def transform_bounds(bounds, source_srid, target_srid):
+    """Return the extent in the target EPSG code that covers an extent.
+
+    Args:
+        bounds (tuple): The extent as (min_x, min_y, max_x, max_y).
+        source_srid (int): The EPSG code of the extent.
+        target_srid (int): The EPSG code of the result.
+
+    Returns:
+        tuple: The transformed extent as (min_x, min_y, max_x, max_y).
+    """
+    if int(source_srid) == int(target_srid):
+        return tuple(bounds)
+
+    min_x, min_y, max_x, max_y = bounds
+
+    xs, ys = transform_points([min_x, max_x, max_x, min_x], [min_y, min_y, max_y, max_y], source_srid, target_srid)
+
+    return xs.min(), ys.min(), xs.max(), ys.max()
+
+
+def transform_geometry(geom, source_srid, target_srid):
+    """Transform a shapely geometry between two EPSG codes.
+
+    Args:
+        geom (shapely.geometry.base.BaseGeometry): The geometry.
+        source_srid (int): The EPSG code of the geometry.
+        target_srid (int): The EPSG code of the result.
+
+    Returns:
+        shapely.geometry.base.BaseGeometry: The transformed geometry.
+    """
+    if int(source_srid) == int(target_srid):
+        return geom
+
+    return transform(get_transformer(source_srid, target_srid).transform, geom)
+
+
+class GeometryIndex:
+    """This class finds the geometries of a set that intersect a geometry.
+
+    The candidates are selected by bounding box with an STR tree and tested with
+    prepared geometries, which are built on first use and kept for the next tests.
+    """
+
+    def __init__(self, geometries):
+        """Create a GeometryIndex.
+
+        Args:
+            geometries (list): The shapely geometries.
+        """
+        self.geometries = list(geometries)
+        self._tree = STRtree(self.geometries) if self.geometries else None
+        self._prepared = dict()
+
+        # Before shapely 2 the tree returns the geometries instead of their positions
+        self._positions = {id(geom): position for position, geom in enumerate(self.geometries)}
+
+    def _candidates(self, geom):
+        """Return the positions of the geometries whose bounding box intersects a geometry."""
+        if self._tree is None:
+            return []
+
+        return [item if isinstance(item, (int, numpy.integer)) else self._positions[id(item)]
+                for item in self._tree.query(geom)]
+
+    def intersecting(self, geom):
+        """Return the positions, in ascending order, of the geometries that intersect a geometry.
+
+        Args:
+            geom (shapely.geometry.base.BaseGeometry): The geometry.
+
+        Returns:
+            list: The positions of the intersecting geometries.
+        """
+        positions = []
+
+        for position in sorted(int(position) for position in self._candidates(geom)):
+            if position not in self._prepared:
+                self._prepared[position] = prep(self.geometries[position])
+
+            if self._prepared[position].intersects(geom):
+                positions.append(position)
+
+        return positions
@@ -7,13 +7,16 @@
 #
 """Views of Web Land Trajectory Service."""
 from bdc_core.decorators.validators import require_model
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, url_for
 
 from wlts.collections.collection_manager import collection_manager
+from wlts.datasources.ds_manager import datasource_manager
 
-from . import controller
-from .schemas import collections_list, describe_collection, trajectory
-from .trajectory import Trajectory, TrajectoryParams
+from . import controller, formats, tracing
+from .jobs import get_job_manager
+from .schemas import (area_trajectory, collections_list, describe_collection,
+                      trajectory, trajectory_job)
+from .trajectory import AreaTrajectoryParams, Trajectory, TrajectoryParams
 
 bp = Blueprint('wlts', import_name=__name__, url_prefix='/wlts')
 
@@ -54,6 +57,83 @@ def trajectory():
     :returns: Collection Description
     :rtype: dict
     """
+    mimetype = formats.negotiate()
+
     params = TrajectoryParams(**request.args.to_dict())
 
-    return jsonify(Trajectory.get_trajectory(params))
\ No newline at end of file
+    with tracing.span('request', endpoint='trajectory', query=params.to_dict()) as span:
+        response = formats.make_response(Trajectory.get_trajectory(params), mimetype)
+
+        if span is not None:
+            span.set_attribute('response_bytes', response.content_length)
+
+    return response
+
+
+@bp.route('/area_trajectory', methods=['POST'])
+@require_model(area_trajectory)
+def area_trajectory():
+    """Retrieves the class composition trajectory of an area.
+
+    :returns: Area Trajectory
+    :rtype: dict
+    """
+    params = AreaTrajectoryParams(**request.get_json())
+
+    return jsonify(Trajectory.get_area_trajectory(params))
+
+
+@bp.route('/jobs', methods=['POST'])
+@require_model(trajectory_job)
+def submit_job():
+    """Queue a trajectory job, its trajectories are retrieved in background.
+
+    :returns: Job progress
+    :rtype: dict
+    """
+    job = get_job_manager().submit(request.get_json())
+
+    return jsonify(job.progress()), 202, {'Location': url_for('wlts.job_progress', job_id=job.id)}
+
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_progress(job_id):
+    """Retrieves the state and progress of a trajectory job.
+
+    :returns: Job progress
+    :rtype: dict
+    """
+    return jsonify(get_job_manager().get(job_id).progress())
+
+
+@bp.route('/jobs/<job_id>/results/<int:chunk>', methods=['GET'])
+def job_results(job_id, chunk):
+    """Retrieves the trajectories of a chunk of points of a trajectory job.
+
+    :returns: The points with their trajectory
+    :rtype: dict
+    """
+    with open(get_job_manager().chunk(job_id, chunk), 'rb') as f:
+        return Response(f.read(), mimetype=formats.JSON)
+
+
+@bp.route('/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Cancel a trajectory job and remove its results."""
+    get_job_manager().delete(job_id)
+
+    return '', 204
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Retrieves the datasources metrics, as the admission queue depth.
+
+    :returns: Metrics of each datasource
+    :rtype: dict
+    """
+    result = {
+        "datasources": {ds.get_id: ds.get_metrics() for ds in datasource_manager.get_all_datasources()}
+    }
+
+    return jsonify(result)
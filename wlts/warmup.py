@@ -0,0 +1,295 @@
+#
+# This file is part of Web Land Trajectory Service.
+# Copyright (C) 2019-2020 INPE.
+#
+# Web Land Trajectory Service is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Cache warm-up of Web Land Trajectory Service."""
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from werkzeug.exceptions import Conflict
+
+from .collections.collection_manager import collection_manager
+from .config import Config
+from .datasources.tile_cache import get_tile_cache
+from .trajectory import Trajectory
+
+logger = logging.getLogger(__name__)
+
+
+def grid_shape(bounds, step):
+    """Return the number of columns and rows of the grid of points of an area.
+
+    Args:
+        bounds (tuple): The area as (xmin, ymin, xmax, ymax).
+        step (float): The distance in degrees between the points.
+
+    Returns:
+        tuple: The number of columns and rows.
+    """
+    min_x, min_y, max_x, max_y = bounds
+
+    return max(1, math.ceil(round((max_x - min_x) / step, 6))), max(1, math.ceil(round((max_y - min_y) / step, 6)))
+
+
+def expand_targets(points=None, bboxes=None, step=None):
+    """Return the coordinates of the warm-up points.
+
+    Args:
+        points (:obj:`list`, optional): The points as [longitude, latitude].
+        bboxes (:obj:`list`, optional): The areas as [xmin, ymin, xmax, ymax], each one is
+            sampled with a regular grid of points.
+        step (:obj:`float`, optional): The distance in degrees between the points of an area.
+
+    Returns:
+        tuple: The longitude and latitude lists.
+    """
+    step = step or Config.WLTS_WARMUP_STEP
+
+    xs, ys = [], []
+
+    for x, y in points or []:
+        xs.append(float(x))
+        ys.append(float(y))
+
+    for min_x, min_y, max_x, max_y in bboxes or []:
+        columns, rows = grid_shape((min_x, min_y, max_x, max_y), step)
+
+        # The center of each grid cell
+        for row in range(rows):
+            for column in range(columns):
+                xs.append(min(min_x + (column + 0.5) * step, max_x))
+                ys.append(min(min_y + (row + 0.5) * step, max_y))
+
+    return xs, ys
+
+
+def warmup_collections(names=None):
+    """Return the names of the collections whose point queries read a cache that a warm-up fills.
+
+    Only the image tiles of the WCS collections with a grid resolution are kept between
+    requests (in the tile cache), so no collection is returned when ``WLTS_TILE_CACHE_DIR``
+    is not set.
+
+    Args:
+        names (:obj:`list`, optional): The collection names, all collections when not given.
+
+    Returns:
+        list: The collection names.
+    """
+    if get_tile_cache() is None:
+        return []
+
+    return [collection.get_name() for collection in collection_manager.get_all_collections()
+            if (names is None or collection.get_name() in names) and collection.collection_type() == 'Image'
+            and 'resolution' in collection.grid and collection.get_datasource().get_type() == 'WCS']
+
+
+class WarmupTask:
+    """This class fills the tile cache with the image tiles of a set of points.
+
+    The points are queried in batches with the bulk trajectory access path, so the image
+    tiles are stored in the tile cache and the classification system lookups in the
+    datasource caches. At most ``rate`` points are queried per second. The task is skipped
+    when none of the collections reads the tile cache (see :func:`warmup_collections`).
+    """
+
+    def __init__(self, spec):
+        """Create a WarmupTask.
+
+        Args:
+            spec (dict): The warm-up specification with the ``collections`` names (all when
+                not given), the ``points``, the ``bboxes`` and their sampling ``step``, the
+                ``start_date`` and ``end_date`` and the ``rate`` in points per second.
+        """
+        self.spec = spec
+        self.collections = warmup_collections(spec.get('collections'))
+        self.start_date = spec.get('start_date')
+        self.end_date = spec.get('end_date')
+        self.rate = spec.get('rate', Config.WLTS_WARMUP_RATE)
+        self.batch_size = Config.WLTS_WARMUP_BATCH_SIZE
+
+        self.xs, self.ys = expand_targets(spec.get('points'), spec.get('bboxes'), spec.get('step'))
+
+        self.state = 'pending'
+        self.done = 0
+        self.errors = 0
+        self.last_error = None
+        self.started = None
+        self.finished = None
+
+        self._stop = threading.Event()
+
+    def run(self):
+        """Warm the caches, it returns when all points are queried or the task is cancelled."""
+        self.started = time.time()
+
+        if not self.collections:
+            logger.info('Cache warm-up skipped, no collection reads the tile cache (WLTS_TILE_CACHE_DIR)')
+            self.state = 'skipped'
+            self.finished = time.time()
+            return
+
+        self.state = 'running'
+
+        start = time.monotonic()
+
+        for offset in range(0, len(self.xs), self.batch_size):
+            if self._stop.is_set():
+                break
+
+            xs = self.xs[offset:offset + self.batch_size]
+            ys = self.ys[offset:offset + self.batch_size]
+
+            try:
+                Trajectory.get_batch_trajectory(self.collections, xs, ys, self.start_date, self.end_date)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = repr(e)
+
+            self.done += len(xs)
+
+            # Keep the rate, the wait is interrupted when the task is cancelled
+            if self.rate:
+                self._stop.wait(max(0.0, self.done / self.rate - (time.monotonic() - start)))
+
+        self.state = 'cancelled' if self._stop.is_set() else 'finished'
+        self.finished = time.time()
+
+    def cancel(self):
+        """Stop the task after the current batch."""
+        self._stop.set()
+
+    def progress(self):
+        """Return the task progress."""
+        return {
+            'state': self.state,
+            'total': len(self.xs),
+            'done': self.done,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+
+class WarmupManager:
+    """This class runs one warm-up task at a time in a background thread."""
+
+    def __init__(self):
+        """Create a WarmupManager."""
+        self._lock = threading.Lock()
+        self.task = None
+        self._scheduler = None
+        self._lock_file = None
+
+    def start(self, spec):
+        """Start a warm-up task in background.
+
+        Args:
+            spec (dict): The warm-up specification, see :class:`WarmupTask`.
+
+        Returns:
+            WarmupTask: The started task.
+
+        Raises:
+            Conflict: If a warm-up task is running.
+        """
+        with self._lock:
+            if self.task is not None and self.task.state in ('pending', 'running'):
+                raise Conflict('A warm-up task is already running')
+
+            self.task = WarmupTask(spec)
+
+        threading.Thread(target=self.task.run, name='wlts-warmup', daemon=True).start()
+
+        return self.task
+
+    def cancel(self):
+        """Cancel the running warm-up task, if any."""
+        if self.task is not None:
+            self.task.cancel()
+
+    def progress(self):
+        """Return the progress of the last warm-up task or None."""
+        return self.task.progress() if self.task is not None else None
+
+    def schedule(self, spec, interval=None, lock_path=None):
+        """Start a warm-up now and repeat it every ``interval`` seconds.
+
+        Only the first schedule of the process is kept. With a ``lock_path``, only the
+        process that holds the lock file schedules the warm-up, so the workers of a host
+        do not repeat it. The lock is released when the process exits.
+
+        Args:
+            spec (dict): The warm-up specification, see :class:`WarmupTask`.
+            interval (:obj:`float`, optional): The time in seconds between the start of two
+                warm-ups, the warm-up runs once when it is not given.
+            lock_path (:obj:`str`, optional): The lock file shared by the processes.
+
+        Returns:
+            bool: True when the warm-up is scheduled by this process.
+        """
+        def loop():
+            while True:
+                try:
+                    self.start(spec)
+                except Conflict:
+                    pass
+
+                if not interval:
+                    return
+                time.sleep(interval)
+
+        with self._lock:
+            if self._scheduler is not None:
+                return False
+
+            if lock_path is not None:
+                lock_file = open(lock_path, 'w')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+                self._lock_file = lock_file
+
+            self._scheduler = threading.Thread(target=loop, name='wlts-warmup-scheduler', daemon=True)
+
+        self._scheduler.start()
+
+        return True
+
+
+def load_spec(path):
+    """Read a warm-up specification from a JSON file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def schedule_warmup(path, interval=None):
+    """Schedule the warm-up of a specification file in one process of the host.
+
+    The warm-up is skipped when the tile cache is not enabled. Otherwise, the first process
+    to lock ``.warmup.lock`` in ``WLTS_TILE_CACHE_DIR`` runs it.
+
+    Args:
+        path (str): The warm-up specification file.
+        interval (:obj:`float`, optional): The time in seconds between the start of two warm-ups.
+    """
+    if get_tile_cache() is None:
+        logger.info('Cache warm-up skipped, WLTS_TILE_CACHE_DIR is not set')
+        return
+
+    warmup_manager.schedule(load_spec(path), interval,
+                            lock_path=os.path.join(Config.WLTS_TILE_CACHE_DIR, '.warmup.lock'))
+
+
+warmup_manager = WarmupManager()